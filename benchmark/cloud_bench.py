@@ -0,0 +1,157 @@
+'''
+Benchmarks of the point cloud operations in pcl.pointcloud
+
+Usage: python benchmark/cloud_bench.py [--points N]
+'''
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
+import pcl
+
+def timeit(func, *args, repeat=3):
+    '''
+    Return the best wall time of calling func(*args) in seconds
+    '''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def make_cloud(num_points, columnar=False):
+    '''
+    Create a cloud with xyz and rgb fields
+    '''
+    points = np.random.rand(num_points, 4).astype('f4')
+    return pcl.PointCloud(points, [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('rgb', 'f4')],
+                          columnar=columnar)
+
+def bench_fields(num_points):
+    '''
+    Compare adding fields one after another and dropping them
+    '''
+    print('field operations, %d points' % num_points)
+    normals = np.random.rand(3, num_points).astype('f4')
+    curvature = np.random.rand(num_points).astype('f4')
+    labels = np.arange(num_points, dtype='u4')
+
+    def add_fields(cloud):
+        cloud.append_fields([('normal_x', 'f4'), ('normal_y', 'f4'), ('normal_z', 'f4')],
+                            normals)
+        cloud.append_fields([('curvature', 'f4')], [curvature])
+        cloud.append_fields([('label', 'u4')], [labels])
+        cloud.append_fields([('intensity', 'f4')], 1.)
+
+    def drop_fields(cloud):
+        del cloud['normal_x', 'normal_y', 'normal_z']
+        cloud.pop_fields(['curvature'])
+        del cloud['label']
+
+    for columnar in (False, True):
+        storage = 'columnar' if columnar else 'record'
+        clouds = [make_cloud(num_points, columnar) for _ in range(3)]
+        elapsed = timeit(lambda: add_fields(clouds.pop()))
+        print('  %-28s %8.3f s' % ('append fields (%s)' % storage, elapsed))
+
+        clouds = [make_cloud(num_points, columnar) for _ in range(3)]
+        for cloud in clouds:
+            add_fields(cloud)
+        elapsed = timeit(lambda: drop_fields(clouds.pop()))
+        print('  %-28s %8.3f s' % ('drop fields (%s)' % storage, elapsed))
+
+def bench_accumulate(num_points, packet_size=1000):
+    '''
+    Compare accumulating packets of points by appending, extending and concatenating
+    '''
+    print('accumulate %d points in packets of %d' % (num_points, packet_size))
+    packets = [make_cloud(packet_size).data for _ in range(num_points // packet_size)]
+
+    def concatenate(cloud):
+        data = cloud.data
+        for packet in packets:
+            data = np.concatenate((data, packet))
+        return pcl.PointCloud(data)
+
+    def append(cloud):
+        for packet in packets:
+            cloud.append(packet)
+
+    for name, func in (('concatenate', concatenate), ('append', append),
+                       ('extend', lambda cloud: cloud.extend(packets))):
+        for columnar in (False, True):
+            if name == 'concatenate' and columnar:
+                continue
+            storage = 'columnar' if columnar else 'record'
+            elapsed = timeit(lambda: func(make_cloud(0, columnar)))
+            print('  %-28s %8.3f s' % ('%s (%s)' % (name, storage), elapsed))
+
+def bench_density(num_points):
+    '''
+    Compare checking invalid values through python lists and with the vectorized property
+    '''
+    print('density check, %d points' % num_points)
+    cloud = make_cloud(num_points)
+    elapsed = timeit(lambda: np.isnan(cloud.data.tolist()).any(), repeat=1)
+    print('  %-28s %8.3f s' % ('python lists', elapsed))
+    for columnar in (False, True):
+        storage = 'columnar' if columnar else 'record'
+        cloud = make_cloud(num_points, columnar)
+        elapsed = timeit(lambda: (cloud._invalidate_cache(), cloud.is_dense))
+        print('  %-28s %8.3f s' % ('is_dense (%s)' % storage, elapsed))
+
+def bench_organized(num_points, lookups=1000):
+    '''
+    Time the access of pixels, rows and windows of an organized cloud
+    '''
+    width = 640
+    height = num_points // width
+    print('organized access, %dx%d points' % (width, height))
+    rows = np.random.randint(height - 8, size=lookups)
+    cols = np.random.randint(width - 8, size=lookups)
+    for columnar in (False, True):
+        storage = 'columnar' if columnar else 'record'
+        cloud = pcl.PointCloud(make_cloud(width * height).data, width=width, height=height,
+                               columnar=columnar)
+        for name, func in (('pixel', lambda r, c: cloud[r, c]),
+                           ('row', lambda r, c: cloud[r, :]),
+                           ('window 8x8', lambda r, c: cloud[r:r + 8, c:c + 8])):
+            elapsed = timeit(lambda: [func(r, c) for r, c in zip(rows, cols)])
+            print('  %-28s %8.3f ms' % ('%s (%s)' % (name, storage), elapsed * 1000 / lookups))
+
+def bench_views(num_points, stages=5):
+    '''
+    Compare selecting points in stages by indexing and with views
+    '''
+    print('%d selection stages, %d points' % (stages, num_points))
+    cloud = make_cloud(num_points)
+    cloud.append_fields([('normal_x', 'f4'), ('normal_y', 'f4'), ('normal_z', 'f4'),
+                         ('curvature', 'f4')], np.random.rand(4, num_points))
+    masks = [np.random.rand(num_points) < 0.9 ** stage for stage in range(stages)]
+
+    def select(cloud, make_view):
+        for mask in masks:
+            indices = np.flatnonzero(mask[:len(cloud)])
+            cloud = cloud.view(indices) if make_view else cloud[indices]
+        return cloud.xyz
+
+    for name, make_view in (('indexing', False), ('views', True)):
+        elapsed = timeit(lambda: select(cloud, make_view))
+        print('  %-28s %8.3f s' % (name, elapsed))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=2000000)
+    args = parser.parse_args()
+    bench_fields(args.points)
+    bench_accumulate(args.points // 10)
+    bench_density(args.points)
+    bench_organized(args.points)
+    bench_views(args.points)
+
+if __name__ == '__main__':
+    main()
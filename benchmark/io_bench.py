@@ -0,0 +1,285 @@
+'''
+Benchmarks of reading and writing point cloud files in pcl.io
+
+Usage: python benchmark/io_bench.py [--points N] [--dir DIR]
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+import numpy as np
+sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
+import pcl
+import pcl.io as pio
+
+def measure(func, *args):
+    '''
+    Return the wall time in seconds and the peak of memory allocated by calling func(*args)
+    '''
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, peak
+
+def make_cloud(num_points):
+    '''
+    Create a cloud with xyz, intensity and normal fields. The coordinates are quantized so that
+    the data is compressible as real scans.
+    '''
+    points = np.round(np.random.rand(num_points, 8) * 1000) / 1000
+    return pcl.PointCloud(points.astype('f4'),
+                          [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('intensity', 'f4'),
+                           ('normal_x', 'f4'), ('normal_y', 'f4'), ('normal_z', 'f4'),
+                           ('curvature', 'f4')])
+
+def report(name, elapsed, peak, payload):
+    '''
+    Print the throughput and the peak memory relative to the payload size
+    '''
+    print('  %-42s %8.3f s %8.1f MB/s   peak %5.2f x payload' %
+          (name, elapsed, payload / elapsed / 2 ** 20, peak / payload))
+
+def bench_pcd(num_points, directory):
+    '''
+    Time writing and reading PCD files of the binary data types
+    '''
+    cloud = make_cloud(num_points)
+    payload = cloud.data.nbytes
+    print('pcd i/o, %d points, payload %.1f MB' % (num_points, payload / 2 ** 20))
+    filename = os.path.join(directory, 'bench.pcd')
+    for data_type, compress in (('binary', False), ('binary_compressed', True)):
+        elapsed, peak = measure(pio.savepcd, filename, cloud, True, compress)
+        report('write %s' % data_type, elapsed, peak, payload)
+        elapsed, peak = measure(pio.loadpcd, filename)
+        report('read %s' % data_type, elapsed, peak, payload)
+        if not compress:
+            elapsed, peak = measure(lambda: pio.loadpcd(filename, mmap=True).xyz.sum())
+            report('read %s (mmap, xyz)' % data_type, elapsed, peak, payload)
+    for num_threads in (1, 0):
+        name = 'binary_compressed_chunked, %s' % \
+               ('serial' if num_threads == 1 else '%d threads' % os.cpu_count())
+        elapsed, peak = measure(pio.savepcd, filename, cloud, True, True, 65536, num_threads)
+        report('write ' + name, elapsed, peak, payload)
+        elapsed, peak = measure(pio.loadpcd, filename, False, num_threads)
+        report('read ' + name, elapsed, peak, payload)
+    os.remove(filename)
+
+def bench_selection(num_points, directory):
+    '''
+    Time reading part of the fields and the points of a binary PCD file
+    '''
+    cloud = make_cloud(num_points)
+    payload = cloud.data.nbytes
+    print('pcd selection, %d points, payload %.1f MB' % (num_points, payload / 2 ** 20))
+    filename = os.path.join(directory, 'bench.pcd')
+    pio.savepcd(filename, cloud)
+    with open(filename, 'rb') as fid:
+        stream = fid.read()
+    for name, opts in (('all', {}), ('xyz', {'fields': ['x', 'y', 'z']}),
+                       ('10% of points', {'points': slice(0, num_points // 10)}),
+                       ('xyz of 10% of points', {'fields': ['x', 'y', 'z'],
+                                                 'points': slice(0, num_points // 10)})):
+        elapsed, peak = measure(lambda: pio.loadpcd(filename, **opts))
+        report('read %s' % name, elapsed, peak, payload)
+        elapsed, peak = measure(lambda: pio.loadpcd(BytesIO(stream), **opts))
+        report('read %s from stream' % name, elapsed, peak, payload)
+    os.remove(filename)
+
+def bench_chunked(num_points, directory):
+    '''
+    Compare reading part of a compressed PCD file and of a chunked (PCC) file. The points of the
+    PCC file are sorted along x so that the chunks are spatially coherent.
+    '''
+    cloud = make_cloud(num_points)
+    cloud = pcl.PointCloud(cloud.data[np.argsort(cloud.data['x'])], cloud.fields)
+    payload = cloud.data.nbytes
+    print('chunked file, %d points, payload %.1f MB' % (num_points, payload / 2 ** 20))
+    pcd = os.path.join(directory, 'bench.pcd')
+    pcc = os.path.join(directory, 'bench.pcc')
+    elapsed, peak = measure(pio.savepcd, pcd, cloud, True, True)
+    report('write pcd binary_compressed', elapsed, peak, payload)
+    elapsed, peak = measure(pio.savepcc, pcc, cloud)
+    report('write pcc', elapsed, peak, payload)
+    box = ([0, 0, 0], [0.1, 1, 1])
+    for name, opts in (('all', {}), ('xyz', {'fields': ['x', 'y', 'z']})):
+        elapsed, peak = measure(lambda: pio.loadpcd(pcd, **opts))
+        report('read pcd %s' % name, elapsed, peak, payload)
+        elapsed, peak = measure(lambda: pio.loadpcc(pcc, **opts))
+        report('read pcc %s' % name, elapsed, peak, payload)
+    elapsed, peak = measure(lambda: pio.loadpcc(pcc, None, *box))
+    report('read pcc, 10% box', elapsed, peak, payload)
+    os.remove(pcd)
+    os.remove(pcc)
+
+def bench_tiled(num_points, directory):
+    '''
+    Time building a tiled store and querying it, compared with filtering the whole cloud
+    '''
+    cloud = make_cloud(num_points)
+    payload = cloud.data.nbytes
+    print('tiled store, %d points, payload %.1f MB, 10 x 10 tiles' %
+          (num_points, payload / 2 ** 20))
+    store_dir = os.path.join(directory, 'tiles')
+
+    def build():
+        with pio.TiledCloudWriter(store_dir, tile_size=(0.1, 0.1),
+                                  memory_budget=payload // 4) as writer:
+            for start in range(0, num_points, 65536):
+                writer.write(cloud[start:start + 65536])
+    elapsed, peak = measure(build)
+    report('build', elapsed, peak, payload)
+
+    xyz = cloud.xyz
+    start = time.perf_counter()
+    cloud.data[((xyz >= [0.42, 0.42, 0]) & (xyz <= [0.58, 0.58, 1])).all(axis=1)]
+    print('  %-42s %8.3f s' % ('box in memory', time.perf_counter() - start))
+    store = pio.TiledCloudStore(store_dir, cache_size=payload // 10)
+    for name in ('box, cold cache', 'box, warm cache'):
+        elapsed, peak = measure(store.query_box, [0.42, 0.42, 0], [0.58, 0.58, 1])
+        report(name, elapsed, peak, payload)
+    elapsed, peak = measure(store.query_radius, [0.5, 0.5, 0.5], 0.08)
+    report('radius, warm cache', elapsed, peak, payload)
+
+def bench_loader(num_points, directory, num_files=20):
+    '''
+    Compare loading PCD files in a loop and with CloudLoader, when each cloud is followed by
+    some computation (simulated by sleeping, which releases the GIL as numpy or I/O does)
+    '''
+    files = [os.path.join(directory, 'frame%02d.pcd' % index) for index in range(num_files)]
+    for name in files:
+        pio.savepcd(name, make_cloud(num_points), compress=True)
+    start = time.perf_counter()
+    pio.loadpcd(files[0])
+    delay = time.perf_counter() - start
+    print('pcd loading, %d compressed files of %d points, %.3f s of computation per cloud' %
+          (num_files, num_points, delay))
+
+    def consume(clouds):
+        start = time.perf_counter()
+        for _ in clouds:
+            time.sleep(delay)
+        return time.perf_counter() - start
+    print('  %-42s %8.3f s' % ('loadpcd loop', consume(pio.loadpcd(name) for name in files)))
+    for workers, processes in ((1, False), (2, False), (2, True)):
+        name = 'CloudLoader, %d %s' % (workers, 'processes' if processes else 'threads')
+        elapsed = consume(pio.CloudLoader(files, num_workers=workers, processes=processes))
+        print('  %-42s %8.3f s' % (name, elapsed))
+    for name in files:
+        os.remove(name)
+
+def bench_ply(num_points, directory):
+    '''
+    Time writing and reading PLY files of triangle meshes
+    '''
+    from pcl.polygonmesh import PolygonMesh, Vertices
+    cloud = make_cloud(num_points)
+    faces = np.random.randint(num_points, size=(num_points * 2, 3))
+    mesh = PolygonMesh(cloud, [Vertices(face) for face in faces])
+    payload = cloud.data.nbytes + faces.size * 4
+    print('ply i/o, %d vertices, %d faces, payload %.1f MB' %
+          (num_points, len(faces), payload / 2 ** 20))
+    filename = os.path.join(directory, 'bench.ply')
+    for byte_order, name in (('<', 'little endian'), ('>', 'big endian')):
+        elapsed, peak = measure(pio.saveply, filename, cloud, True, byte_order)
+        report('write %s, vertices' % name, elapsed, peak, cloud.data.nbytes)
+        elapsed, peak = measure(pio.loadply, filename)
+        report('read %s, vertices' % name, elapsed, peak, cloud.data.nbytes)
+        elapsed, peak = measure(pio.saveply, filename, mesh, True, byte_order)
+        report('write %s' % name, elapsed, peak, payload)
+        elapsed, peak = measure(pio.PLYReader().read, filename)
+        report('read %s' % name, elapsed, peak, payload)
+    elapsed, peak = measure(pio.saveply, filename, mesh, False)
+    report('write ascii', elapsed, peak, payload)
+    elapsed, peak = measure(pio.PLYReader().read, filename)
+    report('read ascii', elapsed, peak, payload)
+    os.remove(filename)
+
+def bench_scan(num_files, directory):
+    '''
+    Compare reading the headers of many PCD files one by one and with the bulk scanner
+    '''
+    cloud = make_cloud(100)
+    folder = os.path.join(directory, 'scan')
+    os.mkdir(folder)
+    files = [os.path.join(folder, '%06d.pcd' % index) for index in range(num_files)]
+    for name in files:
+        pio.savepcd(name, cloud)
+    print('pcd header scanning, %d files' % num_files)
+    start = time.perf_counter()
+    for name in files:
+        pio.PCDReader().read_header(name)
+    print('  %-42s %8.3f s' % ('read_header', time.perf_counter() - start))
+    cache = os.path.join(directory, 'index.json')
+    for name in ('scanpcd', 'scanpcd, writing cache', 'scanpcd, cached'):
+        start = time.perf_counter()
+        pio.scanpcd(folder, cache=cache if 'cache' in name else None)
+        print('  %-42s %8.3f s' % (name, time.perf_counter() - start))
+
+def write_ascii_by_points(file, cloud):
+    '''
+    The former ascii writer of PCDWriter, which formats the points one by one
+    '''
+    fields = ['%.10f' if descr.lstrip('0123456789')[0] == 'f' else '%d'
+              for _, descr in cloud.fields]
+    with open(file, 'w') as fid:
+        fid.write(pio.PCDWriter().generate_header(cloud, 'ascii'))
+        for point in cloud:
+            line = []
+            for idx, data in enumerate(tuple(point)):
+                line.append(fields[idx] % data)
+            fid.write(' '.join(line))
+            fid.write('\n')
+
+def bench_ascii(num_points, directory):
+    '''
+    Compare writing ASCII PCD files point by point and by blocks
+    '''
+    cloud = make_cloud(num_points)
+    print('pcd ascii writing, %d points' % num_points)
+    files = []
+    for name, func in (('point by point', write_ascii_by_points),
+                       ('by blocks', pio.PCDWriter().write_ascii)):
+        files.append(os.path.join(directory, name.replace(' ', '_') + '.pcd'))
+        start = time.perf_counter()
+        func(files[-1], cloud)
+        print('  %-42s %8.3f s' % (name, time.perf_counter() - start))
+    with open(files[0], 'rb') as former, open(files[1], 'rb') as current:
+        print('  identical output: %s' % (former.read() == current.read()))
+
+    print('pcd ascii reading, %d points' % num_points)
+    header = pio.PCDReader().read_header(files[1])
+    with open(files[1], 'rb') as fid:
+        fid.seek(header['data_offset'])
+        start = time.perf_counter()
+        np.loadtxt(fid, dtype=cloud.data.dtype, delimiter=' ')
+        print('  %-42s %8.3f s' % ('np.loadtxt', time.perf_counter() - start))
+    start = time.perf_counter()
+    pio.loadpcd(files[1])
+    print('  %-42s %8.3f s' % ('loadpcd', time.perf_counter() - start))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=2000000)
+    parser.add_argument('--files', type=int, default=5000, help='number of files to scan')
+    parser.add_argument('--dir', default=None, help='directory of the temporary files')
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory(dir=args.dir) as directory:
+        bench_pcd(args.points, directory)
+        bench_selection(args.points, directory)
+        bench_chunked(args.points, directory)
+        bench_tiled(args.points, directory)
+        bench_loader(args.points // 10, directory)
+        bench_ply(args.points // 10, directory)
+        bench_ascii(args.points // 10, directory)
+        bench_scan(args.files, directory)
+
+if __name__ == '__main__':
+    main()
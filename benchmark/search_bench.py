@@ -0,0 +1,104 @@
+'''
+Benchmarks of the search methods in pcl.search
+
+Usage: python benchmark/search_bench.py [--points N] [--queries M] [--radius R] [--k K]
+'''
+
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
+import pcl
+import pcl.search as ps
+
+def timeit(func, *args, repeat=3):
+    '''
+    Return the best wall time of calling func(*args) in seconds
+    '''
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def make_searches(cloud):
+    '''
+    Create the search methods to be compared
+    '''
+    searches = [ps.BruteForceSearch(cloud)]
+    try:
+        searches.append(ps.KDTreeSearch(cloud))
+    except ImportError:
+        pass
+    searches.append(ps.VoxelHashSearch(cloud))
+    searches.append(ps.OctreeSearch(cloud, resolution=np.ptp(cloud.xyz, axis=0).max() / 64))
+    return searches
+
+def bench_fixed_radius(cloud, queries, radius):
+    '''
+    Compare the fixed-radius batch search, including the time of building the index
+    '''
+    print('radius search, %d points, %d queries, radius %g'
+          % (len(cloud), len(queries), radius))
+    for search in make_searches(cloud):
+        def run(search=search):
+            search.input_cloud = cloud # force rebuilding the index
+            search.radius_search_batch(queries, radius)
+        print('  %-20s %8.3f s' % (type(search).__name__, timeit(run)))
+
+def bench_nearestk(cloud, queries, k):
+    '''
+    Compare the kNN batch search with the index built beforehand
+    '''
+    print('kNN search, %d points, %d queries, k = %d' % (len(cloud), len(queries), k))
+    for search in make_searches(cloud):
+        search.nearestk_search_batch(queries[:1], k)
+        elapsed = timeit(search.nearestk_search_batch, queries, k)
+        print('  %-20s %8.3f s' % (type(search).__name__, elapsed))
+
+def bench_approximate(cloud, queries, k):
+    '''
+    Measure recall versus latency of HNSWSearch with different ef_search values
+    '''
+    try:
+        search = ps.HNSWSearch(cloud)
+    except ImportError:
+        print('nmslib is not installed, skip HNSW benchmark')
+        return
+    print('HNSW kNN search, %d points, %d queries, k = %d' % (len(cloud), len(queries), k))
+    start = time.perf_counter()
+    search.nearestk_search_batch(queries[:1], k)
+    print('  %-20s %8.3f s' % ('build', time.perf_counter() - start))
+
+    try:
+        exact = ps.KDTreeSearch(cloud)
+    except ImportError:
+        exact = ps.BruteForceSearch(cloud)
+    truth, _ = exact.nearestk_search_batch(queries, k)
+    for ef_search in (10, 20, 50, 100, 200):
+        search.ef_search = ef_search
+        elapsed = timeit(search.nearestk_search_batch, queries, k)
+        k_indices, _ = search.nearestk_search_batch(queries, k)
+        recall = np.mean([len(np.intersect1d(row, expected)) / k
+                          for row, expected in zip(k_indices, truth)])
+        print('  ef_search = %-8d %8.3f s, recall %.4f' % (ef_search, elapsed, recall))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--points', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=10000)
+    parser.add_argument('--radius', type=float, default=0.02)
+    parser.add_argument('-k', '--k', type=int, default=10)
+    args = parser.parse_args()
+
+    cloud = pcl.PointCloud(np.random.rand(args.points, 3).astype('f4'), ['x', 'y', 'z'])
+    queries = np.random.rand(args.queries, 3)
+    bench_fixed_radius(cloud, queries, args.radius)
+    bench_nearestk(cloud, queries, args.k)
+    bench_approximate(cloud, queries, args.k)
+
+if __name__ == '__main__':
+    main()
@@ -57,6 +57,7 @@ class _CloudBase(metaclass=abc.ABCMeta):
         '''
         if value is not None:
             self._indices = list(value)
+            self.__fake_indices = False
         else:
             self._indices = None
         self.__check_indices()
@@ -72,7 +73,7 @@ class _CloudBase(metaclass=abc.ABCMeta):
         if self._indices is None:
             self._indices = range(len(self._input))
             self.__fake_indices = True
-        elif self.__fake_indices and len(self._indices) != self.input_cloud:
+        elif self.__fake_indices and len(self._indices) != len(self._input):
             self._indices = range(len(self._input))
 
     def _init_compute(self):
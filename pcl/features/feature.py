@@ -6,9 +6,10 @@ Implementation of following files:
 '''
 
 import abc
+import numpy as np
 from ..pointcloud import PointCloud
 from ..common import _CloudBase
-from ..search import DefaultSearch, DefaultOrganizedSearch
+from ..search import DefaultSearch, DefaultOrganizedSearch, NeighborGraph
 
 class Feature(_CloudBase, metaclass=abc.ABCMeta):
     '''
@@ -89,6 +90,32 @@ class Feature(_CloudBase, metaclass=abc.ABCMeta):
         # search surface, the input surface cloud should be the one to be searched
         return self._search_method_surface(index, parameter)
 
+    def _search_for_neighbours_batch(self, indices, parameter):
+        '''
+        Search for neighbors of a batch of points in the input cloud using the spatial locator
+        from search_method, and the given surface from search_surface.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th point are stored in nn_indices[offsets[i]:offsets[i+1]]
+        nn_indices : array of int
+            The indices of neighbors in the search surface
+        nn_distances : array of float
+            The distances to the neighbors
+        '''
+        points = np.asarray(indices, dtype=int)
+        if not self._fake_surface:
+            # query by coordinates since the indices refer to the input cloud
+            points = self._input.xyz[points]
+        if self._search_method_surface == self.search_method.radius_search:
+            return self.search_method.radius_search_batch(points, parameter)
+
+        k_indices, k_distances = self.search_method.nearestk_search_batch(points, parameter)
+        valid = k_indices >= 0
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(np.sum(valid, axis=1), out=offsets[1:])
+        return offsets, k_indices[valid], k_distances[valid]
+
     @abc.abstractmethod
     def _compute_feature(self, cloud):
         '''
@@ -120,16 +147,22 @@ class Feature(_CloudBase, metaclass=abc.ABCMeta):
                 self.search_method = DefaultSearch()
         self.search_method.input_cloud = self._surface
 
-        if self.search_radius != 0:
-            if self.search_k != 0:
+        search_radius, search_k = self.search_radius, self.search_k
+        if isinstance(self.search_method, NeighborGraph) and search_radius == 0 and search_k == 0:
+            # a precomputed neighbor graph defines the neighborhoods itself
+            search_radius = self.search_method.radius
+            search_k = self.search_method.k if search_radius == 0 else 0
+
+        if search_radius != 0:
+            if search_k != 0:
                 raise ValueError('both radius (%f) and K (%d) defined!' %
-                                 (self.search_radius, self.search_k))
+                                 (search_radius, search_k))
             else:
-                self._search_parameter = self.search_radius
+                self._search_parameter = search_radius
                 self._search_method_surface = self.search_method.radius_search
         else:
-            if self.search_k != 0:
-                self._search_parameter = self.search_k
+            if search_k != 0:
+                self._search_parameter = search_k
                 self._search_method_surface = self.search_method.nearestk_search
             else:
                 raise ValueError('neither radius nor K defined!')
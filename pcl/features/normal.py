@@ -8,6 +8,7 @@ Implementation of following files:
 import numpy as np
 from ..pointcloud import PointCloud
 from ..common import compute_mean_and_covariance_matrix
+from ..search import _batch_slices
 from .feature import Feature
 
 def compute_point_normal(cloud, indices):
@@ -45,6 +46,68 @@ def compute_point_normal(cloud, indices):
 
     return plane_parameters, curvature
 
+def compute_point_normals(cloud, offsets, indices):
+    '''
+    Compute the Least-Squares plane fits for a batch of neighborhoods at the same time.
+
+    # Parameters
+    cloud : PointCloud
+        The input Point Cloud
+    offsets : (M+1,) array of int
+        The i-th neighborhood is given by indices[offsets[i]:offsets[i+1]]
+    indices : array of int
+        The point cloud indices of all the neighborhoods
+
+    # Returns
+    plane_parameters : (M, 4) array of float
+        The plane parameters as: a, b, c, d (ax + by + cz + d = 0). The parameters of the
+        neighborhoods with less than 3 points are set to NaN
+    curvature : (M,) array of float
+        the estimated surface curvature as a measure of λ_0 / (λ_0 + λ_1 + λ_2)
+    '''
+    offsets = np.asarray(offsets, dtype=int)
+    counts = np.diff(offsets)
+    valid = counts >= 3
+    plane_parameters = np.full((len(counts), 4), np.nan)
+    curvature = np.full(len(counts), np.nan)
+    if not valid.any():
+        return plane_parameters, curvature
+
+    # drop the invalid neighborhoods so that reduceat works on non-empty segments only
+    rows = np.repeat(valid, counts)
+    indices = np.asarray(indices, dtype=int)[rows]
+    counts = counts[valid]
+    offsets = np.zeros(len(counts) + 1, dtype=int)
+    np.cumsum(counts, out=offsets[1:])
+    normal = np.empty((len(counts), 3))
+    centroid = np.empty((len(counts), 3))
+    eigen_value = np.empty((len(counts), 3))
+
+    # the products of coordinates take 9 values per neighbor, they are summed block by block
+    size = int(np.ceil(offsets[-1] / len(counts)))
+    for batch in _batch_slices(len(counts), 3 * size):
+        points = cloud.xyz[indices[offsets[batch.start]:offsets[batch.stop]]].astype(float)
+        block = counts[batch]
+        starts = offsets[batch] - offsets[batch.start]
+        centroid[batch] = np.add.reduceat(points, starts, axis=0) / block[:, np.newaxis]
+        points -= np.repeat(centroid[batch], block, axis=0)
+        products = points[:, :, np.newaxis] * points[:, np.newaxis, :]
+        covariance_matrix = np.add.reduceat(products, starts, axis=0)
+        covariance_matrix /= block[:, np.newaxis, np.newaxis]
+
+        # eigenvalues are returned in ascending order
+        eigen_value[batch], eigen_vector = np.linalg.eigh(covariance_matrix)
+        normal[batch] = eigen_vector[:, :, 0]
+
+    plane_parameters[valid, :3] = normal
+    plane_parameters[valid, 3] = -np.sum(normal * centroid, axis=1)
+
+    eigen_sum = np.sum(eigen_value, axis=1)
+    nonzero = eigen_sum != 0
+    eigen_sum[~nonzero] = 1
+    curvature[valid] = np.where(nonzero, np.abs(eigen_value[:, 0] / eigen_sum), 0)
+    return plane_parameters, curvature
+
 class NormalEstimation(Feature):
     '''
     NormalEstimation estimates local surface properties (surface normals and curvatures)at each
@@ -99,19 +162,33 @@ class NormalEstimation(Feature):
 
     def _compute_feature(self):
         dtype = [('normal_x', 'f8'), ('normal_y', 'f8'), ('normal_z', 'f8'), ('curvature', 'f8')]
-        params = np.empty((len(self._indices),), dtype=dtype)
-        for count, idx in enumerate(self._indices):
-            nn_indices, _ = self._search_for_neighbours(idx, self._search_parameter)
-            plane_param, curvature = compute_point_normal(self._surface, nn_indices)
+        indices = np.asarray(self._indices, dtype=int)
+        params = np.empty((len(indices),), dtype=dtype)
+        if self._search_method_surface == self.search_method.radius_search:
+            # estimate the size of the neighborhoods from a sample of the queries
+            sample = indices[::max(1, len(indices) // 64)]
+            offsets, _, _ = self._search_for_neighbours_batch(sample, self._search_parameter)
+            size = int(np.ceil(offsets[-1] / max(len(sample), 1)))
+        else:
+            size = self._search_parameter
+
+        # search and fit the neighborhoods block by block so that the memory is bounded
+        for batch in _batch_slices(len(indices), 3 * max(size, 1)):
+            offsets, nn_indices, _ = self._search_for_neighbours_batch(indices[batch],
+                                                                       self._search_parameter)
+            plane_param, curvature = compute_point_normals(self._surface, offsets, nn_indices)
 
             # flip_normal_towards_viewpoint
-            if np.dot(self._view_point - self._input[idx].xyz, plane_param[:3]) < 0:
-                params[count] = -plane_param[0], -plane_param[1], -plane_param[2],\
-                                curvature
-            else:
-                params[count] = plane_param[0], plane_param[1], plane_param[2],\
-                                curvature
+            normal = plane_param[:, :3]
+            view_direction = self._view_point[:3] - self._input.xyz[indices[batch]]
+            flip = np.sum(view_direction * normal, axis=1) < 0
+            normal[flip] = -normal[flip]
+
+            params['normal_x'][batch] = normal[:, 0]
+            params['normal_y'][batch] = normal[:, 1]
+            params['normal_z'][batch] = normal[:, 2]
+            params['curvature'][batch] = curvature
 
         output = PointCloud(params, fields=dtype)
-        output.copy_metadata(self._input)
+        self._input.copy_metadata(output)
         return output
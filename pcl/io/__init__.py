@@ -6,3 +6,6 @@ Implementation of namespace pcl.io
 from __future__ import absolute_import
 
 from .file_io import *
+from .loader import *
+from .chunked import *
+from .tiled import *
@@ -0,0 +1,399 @@
+'''
+Point Cloud Chunks (PCC) file format, a columnar container with random access.
+
+The points are stored by chunks of a fixed number of points, and each field of a chunk is
+stored (and optionally compressed with lzf) separately. A footer at the end of the file
+indexes the fields of the chunks with their offsets, as well as the bounding box of each
+chunk, so that single fields or the chunks intersecting a region can be read without
+touching the rest of the file.
+
+Layout of the file:
+    MAGIC
+    field blocks of the chunks
+    footer : JSON with the fields, the viewpoint and the index of the chunks
+    footer size : uint64, little-endian
+    MAGIC
+'''
+from __future__ import absolute_import
+
+import json
+import struct
+import numpy as np
+from ..pointcloud import _cast_fields_to_tuples, PointCloud
+from ..quaternion import Quaternion
+from .file_io import _check_file, _compress_block, _decompress_block, _import_lzf
+
+MAGIC = b'PCLCHNK1'
+_FOOTER_SIZE = struct.Struct('<Q')
+
+def _read_footer(file):
+    # read the footer of the file, return the footer and the offset where it begins
+    file.seek(0, 2)
+    size = file.tell()
+    tail = len(MAGIC) + _FOOTER_SIZE.size
+    if size < len(MAGIC) + tail:
+        raise ValueError('not a pcc file')
+    file.seek(size - tail)
+    footer_size, = _FOOTER_SIZE.unpack(file.read(_FOOTER_SIZE.size))
+    if file.read(len(MAGIC)) != MAGIC or footer_size > size - len(MAGIC) - tail:
+        raise ValueError('not a pcc file or the file is not closed')
+    start = size - tail - footer_size
+    file.seek(start)
+    return json.loads(file.read(footer_size).decode('utf-8')), start
+
+class ChunkedCloudWriter:
+    '''
+    Point Cloud Chunks (PCC) file writer.
+
+    The clouds are written incrementally, the points are buffered until a chunk is full. The
+    writer should be closed (or used as a context manager) to flush the last chunk and write
+    the footer.
+
+    # Parameters
+        file : file-like object or str
+            The output file or name of it. File-like object need to support seek(), tell() and
+            write(), as well as read() and truncate() to append to it.
+        chunk_points : int
+            The number of points in a chunk
+        compress : bool
+            Compress the fields of the chunks with lzf
+        append : bool
+            Append the points to an existing file, the fields of the clouds should be the same
+            as the fields of the file
+
+    # Examples
+    ```
+    with ChunkedCloudWriter('map.pcc') as writer:
+        for cloud in clouds:
+            writer.write(cloud)
+    ```
+    '''
+    def __init__(self, file, chunk_points=65536, compress=True, append=False):
+        if chunk_points <= 0:
+            raise ValueError('chunk_points should be a positive number')
+        if compress:
+            _import_lzf()
+        self.chunk_points = chunk_points
+        self.compress = compress
+        self._file, self._own = _check_file(file, 0, 'pcc', 'r+b' if append else 'wb')
+        self._pending = []
+        self._pending_points = 0
+        if append:
+            self._footer, start = _read_footer(self._file)
+            self._file.seek(start)
+        else:
+            self._footer = {'version': 1, 'fields': None, 'viewpoint': None, 'chunks': []}
+            self._file.write(MAGIC)
+
+    @property
+    def fields(self):
+        '''
+        The fields of the points, None if nothing is written
+        '''
+        fields = self._footer['fields']
+        return None if fields is None else [tuple(field) for field in fields]
+
+    def write(self, cloud):
+        '''
+        Write the points of a cloud.
+
+        # Parameters
+            cloud : PointCloud
+                The points to write, the viewpoint of the first cloud is kept
+        '''
+        if self._file is None:
+            raise ValueError('the writer is closed')
+        if self._footer['fields'] is None:
+            self._footer['fields'] = [list(field) for field in cloud.fields]
+            origin = np.asarray(cloud.sensor_origin[:3], dtype=float).tolist()
+            self._footer['viewpoint'] = origin + list(map(float, cloud.sensor_orientation.tolist()))
+        elif [tuple(field) for field in cloud.fields] != self.fields:
+            raise ValueError('the fields of the cloud are different from the written ones')
+
+        if len(cloud) == 0:
+            return
+        self._pending.append({name: cloud.to_ndarray(name) for name in cloud.names})
+        self._pending_points += len(cloud)
+        if self._pending_points >= self.chunk_points:
+            self.__flush(False)
+        else:
+            # the columns may be views of the cloud, which can be modified after writing
+            self._pending[-1] = {name: np.array(column)
+                                 for name, column in self._pending[-1].items()}
+
+    def close(self):
+        '''
+        Write the last chunk and the footer, then close the file if it's opened by the writer
+        '''
+        if self._file is None:
+            return
+        try:
+            self.__flush(True)
+            footer = json.dumps(self._footer).encode('utf-8')
+            self._file.write(footer)
+            self._file.write(_FOOTER_SIZE.pack(len(footer)))
+            self._file.write(MAGIC)
+            if hasattr(self._file, 'truncate'):
+                self._file.truncate() # the former footer is longer when appending
+        finally:
+            if self._own:
+                self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __flush(self, final):
+        # write the full chunks of the pending points, and the rest if final is True
+        if self._pending_points == 0:
+            return
+        names = [name for name, _ in self.fields]
+        columns = self._pending[0] if len(self._pending) == 1 else \
+                  {name: np.concatenate([pending[name] for pending in self._pending])
+                   for name in names}
+        start = 0
+        while self._pending_points - start >= self.chunk_points or \
+              (final and start < self._pending_points):
+            stop = min(start + self.chunk_points, self._pending_points)
+            self.__write_chunk({name: column[start:stop] for name, column in columns.items()})
+            start = stop
+        self._pending = [{name: column[start:].copy() for name, column in columns.items()}] \
+                        if start < self._pending_points else []
+        self._pending_points -= start
+
+    def __write_chunk(self, columns):
+        chunk = {'points': len(next(iter(columns.values()))), 'compressed': self.compress,
+                 'fields': {}, 'bounds': None}
+        for name, column in columns.items():
+            block = np.ascontiguousarray(column).reshape(-1).view(np.uint8)
+            data = _compress_block(block.tobytes()) if self.compress else memoryview(block)
+            chunk['fields'][name] = [self._file.tell(), len(data), block.size]
+            self._file.write(data)
+
+        if all(name in columns for name in ('x', 'y', 'z')):
+            xyz = np.stack([columns[name].reshape(-1) for name in ('x', 'y', 'z')], axis=1)
+            xyz = xyz[np.isfinite(xyz).all(axis=1)]
+            if len(xyz) > 0:
+                chunk['bounds'] = xyz.min(axis=0).tolist() + xyz.max(axis=0).tolist()
+        self._footer['chunks'].append(chunk)
+
+class ChunkedCloudReader:
+    '''
+    Point Cloud Chunks (PCC) file reader.
+
+    # Parameters
+        file : file-like object or str
+            The file or the name of it to load.
+            File-like object need to support seek() and read()
+    '''
+    def __init__(self, file):
+        self._file, self._own = _check_file(file, 0, 'pcc', 'rb')
+        try:
+            if self._file.read(len(MAGIC)) != MAGIC:
+                raise ValueError('not a pcc file')
+            self._footer, _ = _read_footer(self._file)
+        except Exception:
+            self.close()
+            raise
+        self.fields = [tuple(field) for field in self._footer['fields'] or []]
+        self.names = [name for name, _ in self.fields]
+        self._dtype = np.dtype(_cast_fields_to_tuples(self.fields)[0]) if self.fields else None
+        self.chunk_sizes = np.array([chunk['points'] for chunk in self._footer['chunks']],
+                                    dtype=int)
+
+    def __len__(self):
+        return int(self.chunk_sizes.sum())
+
+    @property
+    def num_chunks(self):
+        '''
+        The number of chunks in the file
+        '''
+        return len(self.chunk_sizes)
+
+    def chunk_bounds(self):
+        '''
+        Get the bounding boxes of the chunks, which are NaN if the points have no coordinates.
+
+        # Returns
+        min_pt : (N, 3) array of float
+        max_pt : (N, 3) array of float
+        '''
+        bounds = np.array([chunk['bounds'] or [np.nan] * 6 for chunk in self._footer['chunks']],
+                          dtype=float).reshape(-1, 6)
+        return bounds[:, :3], bounds[:, 3:]
+
+    def read_chunk(self, index, fields=None):
+        '''
+        Read a chunk of points.
+
+        # Parameters
+            index : int
+                The index of the chunk
+            fields : str or list of str
+                The names of the fields to read, all the fields by default
+
+        # Returns
+            cloud : PointCloud
+        '''
+        names = self.__check_fields(fields)
+        data = np.empty(self.chunk_sizes[index], dtype=[(name, self._dtype[name])
+                                                        for name in names])
+        self.__read_fields(index, data)
+        return self.__make_cloud(data, names)
+
+    def iter_chunks(self, fields=None, min_pt=None, max_pt=None):
+        '''
+        Read the chunks one after another, only the chunks whose bounding boxes intersect the
+        box are read if the box is given. The points of the chunks are not filtered.
+
+        # Parameters
+            fields : str or list of str
+                The names of the fields to read, all the fields by default
+            min_pt : array of 3 float
+                The lower corner of the box
+            max_pt : array of 3 float
+                The upper corner of the box
+
+        # Returns
+            chunks : generator of PointCloud
+        '''
+        for index in self.__chunks_in_box(min_pt, max_pt):
+            yield self.read_chunk(index, fields)
+
+    def read(self, fields=None, min_pt=None, max_pt=None):
+        '''
+        Read the points into a PointCloud, only the points within the box are read if the box
+        is given.
+
+        # Parameters
+            fields : str or list of str
+                The names of the fields to read, all the fields by default
+            min_pt : array of 3 float
+                The lower corner of the box
+            max_pt : array of 3 float
+                The upper corner of the box
+
+        # Returns
+            cloud : PointCloud
+        '''
+        names = self.__check_fields(fields)
+        boxed = min_pt is not None or max_pt is not None
+        chunks = self.__chunks_in_box(min_pt, max_pt)
+        dtype = np.dtype([(name, self._dtype[name]) for name in names])
+        if not boxed:
+            # the chunks are read into the resultant records directly
+            data = np.empty(self.chunk_sizes[chunks].sum(), dtype=dtype)
+            ptr = 0
+            for index in chunks:
+                self.__read_fields(index, data[ptr:ptr + self.chunk_sizes[index]])
+                ptr += self.chunk_sizes[index]
+            return self.__make_cloud(data, names)
+
+        lower = -np.inf if min_pt is None else np.asarray(min_pt, dtype=float)
+        upper = np.inf if max_pt is None else np.asarray(max_pt, dtype=float)
+        blocks = [np.empty(0, dtype=dtype)]
+        for index in chunks:
+            xyz = self.read_chunk(index, ['x', 'y', 'z']).to_ndarray()
+            inside = np.flatnonzero(((xyz >= lower) & (xyz <= upper)).all(axis=1))
+            if len(inside) == 0:
+                continue
+            data = np.empty(self.chunk_sizes[index], dtype=dtype)
+            self.__read_fields(index, data)
+            blocks.append(data[inside])
+        return self.__make_cloud(np.concatenate(blocks), names)
+
+    def close(self):
+        '''
+        Close the file if it's opened by the reader
+        '''
+        if self._own and self._file is not None:
+            self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __read_fields(self, index, data):
+        # fill the fields of the records with a chunk
+        chunk = self._footer['chunks'][index]
+        for name in data.dtype.names:
+            offset, size, uncompressed_size = chunk['fields'][name]
+            self._file.seek(offset)
+            buf = self._file.read(size)
+            if chunk['compressed']:
+                buf = _decompress_block((buf, uncompressed_size))
+            data[name] = np.frombuffer(buf, self._dtype[name], chunk['points'])
+
+    def __check_fields(self, fields):
+        if fields is None:
+            return list(self.names)
+        names = [fields] if isinstance(fields, str) else list(fields)
+        unknown = [name for name in names if name not in self.names]
+        if unknown:
+            raise ValueError('unknown fields: ' + ', '.join(unknown))
+        return names
+
+    def __chunks_in_box(self, min_pt, max_pt):
+        # indices of the chunks whose bounding boxes intersect the box
+        if min_pt is None and max_pt is None:
+            return range(self.num_chunks)
+        if not all(name in self.names for name in ('x', 'y', 'z')):
+            raise ValueError('the points have no coordinates to search in')
+        lower, upper = self.chunk_bounds()
+        outside = np.zeros(self.num_chunks, dtype=bool)
+        if min_pt is not None:
+            outside |= (upper < np.asarray(min_pt, dtype=float)).any(axis=1)
+        if max_pt is not None:
+            outside |= (lower > np.asarray(max_pt, dtype=float)).any(axis=1)
+        # chunks without bounds have no finite coordinates
+        return np.flatnonzero(~outside & ~np.isnan(lower).any(axis=1))
+
+    def __make_cloud(self, data, names):
+        fields = [field for name in names for field in self.fields if field[0] == name]
+        cloud = PointCloud(data, fields, copy=False)
+        viewpoint = self._footer.get('viewpoint')
+        if viewpoint:
+            cloud.sensor_origin = np.array(viewpoint[:3])
+            cloud.sensor_orientation = Quaternion(viewpoint[3:])
+        return cloud
+
+def loadpcc(file, fields=None, min_pt=None, max_pt=None):
+    '''
+    Load point cloud from ''.pcc'' file
+
+    # Parameter
+        file : file-like object or str
+            The file or the name of it to load.
+            File-like object need to support seek() and read()
+        fields : str or list of str
+            The names of the fields to read, all the fields by default
+        min_pt, max_pt : array of 3 float
+            Read only the points within the box, see ChunkedCloudReader.read
+    '''
+    with ChunkedCloudReader(file) as reader:
+        return reader.read(fields, min_pt, max_pt)
+
+def savepcc(file, cloud, chunk_points=65536, compress=True):
+    '''
+    Save point cloud into ''.pcc'' file
+
+    # Parameter
+        file : file-like object or str
+            The file or the name of it to save.
+            File-like object need to support seek(), tell() and write()
+        cloud : PointCloud
+            The the point cloud data that need saving
+        chunk_points : int
+            The number of points in a chunk
+        compress : bool
+            Compress the fields of the chunks with lzf
+    '''
+    with ChunkedCloudWriter(file, chunk_points, compress) as writer:
+        writer.write(cloud)
@@ -9,10 +9,15 @@ Implementation of following files:
 from __future__ import absolute_import
 
 import abc
+import json
+import os
 import re
 import logging
+import warnings
+from io import BytesIO
+from itertools import islice
 import numpy as np
-from ..pointcloud import _cast_fields_to_tuples, PointCloud
+from ..pointcloud import _cast_fields_to_tuples, _repack_fields, PointCloud
 from ..quaternion import Quaternion
 
 def _check_file(file, offset=0, ext=None, fileopt='r'):
@@ -30,6 +35,227 @@ def _check_file(file, offset=0, ext=None, fileopt='r'):
     fid.seek(offset, 0)
     return fid, own
 
+def _read_into(file, array):
+    # fill the contiguous array with the bytes read from file, without intermediate copies if
+    # the file supports readinto()
+    buf = memoryview(array.reshape(-1).view(np.uint8))
+    filled = 0
+    while filled < len(buf):
+        if hasattr(file, 'readinto'):
+            size = file.readinto(buf[filled:])
+        else:
+            chunk = file.read(len(buf) - filled)
+            size = len(chunk)
+            buf[filled:filled + size] = chunk
+        if not size:
+            raise ValueError('unexpected end of the file')
+        filled += size
+    return array
+
+def _write_from(file, array):
+    # write the data of array into file without converting it into bytes
+    array = np.ascontiguousarray(array).reshape(-1)
+    if array.size > 0:
+        file.write(memoryview(array.view(np.uint8)))
+
+def _import_lzf():
+    try:
+        import lzf
+    except ImportError:
+        raise ImportError(
+            'lzf decompression lib is required to read compressed .pcd file.' +
+            'lzf can be install from setup.py in https://github.com/teepark/python-lzf')
+    return lzf
+
+def _compress_block(block):
+    # compress a block of bytes with lzf. Incompressible data expands a little in LZF, leave
+    # room for it so that the payload can always be decompressed by readers
+    size = len(block)
+    return _import_lzf().compress(block, size + size // 16 + 64) if size > 0 else b''
+
+def _decompress_block(block):
+    # decompress a (compressed bytes, uncompressed size) pair compressed by _compress_block
+    compressed, size = block
+    buf = _import_lzf().decompress(compressed, size) if size > 0 else b''
+    if len(buf) != size:
+        raise ValueError('Error decompressing data')
+    return buf
+
+def _join_fields(columns):
+    # store the columns one after another in bytes, lzf only accepts bytes
+    return b''.join(np.ascontiguousarray(column).reshape(-1).view(np.uint8)
+                    for column in columns)
+
+def _field_columns(buf, dtype, count):
+    # the columns of count points stored one after another in buf, as views of buf
+    columns = {}
+    ptr = 0
+    for index, name in enumerate(dtype.names):
+        subtype = dtype[index]
+        columns[name] = np.frombuffer(buf, subtype, count, ptr)
+        ptr += subtype.itemsize * count
+    return columns
+
+def _split_fields(buf, data):
+    # fill the records of data from the columns stored one after another in buf
+    for name, column in _field_columns(buf, data.dtype, len(data)).items():
+        data[name] = column
+    return data
+
+def _select_records(data, names=None, index=None, copy=True):
+    # select the points at index (a slice or an array of indices) and the fields in names from
+    # the records or the columns in a dict. Only the selected fields are copied, and a view is
+    # returned if copy is False and the selection allows it
+    if names is None:
+        names = list(data.dtype.names)
+    if not copy:
+        data = data if index is None else data[index]
+        return data if names == list(data.dtype.names) else data[names]
+    columns = [data[name] if index is None else data[name][index] for name in names]
+    records = np.empty(len(columns[0]) if columns else 0,
+                       dtype=[(name, column.dtype, column.shape[1:])
+                              for name, column in zip(names, columns)])
+    for name, column in zip(names, columns):
+        records[name] = column
+    return records
+
+def _has_fileno(file):
+    # whether the file-like object is backed by a file descriptor, so that it can be mapped
+    try:
+        file.fileno()
+    except (AttributeError, OSError, ValueError):
+        return False
+    return True
+
+def _ordered_map(func, items, num_threads):
+    # map func over items with a pool of threads, the results are given in the order of items.
+    # At most twice the number of threads items are being processed at a time so that the
+    # items can be generated lazily. num_threads of 0 means all the cores
+    num_threads = num_threads or os.cpu_count() or 1
+    if num_threads == 1:
+        yield from map(func, items)
+        return
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(num_threads) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * num_threads:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def _write_ascii_rows(file, columns, line, block_size):
+    # write the rows of the 2-D columns with the format string of a line. The rows are
+    # formatted by blocks with a single format string, the values are converted to python
+    # numbers first so that the output is the same as formatting each value
+    if len(columns) == 0:
+        return
+    width = sum(column.shape[1] for column in columns)
+    for start in range(0, len(columns[0]), block_size):
+        block = [column[start:start + block_size] for column in columns]
+        values = np.empty((len(block[0]), width), dtype=object)
+        offset = 0
+        for column in block:
+            for index in range(column.shape[1]):
+                values[:, offset] = column[:, index].tolist()
+                offset += 1
+        file.write((line * len(values)) % tuple(values.ravel().tolist()))
+
+# np.loadtxt has a tokenizer written in C since numpy 1.23, it's faster than np.fromstring
+_LOADTXT_IN_C = tuple(map(int, np.__version__.split('.')[:2])) >= (1, 23)
+
+def _parse_numbers(text, columns=None):
+    # parse whitespace separated numbers, raise ValueError if some token is not a number or
+    # if the rows don't have the given number of columns
+    if len(text.strip()) == 0: # np.fromstring gives [-1.] for blank text
+        return np.empty(0)
+    if columns is not None and _LOADTXT_IN_C:
+        values = np.loadtxt(BytesIO(text), dtype=float, comments=None, ndmin=2)
+        if values.size > 0 and values.shape[1] != columns:
+            raise ValueError('wrong number of columns')
+        return values.reshape(-1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('error', DeprecationWarning)
+        try:
+            values = np.fromstring(text, dtype=float, sep=' ')
+        except DeprecationWarning:
+            raise ValueError('invalid number in the text')
+    if columns is not None and len(_malformed_lines(text, columns)[0]) > 0:
+        raise ValueError('wrong number of columns')
+    return values
+
+def _malformed_lines(text, columns):
+    # find the non-empty lines that don't have the given number of tokens. Return the indices
+    # of the lines, the numbers of their tokens and the end of each line
+    raw = np.frombuffer(text, dtype=np.uint8)
+    space = raw <= ord(' ') # whitespaces and control characters
+    starts = ~space
+    starts[1:] &= space[:-1]
+    ends = np.append(np.flatnonzero(raw == ord('\n')), len(raw))
+    tokens = np.diff(np.searchsorted(np.flatnonzero(starts), ends), prepend=0)
+    malformed = np.flatnonzero((tokens != columns) & (tokens != 0))
+    return malformed, tokens[malformed], ends
+
+def _parse_ascii(body, dtype):
+    # parse the ascii rows of points into records of dtype. The whole body is tokenized at once
+    # into a flat array of numbers, which is then split into fields. Only if it fails, the rows
+    # with wrong number of values are skipped and the others are parsed again, and the rows
+    # with invalid numbers are found by parsing line by line
+    logger = logging.getLogger('pcl.io.PCDReader.read')
+    if isinstance(body, str):
+        body = body.encode('ascii')
+    columns = sum(int(np.prod(dtype[idx].shape)) for idx in range(len(dtype)))
+
+    try:
+        values = _parse_numbers(body, columns)
+    except ValueError:
+        malformed, tokens, ends = _malformed_lines(body, columns)
+        if len(malformed) > 0:
+            raw = np.frombuffer(body, dtype=np.uint8).copy()
+            for line, count in zip(malformed, tokens):
+                if line < 10:
+                    logger.warning('skipping data line %d with %d values, expecting %d',
+                                   line + 1, count, columns)
+                raw[ends[line - 1] + 1 if line > 0 else 0:ends[line]] = ord(' ')
+            body = raw.tobytes()
+        try:
+            values = _parse_numbers(body)
+        except ValueError:
+            # invalid numbers, parse the lines one by one
+            rows = []
+            lines = []
+            for number, line in enumerate(body.splitlines()):
+                try:
+                    row = _parse_numbers(line)
+                except ValueError:
+                    logger.warning('skipping data line %d with invalid numbers', number + 1)
+                    continue
+                if len(row) > 0:
+                    rows.append(row)
+                    lines.append(line)
+            values = np.concatenate(rows) if rows else np.empty(0)
+            body = b'\n'.join(lines)
+
+    values = values.reshape(-1, columns)
+    texts = None
+    data = np.empty(len(values), dtype=dtype)
+    offset = 0
+    for idx, name in enumerate(dtype.names):
+        subtype = dtype[idx]
+        count = int(np.prod(subtype.shape))
+        if subtype.base.kind in 'iu' and subtype.base.itemsize == 8:
+            # 64-bit integers may not be exact in double, convert them from the texts
+            if texts is None:
+                texts = np.array(body.split()).reshape(-1, columns)
+            column = texts[:, offset:offset + count].astype(subtype.base)
+        else:
+            column = values[:, offset:offset + count]
+        data[name] = column.reshape((-1,) + subtype.shape)
+        offset += count
+    return data
+
 class FileReader(metaclass=abc.ABCMeta):
     '''
     Point Cloud Data (FILE) file format reader interface.
@@ -97,6 +323,10 @@ class FileWriter(metaclass=abc.ABCMeta):
         '''
         pass
 
+# a line of the PCD header and the complete DATA line ending the header
+_HEADER_LINE = re.compile(r'(\w+)\s+([\w\s\.]+)')
+_DATA_LINE = re.compile(rb'(?:^|\n)[ \t]*DATA[^\n]*\n')
+
 class PCDReader(FileReader):
     '''
     Point Cloud Data (PCD) file format reader.
@@ -107,7 +337,7 @@ class PCDReader(FileReader):
         for line in lines:
             if line.startswith('#') or len(line) < 2:
                 continue
-            match = re.match(r'(\w+)\s+([\w\s\.]+)', line)
+            match = _HEADER_LINE.match(line)
             if not match:
                 logging.getLogger('pcl.io.PCDReader')\
                        .warning("warning: can't understand line: %s", line)
@@ -158,9 +388,10 @@ class PCDReader(FileReader):
                len(header['size']) == len(header['count']):
             raise TypeError('length of FIELD, TYPE, SIZE and COUNT must be equal')
 
-        if not header['data_type'] in ('ascii', 'binary', 'binary_compressed'):
+        if not header['data_type'] in ('ascii', 'binary', 'binary_compressed',
+                                       'binary_compressed_chunked'):
             raise TypeError('unknown data type: %s ,' + header['data_type'] +
-                            'should be ascii/binary/binary_compressed')
+                            'should be ascii/binary/binary_compressed/binary_compressed_chunked')
         elif header['data_type'] is not 'ascii' and 'points' not in header:
             raise TypeError('POINTS field is essential for reading binary pcd file')
 
@@ -200,7 +431,7 @@ class PCDReader(FileReader):
             version : float
                 The FILE version of the file (either .6(FILE_V6) or .7(FILE_V7))
             data_type : str
-                The type of data (ascii, binary, binary_compressed)
+                The type of data (ascii, binary, binary_compressed, binary_compressed_chunked)
             data_offset : int
                 The offset of raw cloud data within the file
         '''
@@ -224,15 +455,139 @@ class PCDReader(FileReader):
         header['data_offset'] = data_offset
         return header
 
-    def read(self, file, offset=0):
+    def read_headers(self, files, num_threads=0, prefix_size=4096, cache=None):
+        '''
+        Read the headers of many .pcd files into a table.
+
+        Only a prefix of each file is read, which is extended if the header is longer. The files
+        are read in a pool of threads. The headers can be cached in a sidecar index file, then
+        only the files whose modification time or size changed are read again.
+
+        # Parameters
+            files : sequence of str
+                The names of the files
+            num_threads : int
+                Number of threads reading the files, 0 means all the cores.
+            prefix_size : int
+                The number of bytes read at first from each file
+            cache : str
+                The name of the index file (in JSON) storing the headers
+
+        # Returns
+            A dictionary of columns, the rows are the files in the given order
+            file : array of str
+                The names of the files
+            file_size : array of int
+                The sizes of the files
+            version, width, height, points, data_offset : array of numbers
+                The headers, which are NaN for version or -1 for integers if they are missing
+            viewpoint : (N, 7) array of float
+                The viewpoints, NaN if missing
+            fields, size, type, count : array of tuples
+                The fields and their descriptions, empty tuples if missing
+            data_type : array of str
+                The type of data, empty if missing
+            error : array of str
+                The error message if the header can't be read, otherwise empty
+        '''
+        files = [os.path.abspath(name) for name in files]
+        entries = {}
+        if cache is not None and os.path.exists(cache):
+            with open(cache, 'r') as fid:
+                entries = json.load(fid).get('entries', {})
+
+        def scan(name):
+            try:
+                stat = os.stat(name)
+            except OSError as error:
+                return {'error': str(error)}
+            entry = entries.get(name)
+            if entry is not None and entry['mtime'] == stat.st_mtime_ns and \
+               entry['size'] == stat.st_size:
+                return entry
+            entry = {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+            try:
+                entry['header'] = self.__scan_header(name, prefix_size)
+            except (OSError, ValueError, TypeError, KeyError, IndexError) as error:
+                entry['error'] = str(error) or type(error).__name__
+            return entry
+
+        scanned = list(_ordered_map(scan, files, num_threads))
+
+        if cache is not None:
+            updated = {name: entry for name, entry in zip(files, scanned) if 'mtime' in entry}
+            if updated != entries:
+                with open(cache + '.tmp', 'w') as fid:
+                    json.dump({'version': 1, 'entries': updated}, fid)
+                os.replace(cache + '.tmp', cache)
+
+        table = {'file': np.array(files, dtype=object),
+                 'file_size': np.array([entry.get('size', -1) for entry in scanned], dtype=int),
+                 'error': np.array([entry.get('error', '') for entry in scanned], dtype=object)}
+        headers = [entry.get('header', {}) for entry in scanned]
+        table['version'] = np.array([header.get('version', np.nan) for header in headers])
+        for key in ('width', 'height', 'points', 'data_offset'):
+            table[key] = np.array([header.get(key, -1) for header in headers], dtype=int)
+        table['viewpoint'] = np.array([header['viewpoint'] if len(header.get('viewpoint', ()))
+                                       == 7 else [np.nan] * 7 for header in headers]).reshape(-1, 7)
+        for key in ('fields', 'size', 'type', 'count'):
+            table[key] = np.empty(len(headers), dtype=object)
+            table[key][:] = [tuple(header.get(key, ())) for header in headers]
+        table['data_type'] = np.array([header.get('data_type', '') for header in headers],
+                                      dtype=object)
+        return table
+
+    def __scan_header(self, name, prefix_size):
+        # read and check the header from the prefix of a file, the prefix is doubled until the
+        # DATA line is complete
+        with open(name, 'rb') as fid:
+            prefix = fid.read(prefix_size)
+            while True:
+                match = _DATA_LINE.search(prefix)
+                if match:
+                    break
+                more = fid.read(len(prefix))
+                if len(more) == 0:
+                    raise ValueError('missing DATA line in the header')
+                prefix += more
+        lines = [line.strip() for line in prefix[:match.end()].decode('ascii').splitlines()]
+        header = self.__parse_header([line for line in lines if len(line) > 0])
+        self.check_header(header)
+        header['data_offset'] = match.end()
+        return header
+
+    READ_BLOCK_SIZE = 65536 # number of points read at once when selecting points of a stream
+
+    def read(self, file, offset=0, mmap=False, num_threads=0, fields=None, rows=None,
+             points=None):
         '''Read a point cloud data from .pcd file and store it into a pcl.PointCloud.
 
+        Part of the fields and of the points can be selected. The selection of binary files
+        is done on a memory map of the file if the file-like object supports fileno(),
+        otherwise the unwanted points are skipped by seeking, so that the unwanted data is
+        never copied. Other types of data are decoded entirely before the selection.
+
         # Parameters
             file : file-like object or str
                 The file containing the actual PointCloud data or the name of it
                 File-like object need to support seek() and read()
             offset : int
                 The offset in the file where to expect the true header to begin.
+            mmap : bool or str
+                Map the points of a binary file into memory instead of reading them, so that the
+                data is only loaded when it's accessed. Use True or 'r' for read-only data and 'c'
+                for copy-on-write data (modifications are not written back to the file).
+                The file-like object needs to support fileno() in this mode.
+            num_threads : int
+                Number of threads decompressing the chunks of binary_compressed_chunked files,
+                0 means all the cores.
+            fields : str or list of str
+                The names of the fields to read, all the fields by default
+            rows : int, slice or sequence of int
+                The rows of an organized cloud to read, the cloud keeps organized
+            points : int, slice or sequence of int
+                The indices of the points to read, the cloud is unorganized then.
+                Rows and points can't be selected together.
 
         # Returns
             cloud : PointCloud
@@ -240,79 +595,244 @@ class PCDReader(FileReader):
             version : float
                 The FILE version of the file (either .6(FILE_V6) or .7(FILE_V7))
         '''
+        if mmap not in (False, None, True, 'r', 'c'):
+            raise ValueError("mmap should be a bool, 'r' or 'c'")
         file, own = _check_file(file, offset, 'pcd', 'rb')
+        organized = True
+        selected = fields is not None or rows is not None or points is not None
 
         try:
-            header = []
-            line = ''
-            while not line.startswith('DATA'):
-                line = file.readline().strip()
-                if isinstance(line, bytes):
-                    line = line.decode('ascii')
-                if len(line) > 0:
-                    header.append(line)
-            header = self.__parse_header(header)
-            self.check_header(header) # throw if important fields are not invalid
-
-            fields = [(_f, _s, _t, _c) for _f, _s, _t, _c in zip(
-                header['fields'], header['size'], header['type'], header['count'])]
-            fields, _ = _cast_fields_to_tuples(fields)
-            dtype = np.dtype(fields)
+            header, point_fields, dtype = self.__read_data_header(file)
+            if mmap and header['data_type'] != 'binary':
+                raise ValueError('only binary pcd files can be memory mapped')
+            names, index, shape = self.__selection(header, dtype, fields, rows, points)
 
             if header['data_type'] == 'ascii':
-                data = np.loadtxt(file, dtype=dtype, delimiter=' ')
+                data = _parse_ascii(file.read(), dtype)
+                if len(data) != header.get('points', len(data)):
+                    logging.getLogger('pcl.io.PCDReader.read').warning(
+                        '%d points are read instead of %d, the cloud is not organized',
+                        len(data), header['points'])
+                    organized = False
+            elif header['data_type'] == 'binary' and header['points'] > 0 and \
+                 (mmap or selected and _has_fileno(file)):
+                data = np.memmap(file, dtype=dtype, mode='c' if mmap == 'c' else 'r',
+                                 offset=file.tell(), shape=(header['points'],))
+                if selected:
+                    data = _select_records(data, names, index, copy=not mmap)
+                    selected = False
+            elif header['data_type'] == 'binary' and selected and \
+                 (index is None or isinstance(index, slice) and
+                  index.indices(header['points'])[2] > 0):
+                data = self.__read_slice(file, header, dtype, names, index or slice(None))
+                selected = False
             elif header['data_type'] == 'binary':
-                buf = file.read(header['points']*dtype.itemsize)
-                data = np.fromstring(buf, dtype=dtype)
+                data = _read_into(file, np.empty(header['points'], dtype=dtype))
             elif header['data_type'] == 'binary_compressed':
-                # the conversion method is from 'pypcd' lib
-                import struct
-                try:
-                    import lzf
-                except ImportError:
-                    raise ImportError(
-                        'lzf decompression lib is required to read compressed .pcd file.' +
-                        'lzf can be install from setup.py in https://github.com/teepark/python-lzf')
-
-                fmt = 'II'
-                compressed_size, uncompressed_size = struct.unpack(
-                    fmt, file.read(struct.calcsize(fmt)))
-                compressed_data = file.read(compressed_size)
-
-                buf = lzf.decompress(compressed_data, uncompressed_size)
-                if len(buf) != uncompressed_size:
-                    raise Exception('Error decompressing data')
-                # the data is stored field-by-field
-                data = np.zeros(header['points'], dtype=dtype)
+                data = _select_records(self.__read_compressed(file, header, dtype),
+                                       names or list(dtype.names), index)
+                selected = False
+            elif header['data_type'] == 'binary_compressed_chunked':
+                data = np.empty(header['points'], dtype=dtype)
                 ptr = 0
-                for index, name in enumerate(dtype.names):
-                    subtype = dtype[index]
-                    step = subtype.itemsize * header['points']
-                    column = np.fromstring(buf[ptr:(ptr + step)], subtype)
-                    data[name] = column
-                    ptr += step
+                for buf in self.__iter_chunks(file, header, dtype, num_threads):
+                    count = len(buf) // dtype.itemsize
+                    _split_fields(buf, data[ptr:ptr + count])
+                    ptr += count
             # No else, for that the type is checked in header checking
         finally:
             if own:
                 file.close()
 
+        if selected:
+            data = _select_records(data, names, index)
+        if names is not None:
+            point_fields = [field for name in names for field in point_fields
+                            if field[0] == name]
+        if shape is not None:
+            header = dict(header, width=shape[0], height=shape[1])
+        elif index is not None:
+            organized = False
+        cloud = self.__make_cloud(data, point_fields, header, organized)
+        ver = header['version'] if 'version' in header else .7
+        return cloud, ver
+
+    def iter_read(self, file, chunk_points, offset=0):
+        '''Read a point cloud data from .pcd file as a stream of chunks.
+
+        The chunks are unorganized PointClouds with at most chunk_points points, which share
+        the fields and the sensor pose in the header. ASCII and binary files are read chunk by
+        chunk, while the payload of binary_compressed files is a single compressed block which
+        has to be decompressed at once, then the chunks are sliced from it. The compressed chunks
+        of binary_compressed_chunked files are decompressed one after another.
+
+        # Parameters
+            file : file-like object or str
+                The file containing the actual PointCloud data or the name of it
+                File-like object need to support seek() and read()
+            chunk_points : int
+                The maximum number of points in a chunk
+            offset : int
+                The offset in the file where to expect the true header to begin.
+
+        # Returns
+            chunks : generator of PointCloud
+        '''
+        if chunk_points <= 0:
+            raise ValueError('chunk_points should be a positive number')
+        file, own = _check_file(file, offset, 'pcd', 'rb')
+
+        try:
+            header, fields, dtype = self.__read_data_header(file)
+            if header['data_type'] == 'ascii':
+                lines = (line for line in file if len(line.strip()) > 0)
+                while True:
+                    chunk = list(islice(lines, chunk_points))
+                    if len(chunk) == 0:
+                        break
+                    data = _parse_ascii(chunk[0][:0].join(chunk), dtype)
+                    yield self.__make_cloud(data, fields, header)
+            elif header['data_type'] == 'binary':
+                remain = header['points']
+                while remain > 0:
+                    count = min(remain, chunk_points)
+                    data = _read_into(file, np.empty(count, dtype=dtype))
+                    yield self.__make_cloud(data, fields, header)
+                    remain -= count
+            elif header['data_type'] == 'binary_compressed':
+                data = _select_records(self.__read_compressed(file, header, dtype),
+                                       list(dtype.names))
+                for start in range(0, len(data), chunk_points):
+                    yield self.__make_cloud(data[start:start + chunk_points], fields, header)
+            elif header['data_type'] == 'binary_compressed_chunked':
+                for buf in self.__iter_chunks(file, header, dtype, 1):
+                    data = _split_fields(buf, np.empty(len(buf) // dtype.itemsize, dtype))
+                    for start in range(0, len(data), chunk_points):
+                        yield self.__make_cloud(data[start:start + chunk_points], fields, header)
+        finally:
+            if own:
+                file.close()
+
+    def __read_data_header(self, file):
+        # read and check the header, then return the header, the fields and the point type.
+        # the file is placed at the beginning of the data afterwards
+        header = []
+        line = ''
+        while not line.startswith('DATA'):
+            line = file.readline().strip()
+            if isinstance(line, bytes):
+                line = line.decode('ascii')
+            if len(line) > 0:
+                header.append(line)
+        header = self.__parse_header(header)
+        self.check_header(header) # throw if important fields are not invalid
+
+        fields = [(_f, _s, _t, _c) for _f, _s, _t, _c in zip(
+            header['fields'], header['size'], header['type'], header['count'])]
+        fields, _ = _cast_fields_to_tuples(fields)
+        return header, fields, np.dtype(fields)
+
+    def __read_compressed(self, file, header, dtype):
+        # read the payload of binary_compressed data
+        # the conversion method is from 'pypcd' lib
+        import struct
+        _import_lzf()
+
+        fmt = 'II'
+        compressed_size, uncompressed_size = struct.unpack(
+            fmt, file.read(struct.calcsize(fmt)))
+        buf = _decompress_block((file.read(compressed_size), uncompressed_size))
+        # the data is stored field-by-field, the columns are views of the decompressed buffer
+        return _field_columns(buf, dtype, header['points'])
+
+    def __selection(self, header, dtype, fields, rows, points):
+        # check the selection of fields, rows and points. Return the names of the fields, the
+        # index of the points (a slice or an array of indices) and the (width, height) of the
+        # selected rows, which are None if they are not selected
+        names = None
+        if fields is not None:
+            names = [fields] if isinstance(fields, str) else list(fields)
+            unknown = [name for name in names if name not in dtype.names]
+            if unknown:
+                raise ValueError('unknown fields: ' + ', '.join(unknown))
+        if rows is not None and points is not None:
+            raise ValueError('rows and points can not be selected together')
+
+        index = shape = None
+        if rows is not None:
+            width, height = header.get('width', header['points']), header.get('height', 1)
+            if isinstance(rows, slice):
+                selection = range(height)[rows]
+                if selection.step == 1:
+                    index = slice(selection.start * width, selection.stop * width)
+                selection = np.array(selection, dtype=int)
+            else:
+                selection = np.arange(height)[np.atleast_1d(np.asarray(rows, dtype=int))]
+            if index is None:
+                index = (selection[:, np.newaxis] * width + np.arange(width)).reshape(-1)
+            shape = (width, len(selection))
+        elif points is not None:
+            if isinstance(points, slice):
+                index = points
+            else:
+                index = np.atleast_1d(np.asarray(points, dtype=int))
+        return names, index, shape
+
+    def __read_slice(self, file, header, dtype, names, index):
+        # read the points in a slice with positive step from binary data, by blocks of points
+        # starting at the selected points. The points before the slice are skipped by seeking
+        start, stop, step = index.indices(header['points'])
+        size = step * max(1, self.READ_BLOCK_SIZE // step)
+        file.seek(start * dtype.itemsize, 1)
+        data = np.empty(len(range(start, stop, step)),
+                        dtype=_select_records(np.empty(0, dtype=dtype), names).dtype)
+        for begin in range(start, stop, size):
+            block = _read_into(file, np.empty(min(size, stop - begin), dtype=dtype))
+            ptr = (begin - start) // step
+            block = block[::step]
+            for name in data.dtype.names:
+                data[name][ptr:ptr + len(block)] = block[name]
+        return data
+
+    def __iter_chunks(self, file, header, dtype, num_threads):
+        # read the payload of binary_compressed_chunked data as decompressed chunks. Each
+        # chunk is stored as the payload of binary_compressed data, the chunks are read one
+        # after another and decompressed in a pool of threads
+        import struct
+        _import_lzf()
+
+        def blocks():
+            remain = header['points'] * dtype.itemsize
+            fmt = 'II'
+            while remain > 0:
+                compressed_size, uncompressed_size = struct.unpack(
+                    fmt, file.read(struct.calcsize(fmt)))
+                if uncompressed_size == 0 or uncompressed_size % dtype.itemsize != 0:
+                    raise ValueError('invalid size of compressed chunk')
+                yield file.read(compressed_size), uncompressed_size
+                remain -= uncompressed_size
+
+        return _ordered_map(_decompress_block, blocks(), num_threads)
+
+    def __make_cloud(self, data, fields, header, organized=False):
+        # create the cloud with the metadata in header
         params = {'points': data, 'fields': fields, 'copy': False}
-        for field in ('width', 'height'):
-            if field in header:
-                params[field] = header[field]
+        if organized:
+            for field in ('width', 'height'):
+                if field in header:
+                    params[field] = header[field]
         cloud = PointCloud(**params)
 
         if 'viewpoint' in header:
             cloud.sensor_orientation = Quaternion(header['viewpoint'][3:])
             cloud.sensor_origin = np.array(header['viewpoint'][:3])
-
-        ver = header['version'] if 'version' in header else .7
-        return cloud, ver
+        return cloud
 
 class PCDWriter(FileWriter):
     '''
     Point Cloud Data (PCD) file format writer.
     '''
+    ASCII_BLOCK_SIZE = 65536 # number of points formatted at once when writing ascii files
 
     def __parse_descr(self, descr):
         # parse description string into (size, type, count)
@@ -396,21 +916,16 @@ DATA {data}
                 fmtstr = '%d'
             elif dtype == 'U':
                 fmtstr = '%u'
-            count = int(count)
-            if count > 1:
-                fmtstr = ' '.join([fmtstr] * count)
-            fields.append(fmtstr)
+            fields.append([fmtstr] * int(count))
+        fields = sum(fields, [])
+        line = ' '.join(fields) + '\n'
 
         file, own = _check_file(file, 0, 'pcd', 'w')
 
         try:
             file.write(self.generate_header(cloud, 'ascii'))
-            for point in cloud:
-                line = []
-                for idx, data in enumerate(tuple(point)):
-                    line.append(fields[idx] % data)
-                file.write(' '.join(line))
-                file.write('\n')
+            columns = [cloud.to_ndarray(name).reshape(len(cloud), -1) for name in cloud.names]
+            _write_ascii_rows(file, columns, line, self.ASCII_BLOCK_SIZE)
         finally:
             if own:
                 file.close()
@@ -429,52 +944,62 @@ DATA {data}
 
         try:
             file.write(self.generate_header(cloud, 'binary').encode('ascii'))
-            file.write(cloud.data.tostring('C'))
+            # remove the padding of deleted fields
+            _write_from(file, _repack_fields(cloud.data))
         finally:
             if own:
                 file.close()
 
-    def write_binary_compressed(self, file, cloud):
+    def write_binary_compressed(self, file, cloud, chunk_points=None, num_threads=0):
         '''
         Save point cloud data to a PCD file containing n-D points, in compressed binary format
 
+        The payload is a single LZF block of the fields stored one after another by default,
+        which can be read by PCL. If chunk_points is given, the points are split into chunks
+        which are compressed separately in a pool of threads and the file is saved with
+        binary_compressed_chunked data type. Such files can only be read by PCDReader.
+
         # Parameters
             file : file-like object or str
                 The output file or name of it.
             cloud : PointCloud
                 The the point cloud data that need saving
+            chunk_points : int
+                The number of points in a compressed chunk, None for a single block.
+            num_threads : int
+                Number of threads compressing the chunks, 0 means all the cores.
         '''
         import struct
-        try:
-            import lzf
-        except ImportError:
-            raise ImportError(
-                'lzf decompression lib is required to read compressed .pcd file.' +
-                'lzf can be install from setup.py in https://github.com/teepark/python-lzf')
+        _import_lzf()
+        if chunk_points is not None and chunk_points <= 0:
+            raise ValueError('chunk_points should be a positive number')
 
         file, own = _check_file(file, 0, 'pcd', 'wb')
 
         try:
-            file.write(self.generate_header(cloud, 'binary_compressed').encode('ascii'))
-
-            uncompressed_lst = []
-            for field in cloud.names:
-                column = np.ascontiguousarray(cloud.data[field]).tostring('C')
-                uncompressed_lst.append(column)
-            uncompressed = b''.join(uncompressed_lst)
-            uncompressed_size = len(uncompressed)
-            buf = lzf.compress(uncompressed)
-            if buf is None:
-                logging.getLogger('pcl.io.PCDReader.write_binary_compressed')\
-                    .warning("compression didn't shrink the file during processing, \
-which may cause data loss")
-                buf = uncompressed
-                compressed_size = uncompressed_size
-            else:
-                compressed_size = len(buf)
+            data_type = 'binary_compressed' if chunk_points is None else \
+                        'binary_compressed_chunked'
+            file.write(self.generate_header(cloud, data_type).encode('ascii'))
+
+            columns = [cloud.to_ndarray(name) for name in cloud.names]
             fmt = 'II'
-            file.write(struct.pack(fmt, compressed_size, uncompressed_size))
-            file.write(buf)
+            if chunk_points is None:
+                uncompressed = _join_fields(columns)
+                del columns
+                buf = _compress_block(uncompressed)
+                file.write(struct.pack(fmt, len(buf), len(uncompressed)))
+                file.write(buf)
+            else:
+                # the sizes of the chunks are stored before each of them
+                itemsize = sum(column.dtype.itemsize * int(np.prod(column.shape[1:]))
+                               for column in columns)
+                starts = range(0, len(cloud), chunk_points)
+                blocks = (_join_fields([column[start:start + chunk_points]
+                                        for column in columns]) for start in starts)
+                for start, buf in zip(starts, _ordered_map(_compress_block, blocks, num_threads)):
+                    count = min(chunk_points, len(cloud) - start)
+                    file.write(struct.pack(fmt, len(buf), count * itemsize))
+                    file.write(buf)
         finally:
             if own:
                 file.close()
@@ -488,7 +1013,9 @@ which may cause data loss")
             cloud : PointCloud
                 The the point cloud data that need saving
             opts : dict
-                additional options for the writer
+                additional options for the writer: binary (bool), compress (bool), and
+                chunk_points (int), num_threads (int) for compressed data, see
+                write_binary_compressed
         '''
         if 'binary' in opts and isinstance(opts['binary'], bool):
             binary = opts['binary']
@@ -503,13 +1030,14 @@ which may cause data loss")
 
         if binary:
             if compress:
-                self.write_binary_compressed(file, cloud)
+                self.write_binary_compressed(file, cloud, opts.get('chunk_points'),
+                                             opts.get('num_threads', 0))
             else:
                 self.write_binary(file, cloud)
         else:
             self.write_ascii(file, cloud)
 
-def loadpcd(file):
+def loadpcd(file, mmap=False, num_threads=0, fields=None, rows=None, points=None):
     '''
     Load point cloud from ''.pcd'' file
 
@@ -517,11 +1045,58 @@ def loadpcd(file):
         file : file-like object or str
             The file or the name of it to load.
             File-like object need to support seek() and read()
+        mmap : bool or str
+            Map the points of a binary file into memory, see PCDReader.read
+        num_threads : int
+            Number of threads decompressing binary_compressed_chunked data, see PCDReader.read
+        fields : str or list of str
+            The names of the fields to read, see PCDReader.read
+        rows : int, slice or sequence of int
+            The rows of an organized cloud to read, see PCDReader.read
+        points : int, slice or sequence of int
+            The indices of the points to read, see PCDReader.read
     '''
-    cloud, _ = PCDReader().read(file)
+    cloud, _ = PCDReader().read(file, mmap=mmap, num_threads=num_threads, fields=fields,
+                                rows=rows, points=points)
     return cloud
 
-def savepcd(file, cloud, binary=True, compress=False):
+def iter_pcd(file, chunk_points=65536):
+    '''
+    Load point cloud from ''.pcd'' file as a stream of chunks, see PCDReader.iter_read
+
+    # Parameter
+        file : file-like object or str
+            The file or the name of it to load.
+            File-like object need to support seek() and read()
+        chunk_points : int
+            The maximum number of points in a chunk
+    '''
+    return PCDReader().iter_read(file, chunk_points)
+
+def scanpcd(path, num_threads=0, cache=None):
+    '''
+    Read the headers of ''.pcd'' files in a directory into a table, see PCDReader.read_headers
+
+    # Parameter
+        path : str or sequence of str
+            The directory, which is searched recursively, or the names of the files
+        num_threads : int
+            Number of threads reading the files, 0 means all the cores.
+        cache : str
+            The name of the index file (in JSON) storing the headers, so that only new or
+            modified files are read
+    '''
+    if isinstance(path, str):
+        files = []
+        for root, dirs, names in os.walk(path):
+            dirs.sort()
+            files.extend(os.path.join(root, name) for name in sorted(names)
+                         if name.endswith('.pcd'))
+    else:
+        files = list(path)
+    return PCDReader().read_headers(files, num_threads, cache=cache)
+
+def savepcd(file, cloud, binary=True, compress=False, chunk_points=None, num_threads=0):
     '''
     Save point cloud into ''.pcd'' file
 
@@ -536,17 +1111,442 @@ def savepcd(file, cloud, binary=True, compress=False):
                 otherwise data is saved in ascii format.
         compress : bool
             Indicating whether compress binary data when saving
+        chunk_points : int
+            Compress the points by chunks of chunk_points points in parallel, the file is saved
+            with binary_compressed_chunked data type which PCL can't read.
+            See PCDWriter.write_binary_compressed
+        num_threads : int
+            Number of threads compressing the chunks, 0 means all the cores.
     '''
-    PCDWriter().write(file, cloud, binary=binary, compress=compress)
+    PCDWriter().write(file, cloud, binary=binary, compress=compress,
+                      chunk_points=chunk_points, num_threads=num_threads)
+
+# numpy types of the scalar types in PLY files, including the aliases
+_PLY_TYPES = {'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+              'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+              'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+              'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8'}
+
+_PLY_BYTE_ORDERS = {'ascii': '=', 'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+def _ply_row_dtype(properties, lengths, order):
+    # the records of an element, the list properties have the given lengths. The count of a
+    # list is stored in the field '<name>.count'
+    fields = []
+    for name, ptype in properties:
+        if isinstance(ptype, tuple):
+            fields.append((name + '.count', order + ptype[0]))
+            fields.append((name, order + ptype[1], (lengths[name],)))
+        else:
+            fields.append((name, order + ptype))
+    return np.dtype(fields)
 
 class PLYReader(FileReader):
     '''
     Polygon File Format (PLY) reader.
+
+    The vertex element is read as the points and the face element is read as the polygons of
+    a PolygonMesh, other elements are skipped. Elements without list properties, as well as
+    elements whose lists have the same length (such as triangle meshes), are read by blocks
+    directly into the records of the element.
     '''
-    pass # TODO: Not Implemented
+
+    def read_header(self, file, offset=0):
+        '''
+        Read the header of a .ply file.
+
+        # Parameters
+            file : file-like object or str
+                The file or the name of it to load.
+                File-like object need to support seek() and read()
+            offset : int
+                The offset in the file where to expect the true header to begin.
+
+        # Returns
+            A dictionary of the headers with following keys
+            format : str
+                The format of data (ascii, binary_little_endian, binary_big_endian)
+            version : str
+                The version of the format
+            comments : list of str
+                The comments in the header
+            elements : list of dict
+                The elements with their 'name', 'count' and 'properties'. Properties are pairs
+                of name and numpy type, the type of a list property is a pair of the count type
+                and the item type.
+            data_offset : int
+                The offset of the data within the file
+        '''
+        file, own = _check_file(file, offset, 'ply', 'rb')
+
+        try:
+            header = self.__read_header(file)
+            header['data_offset'] = file.tell()
+        finally:
+            if own:
+                file.close()
+        return header
+
+    def __read_header(self, file):
+        # read the header, the file is placed at the beginning of the data afterwards
+        lines = []
+        line = ''
+        while line != 'end_header':
+            line = file.readline()
+            if len(line) == 0:
+                raise ValueError('unexpected end of the file in ply header')
+            if isinstance(line, bytes):
+                line = line.decode('ascii')
+            line = line.strip()
+            lines.append(line)
+        if lines[0] != 'ply':
+            raise ValueError('not a ply file')
+
+        header = {'comments': [], 'elements': []}
+        for line in lines[1:-1]:
+            words = line.split()
+            if len(words) == 0 or words[0] == 'obj_info':
+                continue
+            elif words[0] == 'comment':
+                header['comments'].append(line[len('comment'):].strip())
+            elif words[0] == 'format' and len(words) == 3:
+                if words[1] not in _PLY_BYTE_ORDERS:
+                    raise ValueError('unknown ply format: ' + words[1])
+                header['format'], header['version'] = words[1], words[2]
+            elif words[0] == 'element' and len(words) == 3:
+                header['elements'].append({'name': words[1], 'count': int(words[2]),
+                                           'properties': []})
+            elif words[0] == 'property' and len(header['elements']) > 0:
+                try:
+                    if words[1] == 'list' and len(words) == 5:
+                        prop = (words[4], (_PLY_TYPES[words[2]], _PLY_TYPES[words[3]]))
+                    elif len(words) == 3:
+                        prop = (words[2], _PLY_TYPES[words[1]])
+                    else:
+                        raise KeyError(line)
+                except KeyError:
+                    raise ValueError('invalid ply property: ' + line)
+                header['elements'][-1]['properties'].append(prop)
+            else:
+                logging.getLogger('pcl.io.PLYReader').warning(
+                    "warning: can't understand line: %s", line)
+
+        if 'format' not in header:
+            raise ValueError('missing format in ply header')
+        return header
+
+    def read(self, file, offset=0):
+        '''Read the vertices and the faces from .ply file.
+
+        # Parameters
+            file : file-like object or str
+                The file containing the actual data or the name of it
+                File-like object need to support seek() and read()
+            offset : int
+                The offset in the file where to expect the true header to begin.
+
+        # Returns
+            cloud : PointCloud
+                The vertices with their scalar properties as fields
+            mesh : PolygonMesh
+                The mesh of the cloud and the faces, None if there's no face element
+        '''
+        from ..polygonmesh import PolygonMesh, Vertices
+
+        file, own = _check_file(file, offset, 'ply', 'rb')
+
+        try:
+            header = self.__read_header(file)
+            order = _PLY_BYTE_ORDERS[header['format']]
+            lines = (line for line in file if len(line.strip()) > 0) \
+                    if header['format'] == 'ascii' else None
+            elements = {}
+            for element in header['elements']:
+                if header['format'] == 'ascii':
+                    elements[element['name']] = self.__read_ascii_element(lines, element)
+                else:
+                    elements[element['name']] = self.__read_binary_element(file, element, order)
+        finally:
+            if own:
+                file.close()
+
+        if 'vertex' not in elements:
+            raise ValueError('missing vertex element in ply file')
+        vertex = elements['vertex']
+        props = self.__element(header, 'vertex')['properties']
+        if any(isinstance(ptype, tuple) for _, ptype in props):
+            logging.getLogger('pcl.io.PLYReader.read').warning(
+                'list properties of vertices are ignored')
+            props = [(name, ptype) for name, ptype in props if not isinstance(ptype, tuple)]
+            data = np.empty(len(vertex[props[0][0]]) if props else 0, dtype=props)
+            for name, _ in props:
+                data[name] = vertex[name]
+            vertex = data
+        cloud = PointCloud(vertex, copy=False)
+
+        mesh = None
+        if 'face' in elements:
+            props = self.__element(header, 'face')['properties']
+            names = [name for name, ptype in props if isinstance(ptype, tuple)]
+            if len(names) == 0:
+                raise ValueError('missing vertex indices of faces in ply file')
+            faces = elements['face'][names[0]]
+            mesh = PolygonMesh(cloud, [Vertices(face) for face in faces])
+        return cloud, mesh
+
+    def __element(self, header, name):
+        return next(element for element in header['elements'] if element['name'] == name)
+
+    def __read_binary_element(self, file, element, order):
+        # read the records of a binary element. If there are list properties and the lists of
+        # the first row don't have the same length as the others, the rows are parsed one by
+        # one and a dict of the properties is returned
+        props, count = element['properties'], element['count']
+        lengths = {}
+        start = file.tell()
+        if count > 0:
+            for name, ptype in props:
+                if isinstance(ptype, tuple):
+                    size = np.dtype(ptype[0]).itemsize
+                    lengths[name] = int(np.frombuffer(file.read(size), order + ptype[0])[0])
+                    file.seek(lengths[name] * np.dtype(ptype[1]).itemsize, 1)
+                else:
+                    file.seek(np.dtype(ptype).itemsize, 1)
+            file.seek(start)
+
+        dtype = _ply_row_dtype(props, lengths, order)
+        try:
+            data = _read_into(file, np.empty(count, dtype=dtype))
+        except ValueError: # not enough bytes for rows of the same length
+            data = None
+        if data is not None and all((data[name + '.count'] == length).all()
+                                    for name, length in lengths.items()):
+            if not dtype.isnative:
+                data = data.astype(dtype.newbyteorder('='))
+            return data
+
+        file.seek(start)
+        rows = {name: [] for name, _ in props}
+        for _ in range(count):
+            for name, ptype in props:
+                if isinstance(ptype, tuple):
+                    size = np.dtype(ptype[0]).itemsize
+                    length = int(np.frombuffer(file.read(size), order + ptype[0])[0])
+                    itemtype = np.dtype(order + ptype[1])
+                    rows[name].append(_read_into(file, np.empty(length, itemtype))
+                                      .astype(ptype[1]))
+                else:
+                    rows[name].append(np.frombuffer(file.read(np.dtype(ptype).itemsize),
+                                                    order + ptype)[0])
+        return {name: rows[name] if isinstance(ptype, tuple) else np.array(rows[name], ptype)
+                for name, ptype in props}
+
+    def __read_ascii_element(self, lines, element):
+        # read the records of an ascii element, the lists of different lengths are handled as
+        # __read_binary_element
+        props, count = element['properties'], element['count']
+        body = list(islice(lines, count))
+        if len(body) < count:
+            raise ValueError('unexpected end of the file')
+        body = [line.encode('ascii') if isinstance(line, str) else line for line in body]
+        lengths = {}
+        if count > 0:
+            tokens = body[0].split()
+            ptr = 0
+            for name, ptype in props:
+                if isinstance(ptype, tuple):
+                    lengths[name] = int(tokens[ptr])
+                    ptr += lengths[name]
+                ptr += 1
+
+        dtype = _ply_row_dtype(props, lengths, '')
+        columns = sum(int(np.prod(dtype[idx].shape)) for idx in range(len(dtype)))
+        text = b''.join(line if line.endswith(b'\n') else line + b'\n' for line in body)
+        if len(_malformed_lines(text, columns)[0]) == 0:
+            data = _parse_ascii(text, dtype)
+            if len(data) == count and all((data[name + '.count'] == length).all()
+                                          for name, length in lengths.items()):
+                return data
+
+        rows = {name: [] for name, _ in props}
+        for line in body:
+            tokens = line.split()
+            ptr = 0
+            for name, ptype in props:
+                if isinstance(ptype, tuple):
+                    length = int(tokens[ptr])
+                    rows[name].append(np.array(tokens[ptr + 1:ptr + 1 + length])
+                                      .astype(ptype[1]))
+                    ptr += length + 1
+                else:
+                    rows[name].append(tokens[ptr])
+                    ptr += 1
+        return {name: rows[name] if isinstance(ptype, tuple) else
+                np.array(rows[name]).astype(ptype) for name, ptype in props}
 
 class PLYWriter(FileWriter):
     '''
     Polygon File Format (PLY) writer.
     '''
-    pass # TODO: Not Implemented
+    ASCII_BLOCK_SIZE = 65536 # number of rows formatted at once when writing ascii files
+
+    def __properties(self, cloud):
+        # the names, the types and the columns of the vertex properties. The fields with
+        # more than one value are split into properties named as <name>_<index>
+        types = {np.dtype(ptype): name for name, ptype in _PLY_TYPES.items()
+                 if not name[-1].isdigit()}
+        props = []
+        for name in cloud.names:
+            column = cloud.to_ndarray(name).reshape(len(cloud), -1)
+            if column.dtype.newbyteorder('=') not in types:
+                raise ValueError('type of field %s is not supported in ply file' % name)
+            ptype = types[column.dtype.newbyteorder('=')]
+            if column.shape[1] == 1:
+                props.append((name, ptype, column[:, 0]))
+            else:
+                props.extend(('%s_%d' % (name, index), ptype, column[:, index])
+                             for index in range(column.shape[1]))
+        return props
+
+    def generate_header(self, cloud, data_format, polygon=None):
+        '''
+        Generate the header of a PLY file format
+
+        # Parameters
+            cloud : PointCloud
+                The vertices
+            data_format : str
+                The format of data (ascii, binary_little_endian, binary_big_endian)
+            polygon : list of Vertices
+                The faces, no face element is written if it's None
+
+        # Returns
+            header : str
+                PLY format header string
+        '''
+        lines = ['ply', 'format %s 1.0' % data_format, 'element vertex %d' % len(cloud)]
+        lines.extend('property %s %s' % (ptype, name) for name, ptype, _ in
+                     self.__properties(cloud))
+        if polygon is not None:
+            lines.append('element face %d' % len(polygon))
+            lines.append('property list uchar int vertex_indices')
+        lines.append('end_header')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, file, cloud, **opts):
+        '''Save the points or a mesh into a PLY file
+
+        # Parameters
+            file : file-like object or str
+                The output file or name of it.
+            cloud : PointCloud or PolygonMesh
+                The vertices, or the mesh with its cloud and faces.
+            opts : dict
+                additional options for the writer
+                binary : bool
+                    Save the file with binary format if true (by default),
+                    otherwise data is saved in ascii format.
+                byte_order : str
+                    '<' for little-endian (by default) or '>' for big-endian binary data
+        '''
+        from ..polygonmesh import PolygonMesh
+
+        polygon = None
+        if isinstance(cloud, PolygonMesh):
+            cloud, polygon = cloud.cloud, cloud.polygon
+        binary = opts.get('binary', True)
+        order = opts.get('byte_order', '<')
+        if order not in ('<', '>'):
+            raise ValueError("byte_order should be '<' or '>'")
+        faces = None
+        if polygon is not None:
+            faces = [np.asarray(getattr(face, 'vertices', face)).reshape(-1)
+                     for face in polygon]
+            if any(len(face) > 255 for face in faces):
+                raise ValueError('faces with more than 255 vertices are not supported')
+
+        if binary:
+            data_format = 'binary_little_endian' if order == '<' else 'binary_big_endian'
+        else:
+            data_format = 'ascii'
+        props = self.__properties(cloud)
+
+        file, own = _check_file(file, 0, 'ply', 'wb' if binary else 'w')
+
+        try:
+            header = self.generate_header(cloud, data_format, polygon)
+            file.write(header.encode('ascii') if binary else header)
+            if binary:
+                records = np.empty(len(cloud), dtype=[(name, order + _PLY_TYPES[ptype])
+                                                      for name, ptype, _ in props])
+                for name, _, column in props:
+                    records[name] = column
+                _write_from(file, records)
+            else:
+                line = ' '.join('%.10f' if ptype in ('float', 'double') else '%d'
+                                for _, ptype, _ in props) + '\n'
+                _write_ascii_rows(file, [column.reshape(-1, 1) for _, _, column in props],
+                                  line, self.ASCII_BLOCK_SIZE)
+
+            if faces is not None:
+                self.__write_faces(file, faces, binary, order)
+        finally:
+            if own:
+                file.close()
+
+    def __write_faces(self, file, faces, binary, order):
+        # the faces with the same number of vertices are written by blocks
+        lengths = np.array([len(face) for face in faces], dtype=int)
+        start = 0
+        while start < len(faces):
+            same = np.flatnonzero(lengths[start:] != lengths[start])
+            stop = start + same[0] if len(same) > 0 else len(faces)
+            length = lengths[start]
+            block = np.array(faces[start:stop]).reshape(stop - start, length)
+            if binary:
+                records = np.empty(stop - start, dtype=[('count', 'u1'),
+                                                        ('vertices', order + 'i4', (length,))])
+                records['count'] = length
+                records['vertices'] = block
+                _write_from(file, records)
+            else:
+                _write_ascii_rows(file, [np.full((stop - start, 1), length), block],
+                                  ' '.join(['%d'] * (length + 1)) + '\n', self.ASCII_BLOCK_SIZE)
+            start = stop
+
+def loadply(file, mesh=False):
+    '''
+    Load point cloud or mesh from ''.ply'' file
+
+    # Parameter
+        file : file-like object or str
+            The file or the name of it to load.
+            File-like object need to support seek() and read()
+        mesh : bool
+            Return the PolygonMesh instead of the vertices, the polygon is empty if there's
+            no face in the file.
+    '''
+    from ..polygonmesh import PolygonMesh
+
+    cloud, polymesh = PLYReader().read(file)
+    if mesh:
+        return polymesh if polymesh is not None else PolygonMesh(cloud, [])
+    return cloud
+
+def saveply(file, cloud, binary=True, byte_order='<'):
+    '''
+    Save point cloud or mesh into ''.ply'' file
+
+    # Parameter
+        file : file-like object or str
+            The file or the name of it to load.
+            File-like object need to support seek() and read()
+        cloud : PointCloud or PolygonMesh
+            The the point cloud data or the mesh that need saving
+        binary : bool
+            Save the file with binary format if true,
+                otherwise data is saved in ascii format.
+        byte_order : str
+            '<' for little-endian or '>' for big-endian binary data
+    '''
+    PLYWriter().write(file, cloud, binary=binary, byte_order=byte_order)
@@ -0,0 +1,84 @@
+'''
+Loading sequences of point cloud files in the background, so that reading and decompressing
+the files overlap with the computation on the loaded clouds.
+'''
+from __future__ import absolute_import
+
+import os
+from collections import deque
+from functools import partial
+from .file_io import PCDReader
+
+def _load_cloud(opts, file):
+    # read a cloud in a worker, it's defined at module level so that it can be pickled
+    cloud, _ = PCDReader().read(file, **opts)
+    return cloud
+
+class CloudLoader:
+    '''
+    Load .pcd files one after another with a pool of workers reading ahead.
+
+    The clouds are yielded in the order of the files. At most `prefetch` clouds are being read
+    or waiting to be consumed at a time, so the memory used by the loader is bounded.
+
+    Threads suit reading binary files, where the time is spent in I/O. The lzf library holds
+    the GIL while decompressing, so processes can be faster for compressed files, at the cost
+    of sending the clouds back to the main process.
+
+    # Parameters
+        files : sequence of str or file-like objects
+            The files to load
+        num_workers : int
+            Number of worker threads or processes, 0 means all the cores.
+        prefetch : int
+            The maximum number of clouds read ahead, at least num_workers to keep the workers
+            busy. It defaults to twice the number of workers.
+        processes : bool
+            Read the files in processes instead of threads. The files should be names then.
+            It can't be used with mmap, since the memory mapped clouds would be copied back
+            to the main process.
+        opts : dict
+            Additional options of PCDReader.read, such as fields, rows, points or mmap
+
+    # Examples
+    ```
+    for cloud in CloudLoader(files, num_workers=4, fields=['x', 'y', 'z']):
+        process(cloud)
+    ```
+    '''
+    def __init__(self, files, num_workers=2, prefetch=None, processes=False, **opts):
+        if num_workers < 0:
+            raise ValueError('num_workers should not be negative')
+        if prefetch is not None and prefetch <= 0:
+            raise ValueError('prefetch should be a positive number')
+        if processes and opts.get('mmap', False):
+            raise ValueError('memory mapped clouds can\'t be loaded in processes')
+        self.files = list(files)
+        self.num_workers = num_workers or os.cpu_count() or 1
+        self.prefetch = prefetch or 2 * self.num_workers
+        self.processes = processes
+        self.opts = opts
+
+    def __len__(self):
+        return len(self.files)
+
+    def __iter__(self):
+        if self.processes:
+            from concurrent.futures import ProcessPoolExecutor as Executor
+        else:
+            from concurrent.futures import ThreadPoolExecutor as Executor
+        load = partial(_load_cloud, self.opts)
+
+        with Executor(self.num_workers) as pool:
+            pending = deque()
+            try:
+                for file in self.files:
+                    if len(pending) >= self.prefetch:
+                        yield pending.popleft().result()
+                    pending.append(pool.submit(load, file))
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                # the loading is stopped early, don't wait for the clouds ahead
+                for future in pending:
+                    future.cancel()
@@ -0,0 +1,341 @@
+'''
+Spatially tiled point cloud store for clouds larger than the memory.
+
+The points are split into a regular grid of tiles, each tile is a Point Cloud Chunks (PCC)
+file in the directory of the store. An index file (index.json) keeps the size of the tiles,
+the fields, and the number of points and the bounding box of each tile, so that queries only
+load the tiles intersecting the queried region.
+
+Layout of the directory:
+    index.json
+    tiles/<i>_<j>[_<k>].pcc
+'''
+from __future__ import absolute_import
+
+import json
+import logging
+import os
+from collections import OrderedDict
+import numpy as np
+from ..pointcloud import PointCloud
+from .chunked import ChunkedCloudReader, ChunkedCloudWriter
+
+INDEX_FILE = 'index.json'
+
+def _tile_name(key):
+    return os.path.join('tiles', '_'.join(map(str, key)) + '.pcc')
+
+class TiledCloudWriter:
+    '''
+    Writer of a tiled point cloud store.
+
+    The clouds are written incrementally, the points are buffered by tiles and appended to the
+    tile files when the buffered points exceed the memory budget. The writer should be closed
+    (or used as a context manager) to flush the tiles and write the index. Points with
+    non-finite coordinates are dropped.
+
+    # Parameters
+        directory : str
+            The directory of the store, the points are added to the store if it exists
+        tile_size : float or sequence of float
+            The size of the tiles. A sequence of 2 values gives tiles along x and y only,
+            which suits maps. It's read from the index of an existing store if not given.
+        memory_budget : int
+            The maximum number of bytes of the buffered points
+        chunk_points : int
+            The number of points in a chunk of tile files
+        compress : bool
+            Compress the tile files with lzf
+
+    # Examples
+    ```
+    with TiledCloudWriter('map', tile_size=(50, 50)) as writer:
+        for cloud in iter_pcd('scan.pcd'):
+            writer.write(cloud)
+    ```
+    '''
+    def __init__(self, directory, tile_size=None, memory_budget=2 ** 28, chunk_points=65536,
+                 compress=True):
+        self.directory = directory
+        self.memory_budget = memory_budget
+        self.chunk_points = chunk_points
+        self.compress = compress
+        index_file = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_file):
+            with open(index_file, 'r') as fid:
+                self._index = json.load(fid)
+            if tile_size is not None and \
+               np.atleast_1d(tile_size).tolist() != self._index['tile_size']:
+                raise ValueError('the tile size is different from the one of the store')
+        else:
+            if tile_size is None:
+                raise ValueError('tile_size is required to create a store')
+            tile_size = np.atleast_1d(np.asarray(tile_size, dtype=float))
+            if len(tile_size) not in (1, 2, 3) or (tile_size <= 0).any():
+                raise ValueError('tile_size should be 1 to 3 positive numbers')
+            self._index = {'version': 1, 'tile_size': tile_size.tolist(), 'fields': None,
+                           'tiles': {}}
+        os.makedirs(os.path.join(directory, 'tiles'), exist_ok=True)
+        self._size = np.array(self._index['tile_size'])
+        self._pending = {}
+        self._pending_bytes = 0
+        self._closed = False
+
+    def write(self, cloud):
+        '''
+        Write the points of a cloud into the tiles.
+
+        # Parameters
+            cloud : PointCloud
+                The points to write, which should have x, y and z fields
+        '''
+        if self._closed:
+            raise ValueError('the writer is closed')
+        if self._index['fields'] is None:
+            if not all(name in cloud.names for name in ('x', 'y', 'z')):
+                raise ValueError('the points should have x, y and z fields')
+            self._index['fields'] = [list(field) for field in cloud.fields]
+        elif [list(field) for field in cloud.fields] != self._index['fields']:
+            raise ValueError('the fields of the cloud are different from the written ones')
+
+        xyz = cloud.xyz
+        valid = np.isfinite(xyz).all(axis=1)
+        if not valid.all():
+            logging.getLogger('pcl.io.TiledCloudWriter.write').warning(
+                'dropping %d points with non-finite coordinates', len(valid) - valid.sum())
+        indices = np.flatnonzero(valid)
+        dims = len(self._size) if len(self._size) > 1 else 3
+        keys = np.floor(xyz[indices, :dims] / self._size).astype(int)
+        if len(indices) == 0:
+            return
+
+        # the keys are linearized so that they are grouped by sorting integers
+        lowest = keys.min(axis=0)
+        shape = tuple(keys.max(axis=0) - lowest + 1)
+        linear, inverse = np.unique(np.ravel_multi_index(tuple((keys - lowest).T), shape),
+                                    return_inverse=True)
+        keys = np.stack(np.unravel_index(linear, shape), axis=1) + lowest
+        order = np.argsort(inverse, kind='stable')
+        splits = np.cumsum(np.bincount(inverse))[:-1]
+        data = cloud.data
+        for key, group in zip(keys, np.split(indices[order], splits)):
+            records = data[group]
+            self._pending.setdefault(tuple(key.tolist()), []).append(records)
+            self._pending_bytes += records.nbytes
+        if self._pending_bytes > self.memory_budget:
+            self.flush()
+
+    def flush(self):
+        '''
+        Append the buffered points to the tile files
+        '''
+        fields = [tuple(field) for field in self._index['fields'] or []]
+        for key, blocks in self._pending.items():
+            records = np.concatenate(blocks)
+            tile = self._index['tiles'].setdefault(' '.join(map(str, key)), {
+                'file': _tile_name(key), 'points': 0, 'bounds': None})
+            filename = os.path.join(self.directory, tile['file'])
+            with ChunkedCloudWriter(filename, self.chunk_points, self.compress,
+                                    append=os.path.exists(filename)) as writer:
+                writer.write(PointCloud(records, fields, copy=False))
+
+            xyz = np.stack([records[name] for name in ('x', 'y', 'z')], axis=1)
+            bounds = xyz.min(axis=0).tolist() + xyz.max(axis=0).tolist()
+            if tile['bounds'] is not None:
+                bounds = np.minimum(tile['bounds'][:3], bounds[:3]).tolist() + \
+                         np.maximum(tile['bounds'][3:], bounds[3:]).tolist()
+            tile['bounds'] = bounds
+            tile['points'] += len(records)
+        self._pending = {}
+        self._pending_bytes = 0
+
+    def close(self):
+        '''
+        Flush the buffered points and write the index of the store
+        '''
+        if self._closed:
+            return
+        self.flush()
+        index_file = os.path.join(self.directory, INDEX_FILE)
+        with open(index_file + '.tmp', 'w') as fid:
+            json.dump(self._index, fid)
+        os.replace(index_file + '.tmp', index_file)
+        self._closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class TiledCloudStore:
+    '''
+    Reader of a tiled point cloud store, see TiledCloudWriter.
+
+    The tiles are loaded on demand and kept in a least recently used cache, whose size is
+    bounded by a memory budget. A tile larger than the budget is loaded but not cached.
+
+    # Parameters
+        directory : str
+            The directory of the store
+        cache_size : int
+            The maximum number of bytes of the cached tiles
+    '''
+    def __init__(self, directory, cache_size=2 ** 30):
+        self.directory = directory
+        self.cache_size = cache_size
+        with open(os.path.join(directory, INDEX_FILE), 'r') as fid:
+            self._index = json.load(fid)
+        self.tile_size = np.array(self._index['tile_size'])
+        self.fields = [tuple(field) for field in self._index['fields'] or []]
+        self.names = [name for name, _ in self.fields]
+        self.tiles = [tuple(map(int, key.split())) for key in self._index['tiles']]
+        self._tiles = list(self._index['tiles'].values())
+        bounds = np.array([tile['bounds'] for tile in self._tiles], dtype=float).reshape(-1, 6)
+        self._lower, self._upper = bounds[:, :3], bounds[:, 3:]
+        self._cache = OrderedDict()
+        self._cached_bytes = 0
+
+    def __len__(self):
+        return sum(tile['points'] for tile in self._tiles)
+
+    def tile_bounds(self):
+        '''
+        Get the bounding boxes of the points in the tiles.
+
+        # Returns
+        min_pt : (N, 3) array of float
+        max_pt : (N, 3) array of float
+        '''
+        return self._lower.copy(), self._upper.copy()
+
+    @property
+    def cached_bytes(self):
+        '''
+        The number of bytes of the cached tiles
+        '''
+        return self._cached_bytes
+
+    def load_tile(self, key):
+        '''
+        Load the points of a tile through the cache.
+
+        # Parameters
+            key : tuple of int
+                The grid coordinates of the tile, as in the tiles attribute
+
+        # Returns
+            cloud : PointCloud
+                The points of the tile. The cloud is shared with the cache, so it shouldn't
+                be modified.
+        '''
+        key = tuple(key)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        tile = self._tiles[self.tiles.index(key)]
+        with ChunkedCloudReader(os.path.join(self.directory, tile['file'])) as reader:
+            cloud = reader.read()
+
+        size = cloud.data.nbytes
+        if size <= self.cache_size:
+            while self._cached_bytes + size > self.cache_size:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_bytes -= evicted.data.nbytes
+            self._cache[key] = cloud
+            self._cached_bytes += size
+        return cloud
+
+    def iter_tiles(self, min_pt=None, max_pt=None):
+        '''
+        Load the tiles one after another, only the tiles intersecting the box are loaded if
+        the box is given. Algorithms can be run on the store tile by tile with it.
+
+        # Parameters
+            min_pt : array of 3 float
+                The lower corner of the box
+            max_pt : array of 3 float
+                The upper corner of the box
+
+        # Returns
+            tiles : generator of (key, PointCloud)
+        '''
+        for index in self.__tiles_in_box(min_pt, max_pt):
+            yield self.tiles[index], self.load_tile(self.tiles[index])
+
+    def query_box(self, min_pt, max_pt, fields=None):
+        '''
+        Get the points within an axis-aligned box.
+
+        # Parameters
+            min_pt : array of 3 float
+                The lower corner of the box
+            max_pt : array of 3 float
+                The upper corner of the box
+            fields : str or list of str
+                The names of the fields to get, all the fields by default
+
+        # Returns
+            cloud : PointCloud
+        '''
+        min_pt = np.asarray(min_pt, dtype=float)
+        max_pt = np.asarray(max_pt, dtype=float)
+        return self.__query(self.__tiles_in_box(min_pt, max_pt), fields,
+                            lambda xyz: ((xyz >= min_pt) & (xyz <= max_pt)).all(axis=1))
+
+    def query_radius(self, point, radius, fields=None):
+        '''
+        Get the points within a sphere.
+
+        # Parameters
+            point : array of 3 float
+                The center of the sphere
+            radius : float
+                The radius of the sphere
+            fields : str or list of str
+                The names of the fields to get, all the fields by default
+
+        # Returns
+            cloud : PointCloud
+        '''
+        point = np.asarray(point, dtype=float)
+        # distance from the center to the bounding boxes of the tiles
+        nearest = np.clip(point, self._lower, self._upper)
+        tiles = np.flatnonzero(((nearest - point) ** 2).sum(axis=1) <= radius ** 2)
+        return self.__query(tiles, fields,
+                            lambda xyz: ((xyz - point) ** 2).sum(axis=1) <= radius ** 2)
+
+    def clear_cache(self):
+        '''
+        Remove the tiles from the cache
+        '''
+        self._cache.clear()
+        self._cached_bytes = 0
+
+    def __tiles_in_box(self, min_pt, max_pt):
+        outside = np.zeros(len(self.tiles), dtype=bool)
+        if min_pt is not None:
+            outside |= (self._upper < np.asarray(min_pt, dtype=float)).any(axis=1)
+        if max_pt is not None:
+            outside |= (self._lower > np.asarray(max_pt, dtype=float)).any(axis=1)
+        return np.flatnonzero(~outside)
+
+    def __query(self, tiles, fields, inside):
+        # gather the points of the tiles for which inside(xyz) is true
+        if fields is None:
+            names = list(self.names)
+        else:
+            names = [fields] if isinstance(fields, str) else list(fields)
+            unknown = [name for name in names if name not in self.names]
+            if unknown:
+                raise ValueError('unknown fields: ' + ', '.join(unknown))
+        dtype = np.dtype([(name, np.dtype(dict(self.fields)[name])) for name in names])
+        blocks = [np.empty(0, dtype=dtype)]
+        for index in tiles:
+            cloud = self.load_tile(self.tiles[index])
+            selected = np.flatnonzero(inside(cloud.xyz))
+            if len(selected) > 0:
+                data = cloud.data[selected]
+                blocks.append(data if fields is None else np.array(data[names], dtype=dtype))
+        fields = [field for name in names for field in self.fields if field[0] == name]
+        return PointCloud(np.concatenate(blocks), fields, copy=False)
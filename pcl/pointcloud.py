@@ -16,11 +16,30 @@ Following files are abandoned:
 '''
 from __future__ import absolute_import
 
+import numbers
 import re
 # from copy import copy as cp
 import numpy as np
 from .quaternion import Quaternion
 
+try:
+    from numpy.lib.recfunctions import repack_fields as _repack_fields
+    from numpy.lib.recfunctions import structured_to_unstructured as _structured_to_unstructured
+except ImportError: # numpy < 1.16
+    def _repack_fields(data):
+        # copy the fields into a packed structure without the paddings between the fields
+        return np.array(data, dtype=[(name, data.dtype[name]) for name in data.dtype.names])
+
+    def _structured_to_unstructured(data, dtype=None, copy=False):
+        # stack the fields into columns, fields with count > 1 give several columns. It always
+        # returns a copy, which is allowed by the callers asking for a reference.
+        types = [data.dtype[name] for name in data.dtype.names]
+        if dtype is None:
+            dtype = np.result_type(*[ftype.base for ftype in types])
+        return np.concatenate([data[name].reshape(data.shape + (int(np.prod(ftype.shape)),))
+                               for name, ftype in zip(data.dtype.names, types)],
+                              axis=-1).astype(dtype, copy=False)
+
 def _pcl_to_txt(dtype):
     if str.isdigit(str(dtype[0])):
         typen = dtype[1]
@@ -74,6 +93,35 @@ def _safe_len(array):
     else:
         return len(array)
 
+def _same_fields(dtype, other):
+    # check whether two record types have the same fields, regardless of the padding
+    if dtype == other:
+        return True
+    if dtype.names is None or dtype.names != other.names:
+        return False
+    return all(dtype[name] == other[name] for name in dtype.names)
+
+def _append_buffer(storage, array, values):
+    # append the arrays in values to the array. storage is the (buffer, view) pair of the last
+    # appending, the buffer is reused if the array is still the view and the buffer is large
+    # enough, otherwise a new buffer is allocated with geometric growth so that repeated
+    # appending costs amortized O(1) per point. return the new (buffer, view) pair
+    array = np.atleast_1d(array)
+    total = len(array) + sum(len(value) for value in values)
+    if storage is not None and storage[1] is array and len(storage[0]) >= total:
+        buffer = storage[0]
+    else:
+        # the first appending allocates exactly, so that a single concatenation wastes no memory
+        capacity = total if storage is None or storage[1] is not array \
+                   else max(total, 2 * len(storage[0]))
+        buffer = np.empty((capacity,) + array.shape[1:], dtype=array.dtype)
+        buffer[:len(array)] = array
+    start = len(array)
+    for value in values:
+        buffer[start:start + len(value)] = value
+        start += len(value)
+    return buffer, buffer[:total]
+
 def _all_str_(strlist):
     return all([isinstance(item, str) for item in strlist])
 
@@ -88,9 +136,15 @@ class PointCloud:
     The indexer returns a **PointCloud object** with the querying data.
 
     If you want to access raw data of a point, use 'data' property
+
+    # Storage
+    By default the points are stored as a numpy record array. With columnar storage each field is
+    stored in its own contiguous array (structure of arrays), so that operations over some fields
+    (e.g. coordinates) don't touch the other fields, and adding or removing fields doesn't copy
+    the existing ones. Both kinds of storage share the same interface.
     '''
     def __init__(self, points=None, fields=None, indices=None, width=0, height=0, copy=True,
-                 origin=None, orientation=None):
+                 origin=None, orientation=None, columnar=None):
         '''
         # Parameters
             points : PointCloud or seqence that can be turned into numpy.ndarray
@@ -119,26 +173,38 @@ class PointCloud:
                 The origin of the sensor
             orientation : quaternion
                 The orientation of the sensor
+            columnar : bool
+                Determine if the points are stored by columns. If it's not specified, the storage
+                of the copied cloud is kept, otherwise record array is used.
         '''
 
-        if isinstance(points, type(self)): # copy initialization
-            self.__points = np.array(points.data, copy=copy)
-            self.__fields = list(points.fields) if copy else points.fields
+        self.__columns = None # arrays of the fields in columnar storage
+        if isinstance(points, PointCloudView):
+            points = points.select()
+        if isinstance(points, PointCloud): # copy initialization
+            if points.columnar and columnar is not False:
+                self.__points = None
+                self.__columns = [np.array(column, copy=copy) for column in points.__columns]
+            else:
+                self.__points = np.array(points.data, copy=copy)
+            if columnar is None:
+                columnar = points.columnar
+            self.__fields = list(points.fields)
             self.__width = points.width
             self.__height = points.height
             self.__sensor_origin = np.array(points.sensor_origin, copy=copy)
             self.__sensor_orientation = Quaternion(points.sensor_orientation)
         else:
             self.__fields, predict = _cast_fields_to_tuples(fields)
-            if points is not None and len(fields) == 1:
-                self.__points = np.array(points, fields=self.__fields, copy=copy)
+            if points is not None and fields is not None and len(fields) == 1:
+                self.__points = np.array(points, dtype=self.__fields, copy=copy)
                 if self.__points.ndim > 1:
                     raise ValueError("the input points is not an one-dimensional array")
             elif points is not None:
                 direct = False # whether converting is not essential
                 try: # judging whether its the same type
                     dtype = np.dtype(self.__fields)
-                    if dtype == points.dtype:
+                    if _same_fields(dtype, points.dtype):
                         self.__points = np.array(points, copy=copy)
                         self.__fields = fields
                         direct = True
@@ -202,11 +268,22 @@ class PointCloud:
 
         # apply indices filter
         if indices is not None:
-            self.__points = self.__points[indices]
+            if self.__columns is None:
+                self.__points = self.__points[indices]
+            else:
+                self.__columns = [column[indices] for column in self.__columns]
+
+        self.__xyz = None # cache of xyz coordinates
+        self.__data = None # cache of packed records in columnar storage
+        self.__dense = None # cache of is_dense
+        self.__buffers = {} # growable buffers of the storage arrays, keyed by id of the arrays
+        self.__grids = {} # organized views of the storage arrays, keyed by id of the arrays
+        if columnar:
+            self.columnar = True
 
     def __add__(self, pointcloud):
         copypc = PointCloud(self)
-        if isinstance(pointcloud, type(self)) and \
+        if isinstance(pointcloud, PointCloud) and \
            len(set(self.names).intersection(pointcloud.names)) == 0:
 
             if len(pointcloud) != len(self):
@@ -222,9 +299,12 @@ class PointCloud:
 
     def __array__(self, *_):
         # support conversion to ndarray
-        return self.__points
+        return self.data
 
     def __getitem__(self, indices):
+        if self.__columns is not None:
+            return self.__getitem_columns(indices)
+
         if not isinstance(indices, tuple) and not isinstance(indices, list):
             # indexing by index or field
             newdata = self.__points[indices]
@@ -236,93 +316,188 @@ class PointCloud:
             newdata = self.__points[list(indices)]
             fdict = dict(self.__fields)
             newfields = [(field, fdict[field]) for field in indices]
-        elif len(indices) is 2: # indexing by row and col
-            if not self.is_organized:
-                raise IndexError('only organized point cloud support access by row and column')
-            lin = np.arange(_safe_len(self.__points)).reshape(self.width, self.height)
-            newdata = self.__points[lin[indices]]
+        else: # indexing by row and col, rows and windows are views of the records
+            newdata = self.__grid(self.__points, indices)[indices]
             newfields = self.__fields
-        else:
-            raise IndexError('too many indices')
+            if newdata.ndim == 2:
+                # a window is an organized cloud, it's a copy unless the window is full rows
+                cloud = PointCloud(newdata.reshape(-1), fields=newfields, copy=False,
+                                   width=newdata.shape[1], height=newdata.shape[0])
+                self.copy_metadata(cloud)
+                return cloud
 
         cloud = PointCloud(newdata, fields=newfields, copy=False)
         self.copy_metadata(cloud)
         return cloud
 
+    def __getitem_columns(self, indices):
+        # indexing on columnar storage, columns are shared when selecting fields or slicing
+        if isinstance(indices, str):
+            indices = [indices]
+        if isinstance(indices, (tuple, list)):
+            if _all_str_(indices): # indexing by fields
+                offsets = [self.names.index(name) for name in indices]
+                return self.__columns_cloud([self.__columns[idx] for idx in offsets],
+                                            [self.__fields[idx] for idx in offsets])
+            columns = [self.__grid(column, indices)[indices] for column in self.__columns]
+        else:
+            columns = [column[indices] for column in self.__columns]
+        ndim = columns[0].ndim - self.__columns[0].ndim + 1 # dimensions of the points
+        if ndim == 2:
+            # a window is an organized cloud
+            height, width = columns[0].shape[:2]
+            cloud = self.__columns_cloud([column.reshape((-1,) + column.shape[2:])
+                                          for column in columns], self.__fields)
+            cloud.__width, cloud.__height = width, height
+            return cloud
+        if ndim != 1:
+            # single point is stored as records
+            points = np.empty(columns[0].shape[:ndim], dtype=self.__fields)
+            for (name, _), column in zip(self.__fields, columns):
+                points[name] = column
+            cloud = PointCloud(points, fields=self.__fields, copy=False)
+            self.copy_metadata(cloud)
+            return cloud
+        return self.__columns_cloud(columns, self.__fields)
+
+    def __columns_cloud(self, columns, fields):
+        # create an unorganized columnar cloud from columns with metadata of this cloud
+        cloud = PointCloud(fields=list(fields))
+        cloud.__points = None
+        cloud.__columns = columns
+        cloud.disorganize()
+        self.copy_metadata(cloud)
+        return cloud
+
+    def __check_organized(self, indices):
+        if len(indices) != 2:
+            raise IndexError('too many indices')
+        if not self.is_organized:
+            raise IndexError('only organized point cloud support access by row and column')
+
+    def __grid(self, array, indices):
+        # view a storage array as (height, width) grid for indexing by (row, col), the point at
+        # (row, col) is array[row * width + col]. The view is cached until the array is replaced
+        self.__check_organized(indices)
+        shape = (self.__height, self.__width)
+        grid = self.__grids.get(id(array))
+        if grid is None or grid[0] is not array or grid[1].shape[:2] != shape:
+            grid = array, array.reshape(shape + array.shape[1:])
+            self.__grids[id(array)] = grid
+        return grid[1]
+
+    def __organized_indices(self, indices):
+        # convert the indices of (row, col) into a flat array of indices of points, computed from
+        # the selected rows and columns rather than a grid of the indices of all the points
+        self.__check_organized(indices)
+        rows = np.arange(self.__height)[indices[0]]
+        cols = np.arange(self.__width)[indices[1]]
+        if isinstance(indices[0], slice) or isinstance(indices[1], slice):
+            # all the combinations of the rows and columns are selected
+            rows = np.reshape(rows, (-1, 1))
+        return np.ravel(rows * self.__width + cols)
+
+    def __column(self, name):
+        # get the data of a field
+        if self.__columns is None:
+            return self.__points[name]
+        return self.__columns[self.names.index(name)]
+
     def __setitem__(self, indices, value):
-        if not isinstance(indices, tuple) and not isinstance(indices, list):
-            # indexing by index or field or multiple fields
-            self.__points[indices] = value
+        if isinstance(indices, str):
+            self.__column(indices)[...] = value
+        elif not isinstance(indices, tuple) and not isinstance(indices, list):
+            # indexing by index or multiple fields
+            if self.__columns is None:
+                self.__points[indices] = value
+            else:
+                value = np.array(value, dtype=self.__fields, copy=False)
+                for (name, _), column in zip(self.__fields, self.__columns):
+                    column[indices] = value[name]
         elif _all_str_(indices):
-            if isinstance(value, (type(self), dict)):
+            if isinstance(value, (PointCloud, dict)):
                 for field in indices:
-                    self.__points[field] = value[field]
+                    self.__column(field)[...] = value[field]
             else:
                 for idx, data in enumerate(value):
-                    self.__points[indices[idx]] = data
-        elif len(indices) is 2:
-            if not self.is_organized:
-                raise IndexError('only organized point cloud support access by row and column')
-            lin = np.arange(_safe_len(self.__points)).reshape(self.width, self.height)
-            lin = lin[indices].ravel()
-            self.__points[lin] = np.array(value, dtype=self.__fields, copy=False).ravel()
+                    self.__column(indices[idx])[...] = data
         else:
-            raise IndexError('too many indices')
+            # assign through the organized views, the values can be given as a flat sequence
+            value = np.array(value, dtype=self.__fields, copy=False)
+            arrays = [self.__points] if self.__columns is None else self.__columns
+            shape = np.shape(self.__grid(arrays[0], indices)[indices])
+            shape = shape[:len(shape) - arrays[0].ndim + 1]
+            if value.size == np.prod(shape, dtype=int):
+                value = value.reshape(shape)
+            if self.__columns is None:
+                self.__grid(self.__points, indices)[indices] = value
+            else:
+                for (name, _), column in zip(self.__fields, self.__columns):
+                    self.__grid(column, indices)[indices] = value[name]
+        self._invalidate_cache()
 
     def __delitem__(self, indices):
         oldlen = len(self)
-        if isinstance(indices, str):
-            # delete single field
-            nfields = list(self.__fields)
-            nfields.remove((indices, dict(nfields)[indices]))
-            ndata = np.empty(self.__points.shape, dtype=nfields)
-            for name, _ in nfields:
-                ndata[name] = self.__points[name]
-            self.__points = ndata
-            self.__fields = nfields
-        elif isinstance(indices, (tuple, list)) and _all_str_(indices):
-            # delete several fields
-            indices = list(indices)
+        if self.__columns is not None:
+            self.__delitem_columns(indices)
+        elif isinstance(indices, str) or \
+             (isinstance(indices, (tuple, list)) and _all_str_(indices)):
+            # delete fields, the remaining fields are a view of the records with the deleted
+            # ones left as padding, so no data is copied
+            indices = [indices] if isinstance(indices, str) else list(indices)
             nfields = list(self.__fields)
             for name in indices:
                 nfields.remove((name, dict(nfields)[name]))
-            ndata = np.empty(self.__points.shape, dtype=nfields)
-            for name, _ in nfields:
-                ndata[name] = self.__points[name]
-            self.__points = ndata
+            self.__points = self.__points[[name for name, _ in nfields]]
             self.__fields = nfields
         elif not isinstance(indices, tuple):
             # delete in one dimension
             self.__points = np.delete(self.__points, indices, axis=0)
-        elif len(indices) is 2:
-            # delete in two dimension (organized point cloud)
-            if not self.is_organized:
-                raise IndexError('only organized point cloud support access by row and column')
-            lin = np.arange(_safe_len(self.__points)).reshape(self.width, self.height)
-            self.__points = np.delete(self.__points, lin[indices].flatten(), axis=0)
         else:
-            raise IndexError('too many indices')
-        
+            # delete in two dimension (organized point cloud)
+            lin = self.__organized_indices(indices)
+            self.__points = np.delete(self.__points, lin, axis=0)
+
+        self._invalidate_cache()
         if len(self) != oldlen:
             self.disorganize()
 
+    def __delitem_columns(self, indices):
+        # deleting on columnar storage, other columns are untouched when deleting fields
+        if isinstance(indices, str):
+            indices = [indices]
+        if isinstance(indices, (tuple, list)) and _all_str_(indices):
+            keep = [idx for idx, (name, _) in enumerate(self.__fields) if name not in indices]
+            if len(keep) + len(indices) != len(self.__fields):
+                raise ValueError('some fields are not in the cloud')
+            self.__fields = [self.__fields[idx] for idx in keep]
+            self.__columns = [self.__columns[idx] for idx in keep]
+        else:
+            if isinstance(indices, tuple):
+                indices = self.__organized_indices(indices)
+            self.__columns = [np.delete(column, indices, axis=0) for column in self.__columns]
+
     def __repr__(self):
-        return "<PointCloud of %d points>" % _safe_len(self.__points)
+        return "<PointCloud of %d points>" % len(self)
 
     def __len__(self):
+        if self.__columns is not None:
+            return len(self.__columns[0]) if self.__columns else 0
         return _safe_len(self.__points)
 
     def __iter__(self):
-        return iter(self.__points)
+        return iter(self.data)
 
     def __contains__(self, item):
         # for the field names, use 'names' property for instead.
-        return item in self.__points
+        return item in self.data
 
     def __reduce__(self):
         # Pickle support.
-        return type(self), (self.__points, self.__fields, None, self.__width, self.__height,
-                            False, self.__sensor_origin, self.__sensor_orientation)
+        return type(self), (_repack_fields(self.data), self.__fields, None,
+                            self.__width, self.__height,
+                            False, self.__sensor_origin, self.__sensor_orientation,
+                            self.columnar)
 
     def __eq__(self, target):
         result = target.data == self.data
@@ -335,6 +510,33 @@ class PointCloud:
         else: # numpy boolean array
             return result.all()
 
+    def _invalidate_cache(self):
+        '''
+        Clear the cached data derived from points, called after the cloud is modified
+        '''
+        self.__xyz = None
+        self.__data = None
+        self.__dense = None
+        # drop the buffers and views whose arrays are no longer used in storage
+        arrays = [self.__points] if self.__columns is None else self.__columns
+        self.__buffers = {id(array): self.__buffers[id(array)] for array in arrays
+                          if self.__buffers.get(id(array), (None, None))[1] is array}
+        self.__grids = {id(array): self.__grids[id(array)] for array in arrays
+                        if self.__grids.get(id(array), (None, None))[0] is array}
+
+    def view(self, indices=None):
+        '''
+        Select points of the cloud without copying them, see PointCloudView
+
+        # Parameters
+            indices : slice, sequence of int or boolean mask
+                The indices of the selected points
+
+        # Returns
+            view : PointCloudView
+        '''
+        return PointCloudView(self, indices)
+
     def disorganize(self):
         '''
         Disorganize the point cloud. The function can act as updating function
@@ -353,19 +555,57 @@ class PointCloud:
                 the points that are being inserted
         '''
         points = np.array(points, dtype=self.__fields, copy=False)
-        self.__points = np.insert(self.__points, indices, points, axis=0)
+        if np.all(np.asarray(indices) == len(self)):
+            # inserting at the end is appending, which reuses the growable buffer
+            self.append(points if np.ndim(indices) == 0 else
+                        np.broadcast_to(points.reshape(-1), (len(indices),)))
+            return
+        if self.__columns is None:
+            self.__points = np.insert(self.__points, indices, points, axis=0)
+        else:
+            self.__columns = [np.insert(column, indices, points[name], axis=0)
+                              for (name, _), column in zip(self.__fields, self.__columns)]
+        self._invalidate_cache()
         self.disorganize()
 
     def append(self, points):
         '''
         Insert several points at the end of the container.
 
+        The storage grows geometrically, so that accumulating points by repeated appending
+        costs amortized constant time per point.
+
         # Parameters
             points: ndarray with 2-dimension and same point structure with the cloud
                 the points that are being inserted
         '''
-        points = np.array(points, dtype=self.__fields, copy=False)
-        self.__points = np.concatenate((self.__points, points), axis=0)
+        self.extend([points])
+
+    def extend(self, clouds):
+        '''
+        Insert the points of several clouds at the end of the container. The storage is
+        reallocated at most once for all the clouds.
+
+        # Parameters
+            clouds: iterable of PointCloud or ndarray
+                the clouds or the arrays of points with same point structure with the cloud
+        '''
+        arrays = [np.array(cloud, dtype=self.__fields, copy=False).reshape(-1) for cloud in clouds]
+        buffers = {}
+        if self.__columns is None:
+            buffer, self.__points = _append_buffer(self.__buffers.get(id(self.__points)),
+                                                   self.__points, arrays)
+            buffers[id(self.__points)] = buffer, self.__points
+        else:
+            columns = []
+            for (name, _), column in zip(self.__fields, self.__columns):
+                values = [array[name].reshape((-1,) + column.shape[1:]) for array in arrays]
+                buffer, column = _append_buffer(self.__buffers.get(id(column)), column, values)
+                buffers[id(column)] = buffer, column
+                columns.append(column)
+            self.__columns = columns
+        self.__buffers = buffers
+        self._invalidate_cache()
         self.disorganize()
 
     def pop(self, indices=-1):
@@ -393,18 +633,60 @@ class PointCloud:
 
         # Notes
         Operating field properties of raw data directly is not recommended because it may corrupt
-        the fields property of the PointCloud object
+        the fields property of the PointCloud object.
+
+        In columnar storage, the array is a read-only copy packed from the columns and cached until
+        the cloud is modified.
         '''
-        return self.__points
+        if self.__columns is None:
+            return self.__points
+        if self.__data is None:
+            self.__data = self.__pack_columns()
+            self.__data.flags.writeable = False
+        return self.__data
 
     @data.setter
     def data(self, value):
-        array = np.array(value, dtype=self.__points.dtype, copy=False) # throw if not compatible
         oldlen = len(self)
-        self.__points = array
+        if self.__columns is None:
+            # throw if not compatible
+            self.__points = np.array(value, dtype=self.__points.dtype, copy=False)
+        else:
+            array = np.array(value, dtype=self.__fields, copy=False)
+            self.__columns = [np.ascontiguousarray(array[name]) for name, _ in self.__fields]
+        self._invalidate_cache()
         if len(self) != oldlen:
             self.disorganize()
 
+    def __pack_columns(self):
+        # pack the columns into a record array
+        points = np.empty(len(self), dtype=self.__fields)
+        for (name, _), column in zip(self.__fields, self.__columns):
+            points[name] = column
+        return points
+
+    @property
+    def columnar(self):
+        '''
+        Whether the points are stored by columns (structure of arrays) instead of records.
+        Setting this property converts the storage in place.
+        '''
+        return self.__columns is not None
+
+    @columnar.setter
+    def columnar(self, value):
+        if value and self.__columns is None:
+            if len(self.__fields) == 0:
+                raise ValueError('point cloud without fields cannot be stored by columns')
+            columns = [np.ascontiguousarray(self.__points[name]) for name, _ in self.__fields]
+            self.__columns = [column.reshape(-1, *column.shape[self.__points.ndim:])
+                              for column in columns]
+            self.__points = None
+        elif not value and self.__columns is not None:
+            self.__points = self.__pack_columns()
+            self.__columns = None
+        self._invalidate_cache()
+
     @property
     def width(self):
         '''
@@ -455,12 +737,15 @@ class PointCloud:
     def is_dense(self):
         '''
         True if no points are invalid (e.g., have NaN or Inf values).
-        Tuple types are considered as invalid as well
+
+        The floating fields are checked one by one and the result is cached until the cloud is
+        modified by its methods. Editing the array returned by `data` in place does not clear
+        the cache.
         '''
-        try:
-            return not np.isnan(self.__points.tolist()).any()
-        except TypeError: # non-number data type
-            return False
+        if self.__dense is None:
+            self.__dense = all(np.isfinite(self.__column(name)).all() for name in self.names
+                               if self.__column(name).dtype.kind == 'f')
+        return self.__dense
 
     @property
     def is_organized(self):
@@ -501,15 +786,15 @@ class PointCloud:
         - sensor_origin
         - sensor_orientation
         '''
-        target.sensor_origin = self.__sensor_origin
-        target.sensor_orientation = self.__sensor_orientation
+        target.sensor_origin = self.sensor_origin
+        target.sensor_orientation = self.sensor_orientation
 
     def compare_metadata(self, target):
         '''
         Judge whether the metadata of the two point cloud is the same
         '''
         pred = (target.sensor_origin == self.sensor_origin).all()
-        pred &= target.sensor_orientation == self.__sensor_orientation
+        pred &= target.sensor_orientation == self.sensor_orientation
         return pred
 
     @property
@@ -578,27 +863,41 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
             raise TypeError("fields with given names already exist.")
 
         nfields = self.__fields + fields
-        ndata = np.empty(self.__points.shape, dtype=nfields)
-        for name, _ in self.__fields:
-            ndata[name] = self.__points[name]
+        columns = self.__new_columns(fields, data)
+        if self.__columns is None:
+            ndata = np.empty(self.__points.shape, dtype=nfields)
+            for name, _ in self.__fields:
+                ndata[name] = self.__points[name]
+            for name, _ in fields:
+                ndata[name] = columns[name]
+            self.__points = ndata
+        else:
+            # existing columns are kept
+            offsets = dict((name, idx) for idx, (name, _) in enumerate(self.__fields))
+            self.__columns = [self.__columns[offsets[name]] if name in offsets else columns[name]
+                              for name, _ in nfields]
+        self.__fields = nfields
+        self._invalidate_cache()
+
+    def __new_columns(self, fields, data):
+        # create the data of new fields, see append_fields for the format of data
+        columns = dict((name, np.empty(len(self), dtype=descr)) for name, descr in fields)
         if isinstance(data, dict):
             for name, _ in fields:
                 if name in data:
-                    ndata[name] = data[name]
+                    columns[name][...] = data[name]
         elif isinstance(data, np.ndarray) and data.dtype.names is not None:
             for name, _ in fields:
                 if name in data.dtype.names:
-                    ndata[name] = data[name]
+                    columns[name][...] = data[name]
         elif isinstance(data, (list, tuple)) \
             or (isinstance(data, np.ndarray) and data.dtype.names is None):
             for idx, (name, _) in enumerate(fields):
-                ndata[name] = data[idx]
+                columns[name][...] = data[idx]
         elif data is not None:
             for name, _ in fields:
-                ndata[name] = data
-
-        self.__points = ndata
-        self.__fields = nfields
+                columns[name][...] = data
+        return columns
 
     def insert_fields(self, fields, offsets, data=None):
         '''
@@ -662,27 +961,21 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
         temp.pop() # remove trailor
         nfields = temp
 
-        ndata = np.empty(self.__points.shape, dtype=nfields)
-        for name, _ in self.__fields:
-            ndata[name] = self.__points[name]
-        if isinstance(data, dict):
-            for name, _ in fields:
-                if name in data:
-                    ndata[name] = data[name]
-        elif isinstance(data, np.ndarray) and data.dtype.names is not None:
-            for name, _ in fields:
-                if name in data.dtype.names:
-                    ndata[name] = data[name]
-        elif isinstance(data, (list, tuple)) \
-            or (isinstance(data, np.ndarray) and data.dtype.names is None):
-            for idx, (name, _) in enumerate(fields):
-                ndata[name] = data[idx]
-        elif data is not None:
+        columns = self.__new_columns(fields, data)
+        if self.__columns is None:
+            ndata = np.empty(self.__points.shape, dtype=nfields)
+            for name, _ in self.__fields:
+                ndata[name] = self.__points[name]
             for name, _ in fields:
-                ndata[name] = data
-
-        self.__points = ndata
+                ndata[name] = columns[name]
+            self.__points = ndata
+        else:
+            # existing columns are kept
+            offsets = dict((name, idx) for idx, (name, _) in enumerate(self.__fields))
+            self.__columns = [self.__columns[offsets[name]] if name in offsets else columns[name]
+                              for name, _ in nfields]
         self.__fields = nfields
+        self._invalidate_cache()
 
     def pop_fields(self, names):
         '''
@@ -696,7 +989,7 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
             values: numpy.array
                 Data of deleted fields, stored in a record array
         '''
-        points = np.array(self[names])
+        points = np.array(_repack_fields(self[names].data))
         del self[names]
         return points
 
@@ -727,9 +1020,11 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
                 if len(new_names) != len(self.fields):
                     raise ValueError("the count of names doesn't match")
 
-                self.__points.dtype.names = new_names
+                if self.__columns is None:
+                    self.__points.dtype.names = new_names
                 for idx in range(len(self.__fields)):
                     self.__fields[idx] = (new_names[idx], self.__fields[idx][1])
+                self._invalidate_cache()
                 return
             else:
                 if not _all_str_(old_names):
@@ -747,7 +1042,9 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
 
         for idx, offset in enumerate(offsets):
             self.__fields[offset] = (new_names[idx], self.__fields[offset][1])
-        self.__points.dtype.names = self.names
+        if self.__columns is None:
+            self.__points.dtype.names = self.names
+        self._invalidate_cache()
 
     def to_ndarray(self, names=None, dtype=None, copy=False):
         '''
@@ -762,33 +1059,47 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
                 The type that all the figures will be cast to
                 If this param is set to None, then it will try to find a proper one
             copy: bool
-                Determine whether the function returns a copy or a reference
+                Determine whether the function returns a copy or a reference.
+                A reference is only possible when the fields are of the same type and evenly
+                spaced in the point structure, otherwise a copy is returned anyway.
         '''
         if names is None:
             names = self.names
         if isinstance(names, str):
             names = [names]
+        if self.__columns is not None:
+            columns = [self.__column(name).reshape(len(self), -1) for name in names]
+            if len(columns) == 1 and not copy:
+                return columns[0] if dtype is None else columns[0].astype(dtype, copy=False)
+            return np.hstack(columns).astype(dtype or np.result_type(*columns), copy=False)
         data = self.__points[names]
-        if dtype is None:
-            fdict = dict(self.__fields)
-            types = [fdict[name] for name in names]
-            if types.count(types[0]) == len(types):
-                dtype = types[0] # homogeneous type
 
         if data.ndim == 0:
             return np.array(data.tolist(), dtype=dtype, copy=copy) # single point (tuple or scalar)
         else:
-            return np.array(data.view(dtype).reshape(data.shape + (-1,)), copy=copy)
+            # fields with count > 1 are flattened into columns
+            return _structured_to_unstructured(data, dtype=dtype, copy=copy)
 
     @property
     def xyz(self):
         '''
         Get coordinate array of the point cloud, data type will be infered from data
 
+        The returned array is read-only. If x, y and z are of the same type and packed together,
+        it's a view of the point data, otherwise it's a copy cached until the cloud is modified
+        through its methods.
+
         # Notes
         In PCL, xyz coordinate is stored in data[4] and the last field is filled with 1
         '''
-        return self.to_ndarray(['x', 'y', 'z'])
+        if self.__xyz is None:
+            xyz = self.to_ndarray(['x', 'y', 'z'])
+            if xyz.ndim > 1: # don't cache the coordinates of single point
+                xyz = xyz.view()
+                xyz.flags.writeable = False
+                self.__xyz = xyz
+            return xyz
+        return self.__xyz
 
     @property
     def normal(self):
@@ -811,7 +1122,7 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
         '''
         # struct definition from PCL
         struct = np.dtype([('b', 'u1'), ('g', 'u1'), ('r', 'u1'), ('a', 'u1')])
-        return self.data['rgb'].view(struct)[['r', 'g', 'b']]
+        return self.__column('rgb').view(struct)[['r', 'g', 'b']]
 
     @property
     def rgba(self):
@@ -821,4 +1132,199 @@ sensor orientation (xyzw) : {3}''' % (len(self), self.width, self.height,)) \
         '''
         # struct definition from PCL
         struct = np.dtype([('b', 'u1'), ('g', 'u1'), ('r', 'u1'), ('a', 'u1')])
-        return self.data['rgba'].view(struct)
+        return self.__column('rgba').view(struct)
+
+def _range_slice(selected):
+    # convert a range of indices into a slice, the stop of a slice cannot be negative
+    return slice(selected.start, selected.stop if selected.stop >= 0 else None, selected.step)
+
+def _slice_range(selection):
+    # convert a slice created by _range_slice back into a range
+    return range(selection.start, -1 if selection.stop is None else selection.stop,
+                 selection.step)
+
+def _view_property(prop, getter):
+    # create a property of PointCloudView which reads from the base cloud until the view is
+    # materialized, setting the property materializes the view
+    def fget(self):
+        if self.base is None:
+            return prop.fget(self)
+        return getter(self)
+
+    def fset(self, value):
+        self.materialize()
+        prop.fset(self, value)
+
+    return property(fget, None if prop.fset is None else fset, doc=prop.__doc__)
+
+class PointCloudView(PointCloud):
+    '''
+    PointCloudView is a lightweight selection of points of a base cloud, which is described by
+    the base cloud and an index array or a slice. It can be used wherever a PointCloud is
+    accepted.
+
+    Reading fields, coordinates and data of the view only touches the selected points, and
+    slicing a view gives another view of the same base cloud, so that stages of a pipeline
+    don't copy the cloud. The view follows the changes of the base cloud until it's modified
+    itself: the first write (setting points or fields, appending, deleting...) copies the
+    selected points into the view (copy on write), and the base cloud is never changed.
+
+    The data of a view that hasn't been materialized is read-only.
+    '''
+    def __init__(self, cloud, indices=None):
+        '''
+        Initialize the view
+
+        # Parameters
+            cloud : PointCloud
+                The base cloud. If it's a view that hasn't been materialized, the new view
+                selects from its base directly.
+            indices : slice, sequence of int or boolean mask
+                The indices of the selected points in the cloud, all points are selected if
+                it's None
+        '''
+        # pylint: disable=super-init-not-called
+        length = len(cloud)
+        if indices is None:
+            indices = slice(None)
+        if isinstance(indices, slice):
+            indices = _range_slice(range(*indices.indices(length)))
+        else:
+            indices = np.asarray(indices)
+            if indices.size == 0:
+                indices = indices.astype(int)
+            if indices.dtype == bool:
+                if indices.shape != (length,):
+                    raise IndexError('boolean index does not match the size of cloud')
+                indices = np.flatnonzero(indices)
+            elif indices.ndim != 1 or indices.dtype.kind not in 'iu':
+                raise IndexError('only 1-D integer or boolean indices are supported by views')
+            elif len(indices) > 0:
+                lower, upper = indices.min(), indices.max()
+                if upper >= length or lower < -length:
+                    raise IndexError('index out of the bounds of the cloud')
+                if lower < 0:
+                    indices = np.where(indices < 0, indices + length, indices)
+
+        if isinstance(cloud, PointCloudView) and cloud.base is not None:
+            # compose the selections
+            if isinstance(cloud.indices, slice) and isinstance(indices, slice):
+                indices = _range_slice(_slice_range(cloud.indices)[indices])
+            elif isinstance(cloud.indices, slice):
+                indices = indices * cloud.indices.step + cloud.indices.start
+            else:
+                indices = cloud.indices[indices]
+            cloud = cloud.base
+
+        self.__base = cloud
+        self.__indices = indices
+        self.__xyz = None
+
+    def __getattr__(self, name):
+        # the storage of PointCloud is only created when the view is materialized
+        if name.startswith('_PointCloud__') and \
+           self.__dict__.get('_PointCloudView__base') is not None:
+            self.materialize()
+            return getattr(self, name)
+        raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+
+    @property
+    def base(self):
+        '''
+        The base cloud of the view, None if the view has been materialized
+        '''
+        return self.__base
+
+    @property
+    def indices(self):
+        '''
+        The indices (slice or array) of the selected points in the base cloud, None if the view
+        has been materialized
+        '''
+        return self.__indices
+
+    def select(self):
+        '''
+        Get the selected points as a PointCloud. It shares data with the base cloud if the
+        view is a slice, otherwise it's a copy.
+        '''
+        if self.__base is None:
+            return self
+        return self.__base[self.__indices]
+
+    def materialize(self):
+        '''
+        Copy the selected points into the view, so that it can be modified without touching the
+        base cloud. It's called automatically by the first modification.
+        '''
+        if self.__base is None:
+            return
+        cloud = self.select()
+        copy = isinstance(self.__indices, slice)
+        self.__base = self.__indices = self.__xyz = None
+        PointCloud.__init__(self, cloud, copy=copy)
+
+    def __repr__(self):
+        return "<PointCloudView of %d points>" % len(self)
+
+    def __len__(self):
+        if self.__base is None:
+            return PointCloud.__len__(self)
+        if isinstance(self.__indices, slice):
+            return len(_slice_range(self.__indices))
+        return len(self.__indices)
+
+    def __getitem__(self, indices):
+        if self.__base is None:
+            return PointCloud.__getitem__(self, indices)
+        if isinstance(indices, slice) or \
+           (not isinstance(indices, (str, tuple, numbers.Integral)) and
+            not (isinstance(indices, list) and _all_str_(indices))):
+            return PointCloudView(self, indices)
+        if isinstance(indices, numbers.Integral):
+            return self.__base[PointCloudView(self, [indices]).indices[0]]
+        return self.select()[indices]
+
+    def __reduce__(self):
+        return PointCloud.__reduce__(PointCloud(self, copy=False))
+
+    def to_ndarray(self, names=None, dtype=None, copy=False):
+        if self.__base is None:
+            return PointCloud.to_ndarray(self, names, dtype, copy)
+        if isinstance(self.__indices, slice):
+            return self.__base.to_ndarray(names, dtype, copy)[self.__indices]
+        return self.select().to_ndarray(names, dtype, copy)
+    to_ndarray.__doc__ = PointCloud.to_ndarray.__doc__
+
+    def __data(self):
+        data = self.__base.data[self.__indices].view()
+        data.flags.writeable = False
+        return data
+
+    def __xyz_view(self):
+        # the selected coordinates are cached along with the coordinates of the base they are
+        # taken from, which are renewed when the base is modified
+        base_xyz = self.__base.xyz
+        if self.__xyz is None or self.__xyz[0] is not base_xyz:
+            xyz = base_xyz[self.__indices].view()
+            xyz.flags.writeable = False
+            self.__xyz = (base_xyz, xyz)
+        return self.__xyz[1]
+
+    def __is_dense(self):
+        return all(np.isfinite(self.to_ndarray(name)).all() for name, descr in self.fields
+                   if 'f' in descr)
+
+    data = _view_property(PointCloud.data, __data)
+    xyz = _view_property(PointCloud.xyz, __xyz_view)
+    is_dense = _view_property(PointCloud.is_dense, __is_dense)
+    fields = _view_property(PointCloud.fields, lambda self: self.__base.fields)
+    names = _view_property(PointCloud.names, lambda self: self.__base.names)
+    columnar = _view_property(PointCloud.columnar, lambda self: self.__base.columnar)
+    width = _view_property(PointCloud.width, len)
+    height = _view_property(PointCloud.height, lambda self: 1)
+    is_organized = _view_property(PointCloud.is_organized, lambda self: False)
+    sensor_origin = _view_property(PointCloud.sensor_origin,
+                                   lambda self: self.__base.sensor_origin)
+    sensor_orientation = _view_property(PointCloud.sensor_orientation,
+                                        lambda self: self.__base.sensor_orientation)
@@ -16,6 +16,7 @@ from numpy.linalg import norm, lstsq
 from numpy.random import RandomState
 from ..common import _CloudBase
 from ..pointcloud import PointCloud
+from ..search import DefaultSearch
 
 class SampleConsensusModel(_CloudBase, metaclass=abc.ABCMeta):
     '''
@@ -28,6 +29,7 @@ class SampleConsensusModel(_CloudBase, metaclass=abc.ABCMeta):
         # XXX: Whether it should be a private member
         self.samples_max_dist = 0 # samples_radius_
         self._samples_radius_search = None
+        self._samples_radius_bound = None # the cloud and indices given to the search
         self._error_sqr_dists = []
         # The maximum number of samples to try until we get a good one
         self._max_sample_checks = 1000
@@ -55,6 +57,22 @@ class SampleConsensusModel(_CloudBase, metaclass=abc.ABCMeta):
         '''
         return self._model_size
 
+    @property
+    def samples_radius_search(self):
+        '''
+        Get the search method used to find the neighbors when drawing samples within
+        samples_max_dist
+        '''
+        return self._samples_radius_search
+
+    @samples_radius_search.setter
+    def samples_radius_search(self, value):
+        '''
+        Set the search method (or a precomputed NeighborGraph) used to find the neighbors when
+        drawing samples within samples_max_dist. DefaultSearch is used if it's not set.
+        '''
+        self._samples_radius_search = value
+
     @property
     def radius_limits(self):
         '''
@@ -271,13 +289,27 @@ class SampleConsensusModel(_CloudBase, metaclass=abc.ABCMeta):
         sample : list of int
             sample the set of indices of target_ to analyze
         '''
-        randfirst = self._input[self._indices[self._rng.randint(self._indices)]]
-        indices, _ = self._samples_radius_search.radius_search(randfirst, self.samples_max_dist)
+        if self._samples_radius_search is None:
+            self._samples_radius_search = DefaultSearch()
+        search = self._samples_radius_search
+        bound = self._samples_radius_bound
+        if bound is None or bound[0] is not search or bound[1] is not self._input \
+           or bound[2] is not self._indices:
+            # bind the search to the current input cloud and indices of the model
+            search.input_cloud = self._input
+            search.indices = self._indices
+            self._samples_radius_bound = (search, self._input, self._indices)
+
+        randfirst = self._indices[self._rng.randint(len(self._indices))]
+        indices, _ = search.radius_search(int(randfirst), self.samples_max_dist)
+        indices = np.asarray(indices)
+        indices = indices[indices != randfirst]
         if len(indices) < self.sample_size - 1:
             # radius search failed, make an invalid model
-            return np.tile(randfirst, (self.sample_size, 1))
+            return np.full(self.sample_size, randfirst)
         else:
-            return self._rng.choice(indices, self.sample_size)
+            others = self._rng.choice(indices, self.sample_size - 1, replace=False)
+            return np.append(randfirst, others)
 
     def _is_model_valid(self, model_coefficients):
         '''
@@ -328,9 +360,10 @@ class SampleConsensusModelPlane(SampleConsensusModel):
         if len(samples) < 3:
             return False
         cloud = self._input.xyz[samples]
-        dy1dy2 = (cloud[1] - cloud[0]) / (cloud[2] - cloud[0])
-        # check colinearity of the three points
-        return dy1dy2[0] != dy1dy2[1] or dy1dy2[1] != dy1dy2[2]
+        # check colinearity of the three points, relative to their spread so that the check
+        # doesn't depend on the scale of the cloud
+        p1p0, p2p0 = cloud[1] - cloud[0], cloud[2] - cloud[0]
+        return norm(np.cross(p1p0, p2p0)) > norm(p1p0) * norm(p2p0) * 1e-5
 
     def compute_model_coefficients(self, samples):
         '''
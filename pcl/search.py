@@ -4,13 +4,101 @@ Implementation of following files:
     pcl/search/include/pcl/search/brute_force.h
     pcl/search/include/pcl/search/impl/search.hpp
     pcl/search/include/pcl/search/impl/brute_force.hpp
+    pcl/search/include/pcl/search/kdtree.h
+    pcl/search/include/pcl/search/impl/kdtree.hpp
+    pcl/search/include/pcl/search/organized.h
+    pcl/search/include/pcl/search/impl/organized.hpp
+    pcl/search/include/pcl/search/octree.h
     pcl/search/src/search.cpp
     pcl/search/src/brute_force.cpp
+    pcl/search/src/kdtree.cpp
+    pcl/search/src/organized.cpp
+    pcl/search/src/octree.cpp
 '''
 
 import abc
+import logging
+import math
+import numbers
+from itertools import chain, product
 import numpy as np
 from .common import _CloudBase
+from .pointcloud import PointCloud, PointCloudView
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# maximum number of elements in the temporary distance matrix of brute force batch search
+_BATCH_BUFFER_SIZE = 1 << 22
+
+def _batch_slices(num_queries, num_points):
+    # split the queries so that each batch of distance matrix is bounded
+    step = max(1, _BATCH_BUFFER_SIZE // max(1, 3 * num_points))
+    for start in range(0, num_queries, step):
+        yield slice(start, min(start + step, num_queries))
+
+def _expand_ranges(starts, counts):
+    # concatenate the ranges [start, start + count) into a flat array
+    total = np.sum(counts)
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(total)
+
+def _storage_key(cloud):
+    # identify the memory storing a cloud by the layout of its first field, which is shared by
+    # the clouds wrapping the same data without copying
+    if len(cloud.names) == 0:
+        return None
+    if isinstance(cloud, PointCloudView) and cloud.base is not None:
+        indices = cloud.indices
+        selection = (indices.start, indices.stop, indices.step) if isinstance(indices, slice) \
+                    else indices.tobytes()
+        return _storage_key(cloud.base), selection
+    array = cloud.to_ndarray(cloud.names[:1])
+    return (array.__array_interface__['data'][0], array.shape, array.strides, array.dtype.str)
+
+def _stack_neighbours(results):
+    # stack the results of single kNN searches into (M, k) arrays, missing neighbours are
+    # marked with index -1 and infinite distance
+    width = max([len(indices) for indices, _ in results], default=0)
+    k_indices = np.full((len(results), width), -1, dtype=int)
+    k_distances = np.full((len(results), width), np.inf)
+    for row, (indices, distances) in enumerate(results):
+        k_indices[row, :len(indices)] = indices
+        k_distances[row, :len(distances)] = distances
+    return k_indices, k_distances
+
+def _concat_neighbours(results):
+    # concatenate the results of single radius searches into CSR arrays
+    counts = [len(indices) for indices, _ in results]
+    offsets = np.zeros(len(results) + 1, dtype=int)
+    np.cumsum(counts, out=offsets[1:])
+    k_indices = np.concatenate([np.asarray(indices, dtype=int) for indices, _ in results] +
+                               [np.array([], dtype=int)])
+    k_distances = np.concatenate([np.asarray(dist, dtype=float) for _, dist in results] +
+                                 [np.array([])])
+    return offsets, k_indices, k_distances
+
+def _sort_neighbours(offsets, indices, distances, sort_results, max_nn=0):
+    # sort the CSR formatted neighbours of each query by distance, and keep at most max_nn
+    # nearest neighbours of each query if max_nn is positive
+    if not sort_results and max_nn <= 0:
+        return offsets, indices, distances
+
+    counts = np.diff(offsets)
+    rows = np.repeat(np.arange(len(counts)), counts)
+    seq = np.lexsort((distances, rows))
+    indices = indices[seq]
+    distances = distances[seq]
+
+    if max_nn > 0 and (counts > max_nn).any():
+        keep = np.arange(len(indices)) - offsets[rows] < max_nn
+        indices = indices[keep]
+        distances = distances[keep]
+        offsets = np.zeros_like(offsets)
+        np.cumsum(np.minimum(counts, max_nn), out=offsets[1:])
+    return offsets, indices, distances
 
 class Search(_CloudBase, metaclass=abc.ABCMeta):
     '''
@@ -55,6 +143,31 @@ class Search(_CloudBase, metaclass=abc.ABCMeta):
         '''
         self._sort_results = value
 
+    @property
+    def input_cloud(self):
+        return self._input
+
+    @input_cloud.setter
+    def input_cloud(self, value):
+        _CloudBase.input_cloud.fset(self, value)
+        self._reset_index()
+
+    @property
+    def indices(self):
+        return _CloudBase.indices.fget(self)
+
+    @indices.setter
+    def indices(self, value):
+        _CloudBase.indices.fset(self, value)
+        self._reset_index()
+
+    def _reset_index(self):
+        '''
+        Drop the search structure built upon the input cloud. It's called after the input cloud
+        or the indices are changed.
+        '''
+        pass
+
     @abc.abstractmethod
     def nearestk_search(self, point, k):
         '''
@@ -98,6 +211,69 @@ class Search(_CloudBase, metaclass=abc.ABCMeta):
         '''
         pass
 
+    def _get_query_points(self, points):
+        '''
+        Get the coordinates of a batch of query points. A one-dimensional integer array is
+        treated as indices of the query points in the input cloud.
+        '''
+        points = np.asarray(points)
+        if points.ndim == 1 and points.dtype.kind in 'iu':
+            return self._input.xyz[points]
+        return points.reshape(-1, 3)
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        The default implementation calls nearestk_search for every query point, search methods
+        are supposed to override it with a vectorized version.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, missing neighbors
+            (when there are not enough points to search) are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points, missing neighbors are filled
+            with infinity
+        '''
+        points = self._get_query_points(points)
+        return _stack_neighbours([self.nearestk_search(point, k) for point in points])
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        The default implementation calls radius_search for every query point, search methods
+        are supposed to override it with a vectorized version.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        points = self._get_query_points(points)
+        return _concat_neighbours([self.radius_search(point, radius, max_nn)
+                                   for point in points])
+
 class BruteForceSearch(Search):
     '''
     Implementation of a simple brute force search algorithm.
@@ -182,6 +358,11 @@ class BruteForceSearch(Search):
         k_indices = indices[predicate]
         k_distances = dist[predicate]
 
+        if 0 < max_nn < len(k_indices):
+            nearest = k_distances.argpartition(max_nn)[:max_nn]
+            k_indices = k_indices[nearest]
+            k_distances = k_distances[nearest]
+
         if self._sort_results:
             seq = k_distances.argsort()
             k_indices = k_indices[seq]
@@ -189,5 +370,1970 @@ class BruteForceSearch(Search):
 
         return k_indices, np.sqrt(k_distances)
 
-DefaultSearch = BruteForceSearch
-DefaultOrganizedSearch = BruteForceSearch
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points
+        '''
+        points = self._get_query_points(points)
+        indices = np.asarray(self._indices, dtype=int)
+        cloud = self._input.xyz[indices]
+
+        k = max(0, min(k, len(indices)))
+        k_indices = np.empty((len(points), k), dtype=int)
+        k_distances = np.empty((len(points), k))
+        if k == 0:
+            return k_indices, k_distances
+
+        for batch in _batch_slices(len(points), len(cloud)):
+            dist = cloud[np.newaxis, :, :] - points[batch, np.newaxis, :]
+            dist = np.sum(dist * dist, axis=2)
+            rows = np.arange(len(dist))[:, np.newaxis]
+            parts = dist.argpartition(k - 1, axis=1)[:, :k]
+            dist = dist[rows, parts]
+
+            if self._sort_results:
+                seq = dist.argsort(axis=1)
+                parts = parts[rows, seq]
+                dist = dist[rows, seq]
+
+            k_indices[batch] = indices[parts]
+            k_distances[batch] = np.sqrt(dist)
+
+        return k_indices, k_distances
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        points = self._get_query_points(points)
+        indices = np.asarray(self._indices, dtype=int)
+        cloud = self._input.xyz[indices]
+
+        counts = np.zeros(len(points), dtype=int)
+        k_indices = []
+        k_distances = []
+        for batch in _batch_slices(len(points), len(cloud)):
+            dist = cloud[np.newaxis, :, :] - points[batch, np.newaxis, :]
+            dist = np.sum(dist * dist, axis=2)
+            rows, cols = np.nonzero(dist < radius * radius)
+            counts[batch] = np.bincount(rows, minlength=len(dist))
+            k_indices.append(indices[cols])
+            k_distances.append(np.sqrt(dist[rows, cols]))
+
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(counts, out=offsets[1:])
+        k_indices = np.concatenate(k_indices + [np.array([], dtype=int)])
+        k_distances = np.concatenate(k_distances + [np.array([])])
+        return _sort_neighbours(offsets, k_indices, k_distances, self._sort_results, max_nn)
+
+class KDTreeSearch(Search):
+    '''
+    Search using a KD-tree built upon the xyz coordinates of the input cloud.
+
+    The tree is built at the first query and rebuilt after the input cloud or the indices are
+    changed. Points with non-finite coordinates are not inserted into the tree.
+
+    # Notes
+    The KD-tree implementation is provided by scipy (scipy.spatial.cKDTree)
+    '''
+    def __init__(self, cloud=None, indices=None, sort_results=False, leafsize=16):
+        if cKDTree is None:
+            raise ImportError('scipy is required for KD-tree search, ' +
+                              'it can be installed by pip install scipy')
+        super().__init__(cloud, indices, sort_results)
+        self.leafsize = leafsize
+        self._tree = None
+        self._tree_indices = None
+
+    def _reset_index(self):
+        self._tree = None
+
+    def _build_tree(self):
+        '''
+        Build the KD-tree from the points selected by indices
+        '''
+        indices = np.asarray(self._indices, dtype=int)
+        points = self._input.xyz[indices]
+        valid = np.isfinite(points).all(axis=1)
+        if not valid.all():
+            indices = indices[valid]
+            points = points[valid]
+        self._tree = cKDTree(points, leafsize=self.leafsize)
+        self._tree_indices = indices
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the k-nearest neighbors for the given query point.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if k < 1:
+            return [], []
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        if self._tree is None:
+            self._build_tree()
+
+        k = min(k, self._tree.n)
+        if k == 0 or not np.isfinite(point).all():
+            return np.array([], dtype=int), np.array([])
+        # results of the tree are always sorted ascending in the distance
+        k_distances, parts = self._tree.query(point, k)
+        k_distances = np.atleast_1d(k_distances)
+        k_indices = self._tree_indices[np.atleast_1d(parts)]
+        return k_indices, k_distances
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        if self._tree is None:
+            self._build_tree()
+        if not np.isfinite(point).all():
+            return np.array([], dtype=int), np.array([])
+
+        parts = np.array(self._tree.query_ball_point(point, radius), dtype=int)
+        dist = self._tree.data[parts] - point
+        k_distances = np.sqrt(np.sum(dist * dist, axis=1))
+        # the tree includes the points at exactly the radius, which other methods exclude
+        inside = k_distances < radius
+        parts, k_distances = parts[inside], k_distances[inside]
+
+        if 0 < max_nn < len(parts):
+            nearest = k_distances.argpartition(max_nn)[:max_nn]
+            parts = parts[nearest]
+            k_distances = k_distances[nearest]
+
+        if self._sort_results:
+            seq = k_distances.argsort()
+            parts = parts[seq]
+            k_distances = k_distances[seq]
+
+        return self._tree_indices[parts], k_distances
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, neighbors of queries
+            with non-finite coordinates are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points
+        '''
+        points = self._get_query_points(points)
+        if self._tree is None:
+            self._build_tree()
+
+        k = max(0, min(k, self._tree.n))
+        if k == 0:
+            return np.empty((len(points), 0), dtype=int), np.empty((len(points), 0))
+
+        # the tree rejects non-finite queries, their neighbors are left missing
+        k_indices = np.full((len(points), k), -1, dtype=int)
+        k_distances = np.full((len(points), k), np.inf)
+        valid = np.isfinite(points).all(axis=1)
+        if valid.any():
+            distances, parts = self._tree.query(points[valid], k)
+            k_distances[valid] = distances.reshape(-1, k)
+            # missing neighbors are indicated with index n by cKDTree
+            k_indices[valid] = np.append(self._tree_indices, -1)[parts.reshape(-1, k)]
+        return k_indices, k_distances
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        points = self._get_query_points(points)
+        if self._tree is None:
+            self._build_tree()
+
+        # the tree rejects non-finite queries, they get no neighbors
+        valid = np.isfinite(points).all(axis=1)
+        results = self._tree.query_ball_point(points[valid], radius)
+        counts = np.zeros(len(points), dtype=int)
+        counts[valid] = np.fromiter(map(len, results), dtype=int, count=len(results))
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(counts, out=offsets[1:])
+        parts = np.fromiter(chain.from_iterable(results), dtype=int, count=offsets[-1])
+
+        dist = self._tree.data[parts] - np.repeat(points, counts, axis=0)
+        k_distances = np.sqrt(np.sum(dist * dist, axis=1))
+
+        # the tree includes the points at exactly the radius, which other methods exclude
+        inside = k_distances < radius
+        if not inside.all():
+            qids = np.repeat(np.arange(len(points)), counts)
+            np.cumsum(np.bincount(qids[inside], minlength=len(points)), out=offsets[1:])
+            parts, k_distances = parts[inside], k_distances[inside]
+        return _sort_neighbours(offsets, self._tree_indices[parts], k_distances,
+                                self._sort_results, max_nn)
+
+class OrganizedNeighborSearch(Search):
+    '''
+    Search for organized point clouds, e.g. the ones captured by depth cameras.
+
+    Neighbors are found by scanning the pixel window around the projection of the query point
+    on the image plane, where the projection matrix is estimated from the pixel layout of the
+    input cloud. The search falls back to brute force when the window around the query is empty
+    or when the cloud doesn't fit a pinhole camera model.
+
+    # Parameters
+    window_size : int
+        Initial half size (in pixels) of the window scanned by the kNN search
+    projection_error : float
+        Maximum admissible reprojection error (in pixels) of the estimated projection matrix
+    '''
+    def __init__(self, cloud=None, indices=None, sort_results=False, window_size=2,
+                 projection_error=1.):
+        super().__init__(cloud, indices, sort_results)
+        self.window_size = window_size
+        self.projection_error = projection_error
+        self._points = None
+        self._mask = None
+        self._projection = None
+        self._margin = 1.
+
+    @property
+    def projection_matrix(self):
+        '''
+        Get the 3x4 projection matrix estimated from the input cloud, None if the cloud can't be
+        fitted by a pinhole camera model.
+        '''
+        if self._mask is None:
+            self._build_index()
+        return self._projection
+
+    def _reset_index(self):
+        self._mask = None
+
+    def _build_index(self):
+        '''
+        Build the mask of searchable pixels and estimate the projection matrix
+        '''
+        if not self._input.is_organized:
+            raise ValueError('organized neighbor search requires an organized point cloud')
+
+        self._points = np.asarray(self._input.xyz, dtype=float)
+        mask = np.zeros(len(self._points), dtype=bool)
+        mask[np.asarray(self._indices, dtype=int)] = True
+        mask &= np.isfinite(self._points).all(axis=1)
+        self._mask = mask.reshape(self._input.height, self._input.width)
+        self._projection = self._estimate_projection()
+
+    def _estimate_projection(self):
+        '''
+        Estimate the projection matrix from point coordinates to pixel coordinates with the
+        normalized direct linear transformation.
+        '''
+        logger = logging.getLogger('pcl.search.OrganizedNeighborSearch._estimate_projection')
+        valid = np.flatnonzero(self._mask)
+        if len(valid) < 6:
+            logger.warning('not enough valid points to estimate the projection matrix')
+            return None
+
+        # a subsample of a few thousands points is enough for the estimation
+        sample = valid[::max(1, len(valid) // 4096)]
+        rows, cols = np.divmod(sample, self._mask.shape[1])
+        pixels = np.stack((cols, rows), axis=1).astype(float)
+        points = self._points[sample]
+
+        # normalize the points and pixels for numerical stability
+        pmean = points.mean(axis=0)
+        pscale = math.sqrt(3) / max(np.mean(np.linalg.norm(points - pmean, axis=1)), 1e-12)
+        umean = pixels.mean(axis=0)
+        uscale = math.sqrt(2) / max(np.mean(np.linalg.norm(pixels - umean, axis=1)), 1e-12)
+        ptrans = np.diag([pscale, pscale, pscale, 1.])
+        ptrans[:3, 3] = -pscale * pmean
+        utrans = np.diag([uscale, uscale, 1.])
+        utrans[:2, 2] = -uscale * umean
+
+        homo = np.hstack((points, np.ones((len(points), 1)))).dot(ptrans.T)
+        npixels = (pixels - umean) * uscale
+        equations = np.zeros((2 * len(points), 12))
+        equations[0::2, 0:4] = homo
+        equations[0::2, 8:12] = -npixels[:, :1] * homo
+        equations[1::2, 4:8] = homo
+        equations[1::2, 8:12] = -npixels[:, 1:] * homo
+        _, singular, vtrans = np.linalg.svd(equations, full_matrices=False)
+        if singular[-2] < 1e-9 * singular[0]:
+            logger.warning('degenerated points layout, projection matrix is not estimated')
+            return None
+
+        projection = np.linalg.inv(utrans).dot(vtrans[-1].reshape(3, 4)).dot(ptrans)
+        projected = np.hstack((points, np.ones((len(points), 1)))).dot(projection.T)
+        if np.median(projected[:, 2]) < 0: # make points in front of the camera
+            projection = -projection
+            projected = -projected
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            error = np.linalg.norm(projected[:, :2] / projected[:, 2:] - pixels, axis=1)
+        error = np.max(error) if (projected[:, 2] > 0).all() else np.inf
+        if not error <= self.projection_error:
+            logger.warning('the cloud does not fit a pinhole camera model (reprojection ' +
+                           'error %g), brute force search will be used', error)
+            return None
+
+        self._margin = 1. + error
+        return projection
+
+    def _window_candidates(self, row_start, row_stop, col_start, col_stop):
+        '''
+        Get the indices of searchable points within a pixel window
+        '''
+        row_start, col_start = max(row_start, 0), max(col_start, 0)
+        rows, cols = np.nonzero(self._mask[row_start:row_stop, col_start:col_stop])
+        return (rows + row_start) * self._mask.shape[1] + cols + col_start
+
+    def _sphere_candidates(self, point, radius):
+        '''
+        Get the indices of searchable points whose pixels lie in the projection of a sphere
+        '''
+        height, width = self._mask.shape
+        corners = point + radius * np.array(list(product((-1, 1), repeat=3)))
+        projected = corners.dot(self._projection[:, :3].T) + self._projection[:, 3]
+        if not (projected[:, 2] > 0).all():
+            # the sphere crosses the camera plane, scan the whole image
+            return self._window_candidates(0, height, 0, width)
+
+        cols = projected[:, 0] / projected[:, 2]
+        rows = projected[:, 1] / projected[:, 2]
+        return self._window_candidates(int(math.floor(rows.min() - self._margin)),
+                                       int(math.ceil(rows.max() + self._margin)) + 1,
+                                       int(math.floor(cols.min() - self._margin)),
+                                       int(math.ceil(cols.max() + self._margin)) + 1)
+
+    def _query_pixel(self, point):
+        '''
+        Get the query point coordinates and its pixel location (row, col), the pixel is None if
+        the point cannot be projected onto the image
+        '''
+        if isinstance(point, numbers.Integral):
+            return self._points[point], divmod(int(point), self._mask.shape[1])
+
+        point = np.asarray(point, dtype=float)
+        if self._projection is None or not np.isfinite(point).all():
+            return point, None
+        projected = self._projection[:, :3].dot(point) + self._projection[:, 3]
+        if projected[2] <= 0:
+            return point, None
+        col = int(round(projected[0] / projected[2]))
+        row = int(round(projected[1] / projected[2]))
+        if 0 <= row < self._mask.shape[0] and 0 <= col < self._mask.shape[1]:
+            return point, (row, col)
+        return point, None
+
+    def _query_pixels(self, points):
+        '''
+        Vectorized version of _query_pixel, pixels that cannot be projected onto the image
+        are marked with row -1
+        '''
+        points = np.asarray(points)
+        height, width = self._mask.shape
+        if points.ndim == 1 and points.dtype.kind in 'iu':
+            rows, cols = np.divmod(points, width)
+            points = self._points[points]
+        else:
+            points = points.reshape(-1, 3).astype(float)
+            projected = points.dot(self._projection[:, :3].T) + self._projection[:, 3]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cols = np.round(projected[:, 0] / projected[:, 2])
+                rows = np.round(projected[:, 1] / projected[:, 2])
+            valid = (projected[:, 2] > 0) & (rows >= 0) & (rows < height) & \
+                    (cols >= 0) & (cols < width)
+            rows = np.where(valid, rows, -1).astype(int)
+            cols = np.where(valid, cols, -1).astype(int)
+        rows[~np.isfinite(points).all(axis=1)] = -1
+        return points, rows, cols
+
+    def _sphere_windows(self, points, radius):
+        '''
+        Vectorized pixel bounding boxes (row_min, row_max, col_min, col_max) of the projected
+        spheres clipped by the image, the boxes crossing the camera plane are marked with
+        row_min -1
+        '''
+        height, width = self._mask.shape
+        corners = points[:, np.newaxis, :] + \
+                  radius[:, np.newaxis, np.newaxis] * np.array(list(product((-1, 1), repeat=3)))
+        projected = corners.dot(self._projection[:, :3].T) + self._projection[:, 3]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cols = projected[:, :, 0] / projected[:, :, 2]
+            rows = projected[:, :, 1] / projected[:, :, 2]
+            front = (projected[:, :, 2] > 0).all(axis=1) & np.isfinite(radius)
+            row_min = np.maximum(np.floor(rows.min(axis=1) - self._margin), 0)
+            row_max = np.minimum(np.ceil(rows.max(axis=1) + self._margin), height - 1)
+            col_min = np.maximum(np.floor(cols.min(axis=1) - self._margin), 0)
+            col_max = np.minimum(np.ceil(cols.max(axis=1) + self._margin), width - 1)
+        row_min[~front] = -1
+        return row_min, row_max, col_min, col_max
+
+    def _window_batch(self, points, rows, cols, size):
+        '''
+        Get the candidates in the windows of given half size around the pixels, and the squared
+        distances to them. Invalid candidates are marked with infinite distance.
+        '''
+        height, width = self._mask.shape
+        drow, dcol = np.mgrid[-size:size + 1, -size:size + 1]
+        wrows = rows[:, np.newaxis] + drow.ravel()
+        wcols = cols[:, np.newaxis] + dcol.ravel()
+        inside = (wrows >= 0) & (wrows < height) & (wcols >= 0) & (wcols < width)
+        inside &= (rows >= 0)[:, np.newaxis]
+        candidates = np.where(inside, wrows * width + wcols, 0)
+        inside &= self._mask.ravel()[candidates]
+
+        dist = self._points[candidates] - points[:, np.newaxis, :]
+        dist = np.sum(dist * dist, axis=2)
+        dist[~inside] = np.inf
+        return candidates, dist
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        The windows around all the queries are scanned at the same time, only the queries whose
+        neighbors are not guaranteed to be in the window are searched one by one.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, missing neighbors
+            (when there are not enough points to search) are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points, missing neighbors are filled
+            with infinity
+        '''
+        if self._mask is None:
+            self._build_index()
+        if self._projection is None or k < 1:
+            return super().nearestk_search_batch(points, k)
+
+        points, rows, cols = self._query_pixels(points)
+        # the window should cover the pixel disk of k points and the reprojection error
+        size = max(self.window_size, int(math.ceil(math.sqrt(k / math.pi) + self._margin)) + 1)
+        k = min(k, int(np.count_nonzero(self._mask)))
+        k_indices = np.full((len(points), k), -1, dtype=int)
+        k_distances = np.full((len(points), k), np.inf)
+
+        pending = np.flatnonzero(rows >= 0)
+        while len(pending) > 0 and (2 * size + 1) ** 2 <= max(self._mask.size // 16, 81):
+            halfsize = np.empty(len(pending), dtype=int)
+            for batch in _batch_slices(len(pending), (2 * size + 1) ** 2):
+                queries = pending[batch]
+                candidates, dist = self._window_batch(points[queries], rows[queries],
+                                                      cols[queries], size)
+                windex = np.arange(len(dist))[:, np.newaxis]
+                parts = dist.argpartition(k - 1, axis=1)[:, :k]
+                candidates = candidates[windex, parts]
+                dist = dist[windex, parts]
+
+                if self._sort_results:
+                    seq = dist.argsort(axis=1)
+                    candidates = candidates[windex, seq]
+                    dist = dist[windex, seq]
+                k_indices[queries] = candidates
+                k_distances[queries] = np.sqrt(dist)
+
+                # the result is exact if the sphere through the k-th neighbor is in the window
+                row_min, row_max, col_min, col_max = self._sphere_windows(
+                    points[queries], np.sqrt(dist.max(axis=1)))
+                qrows, qcols = rows[queries], cols[queries]
+                needed = np.maximum.reduce([qrows - row_min, row_max - qrows,
+                                            qcols - col_min, col_max - qcols])
+                needed[row_min < 0] = np.iinfo(int).max
+                halfsize[batch] = needed
+
+            # retry the rest of queries with a window that covers most of them
+            pending = pending[halfsize > size]
+            halfsize = halfsize[halfsize > size]
+            finite = halfsize < np.iinfo(int).max
+            if not finite.any():
+                break
+            size = max(size * 2, int(np.percentile(halfsize[finite], 90)))
+
+        fallback = np.union1d(pending, np.flatnonzero(rows < 0))
+        for row in fallback:
+            indices, distances = self.nearestk_search(points[row], k)
+            k_indices[row] = -1
+            k_distances[row] = np.inf
+            k_indices[row, :len(indices)] = indices
+            k_distances[row, :len(distances)] = distances
+        return k_indices, k_distances
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        The windows of most queries are scanned at the same time, only the queries with large
+        projected spheres are searched one by one.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        if self._mask is None:
+            self._build_index()
+        if self._projection is None:
+            return super().radius_search_batch(points, radius, max_nn)
+
+        points, rows, cols = self._query_pixels(points)
+        row_min, row_max, col_min, col_max = self._sphere_windows(
+            points, np.full(len(points), float(radius)))
+        halfsize = np.maximum.reduce([rows - row_min, row_max - rows, cols - col_min,
+                                      col_max - cols]).astype(int)
+        # scan a window that covers most of the projected spheres
+        inwindow = (row_min >= 0) & (rows >= 0)
+        size = int(np.percentile(halfsize[inwindow], 90)) if inwindow.any() else 0
+        inwindow &= halfsize <= size
+
+        counts = np.zeros(len(points), dtype=int)
+        queries, k_indices, k_distances = [], [], []
+        vectorized = np.flatnonzero(inwindow)
+        for batch in _batch_slices(len(vectorized), (2 * size + 1) ** 2):
+            batch = vectorized[batch]
+            candidates, dist = self._window_batch(points[batch], rows[batch], cols[batch], size)
+            wrows, wcols = np.nonzero(dist < radius * radius)
+            queries.append(batch[wrows])
+            k_indices.append(candidates[wrows, wcols])
+            k_distances.append(np.sqrt(dist[wrows, wcols]))
+        for query in np.flatnonzero(~inwindow):
+            indices, distances = self.radius_search(points[query], radius)
+            queries.append(np.full(len(indices), query, dtype=int))
+            k_indices.append(indices)
+            k_distances.append(distances)
+
+        # group the neighbors by queries
+        queries = np.concatenate(queries + [np.array([], dtype=int)])
+        seq = np.argsort(queries, kind='mergesort')
+        counts = np.bincount(queries, minlength=len(points))
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(counts, out=offsets[1:])
+        k_indices = np.concatenate(k_indices + [np.array([], dtype=int)])[seq]
+        k_distances = np.concatenate(k_distances + [np.array([])])[seq]
+        return _sort_neighbours(offsets, k_indices, k_distances, self._sort_results, max_nn)
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the k-nearest neighbors for the given query point.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if k < 1:
+            return [], []
+        if self._mask is None:
+            self._build_index()
+        height, width = self._mask.shape
+        point, pixel = self._query_pixel(point)
+
+        candidates = np.array([], dtype=int)
+        if pixel is not None and self._projection is not None and np.isfinite(point).all():
+            # grow the window until there are enough candidates
+            row, col = pixel
+            size = max(1, self.window_size)
+            while True:
+                candidates = self._window_candidates(row - size, row + size + 1,
+                                                     col - size, col + size + 1)
+                if len(candidates) >= k or (size >= height and size >= width):
+                    break
+                size *= 2
+
+        if len(candidates) > 0:
+            # points closer than the k-th candidate are all located in the projected sphere
+            dist = self._points[candidates] - point
+            dist = np.sum(dist * dist, axis=1)
+            radius = math.sqrt(np.partition(dist, min(k, len(dist)) - 1)[min(k, len(dist)) - 1])
+            candidates = self._sphere_candidates(point, radius)
+        else:
+            candidates = np.flatnonzero(self._mask)
+
+        dist = self._points[candidates] - point
+        dist = np.sum(dist * dist, axis=1)
+        if len(dist) > k:
+            parts = dist.argpartition(k - 1)[:k]
+            candidates = candidates[parts]
+            dist = dist[parts]
+
+        if self._sort_results:
+            seq = dist.argsort()
+            candidates = candidates[seq]
+            dist = dist[seq]
+
+        return candidates, np.sqrt(dist)
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if self._mask is None:
+            self._build_index()
+        point, _ = self._query_pixel(point)
+
+        if self._projection is not None and np.isfinite(point).all():
+            candidates = self._sphere_candidates(point, radius)
+        else:
+            candidates = np.flatnonzero(self._mask)
+
+        dist = self._points[candidates] - point
+        dist = np.sum(dist * dist, axis=1)
+        predicate = dist < radius * radius
+        k_indices = candidates[predicate]
+        k_distances = dist[predicate]
+
+        if 0 < max_nn < len(k_indices):
+            nearest = k_distances.argpartition(max_nn)[:max_nn]
+            k_indices = k_indices[nearest]
+            k_distances = k_distances[nearest]
+
+        if self._sort_results:
+            seq = k_distances.argsort()
+            k_indices = k_indices[seq]
+            k_distances = k_distances[seq]
+
+        return k_indices, np.sqrt(k_distances)
+
+class VoxelHashSearch(Search):
+    '''
+    Search using a hashed uniform voxel grid, which is efficient for fixed-radius searches.
+
+    Points are bucketed into cubic cells by one vectorized pass over the coordinates, and the
+    occupied cells are stored as a sorted hash table. A radius search with the radius no larger
+    than the cell size only looks into the 27 cells around the query, thus the cell size is
+    best set to the search radius.
+
+    # Parameters
+    cell_size : float
+        The edge length of the voxels. If it's not given, the radius of the first radius search
+        is used, or it's estimated from the point density when kNN search comes first.
+    '''
+    def __init__(self, cloud=None, indices=None, sort_results=False, cell_size=None):
+        super().__init__(cloud, indices, sort_results)
+        self._cell_size = cell_size
+        self._cells = None
+        self._cell_starts = None
+        self._origin = None
+        self._dims = None
+        self._points = None
+        self._point_indices = None
+
+    @property
+    def cell_size(self):
+        '''
+        Get the edge length of the voxels
+        '''
+        return self._cell_size
+
+    @cell_size.setter
+    def cell_size(self, value):
+        '''
+        Set the edge length of the voxels, the index will be rebuilt at the next query
+        '''
+        self._cell_size = value
+        self._reset_index()
+
+    def _reset_index(self):
+        self._cells = None
+
+    def _build_index(self, radius=None):
+        '''
+        Bucket the points into voxels and build the table of occupied voxels
+        '''
+        indices = np.asarray(self._indices, dtype=int)
+        points = np.asarray(self._input.xyz[indices], dtype=float)
+        valid = np.isfinite(points).all(axis=1)
+        if not valid.all():
+            indices = indices[valid]
+            points = points[valid]
+
+        if self._cell_size is None:
+            if radius is not None and radius > 0:
+                self._cell_size = float(radius)
+            elif len(points) > 0:
+                # make a voxel contain about 8 points in average, over the dimensions along
+                # which the points spread, so that flat or coincident points get sane voxels
+                extent = np.ptp(points, axis=0)
+                extent = extent[extent > extent.max() * 1e-6]
+                if len(extent) > 0:
+                    self._cell_size = float((np.prod(extent) * 8 / len(points)) **
+                                            (1. / len(extent)))
+                else:
+                    self._cell_size = 1.
+            else:
+                self._cell_size = 1.
+
+        # cell coordinates are shifted by one so that the neighboring cells are never negative
+        self._origin = points.min(axis=0) if len(points) > 0 else np.zeros(3)
+        coords = np.floor((points - self._origin) / self._cell_size).astype(np.int64) + 1
+        self._dims = (coords.max(axis=0) if len(points) > 0 else np.zeros(3, dtype=np.int64)) + 2
+        if np.prod(self._dims.astype(float)) >= 2 ** 62:
+            raise ValueError('cell size %g is too small for the extent of the cloud'
+                             % self._cell_size)
+
+        keys = self._hash(coords)
+        order = np.argsort(keys, kind='mergesort')
+        keys = keys[order]
+        self._cells, starts = np.unique(keys, return_index=True)
+        self._cell_starts = np.append(starts, len(keys))
+        self._points = points[order]
+        self._point_indices = indices[order]
+
+    def _hash(self, coords):
+        return (coords[..., 0] * self._dims[1] + coords[..., 1]) * self._dims[2] + coords[..., 2]
+
+    def _scans_all(self, ring):
+        # a ring enclosing more cells than the occupied ones is cheaper to replace by a scan of
+        # all the points, which also bounds the memory of the offsets of large rings
+        return (2 * int(ring) + 1) ** 3 >= len(self._cells)
+
+    def _num_candidates(self, ring):
+        # estimated number of candidates of a query, for batching the queries
+        if self._scans_all(ring):
+            return len(self._points)
+        return int((2 * int(ring) + 1) ** 3 * len(self._points) / max(len(self._cells), 1))
+
+    def _gather(self, points, ring):
+        '''
+        Gather the points in the cells within the given ring around the cells of the queries.
+        All the points are gathered if the ring encloses more cells than the occupied ones.
+
+        # Returns
+        queries : array of int
+            The query that each candidate belongs to, in ascending order
+        candidates : array of int
+            The positions of candidates in the sorted points
+        '''
+        if len(self._cells) == 0:
+            return np.array([], dtype=int), np.array([], dtype=int)
+        if self._scans_all(ring):
+            return (np.repeat(np.arange(len(points)), len(self._points)),
+                    np.tile(np.arange(len(self._points)), len(points)))
+        offsets = np.mgrid[-ring:ring + 1, -ring:ring + 1, -ring:ring + 1].reshape(3, -1).T
+        with np.errstate(invalid='ignore'):
+            coords = np.floor((points - self._origin) / self._cell_size)
+        finite = np.isfinite(coords).all(axis=1)
+        coords = np.where(finite[:, np.newaxis], coords, -ring - 1).astype(np.int64) + 1
+        coords = coords[:, np.newaxis, :] + offsets
+
+        inside = ((coords >= 0) & (coords < self._dims)).all(axis=2)
+        keys = np.where(inside, self._hash(coords), -1)
+        pos = np.minimum(np.searchsorted(self._cells, keys), len(self._cells) - 1)
+        found = inside & (self._cells[pos] == keys)
+        starts = self._cell_starts[pos]
+        counts = np.where(found, self._cell_starts[pos + 1] - starts, 0)
+
+        queries = np.repeat(np.arange(len(points)), np.sum(counts, axis=1))
+        return queries, _expand_ranges(starts.ravel(), counts.ravel())
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the k-nearest neighbors for the given query point.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if k < 1:
+            return [], []
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        k_indices, k_distances = self.nearestk_search_batch(np.reshape(point, (1, 3)), k)
+        valid = k_indices[0] >= 0
+        return k_indices[0][valid], k_distances[0][valid]
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        _, k_indices, k_distances = self.radius_search_batch(np.reshape(point, (1, 3)),
+                                                             radius, max_nn)
+        return k_indices, k_distances
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        The cells around the queries are scanned ring by ring until the k-th neighbor found is
+        guaranteed to be the k-th nearest one.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, neighbors of queries
+            with non-finite coordinates are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points
+        '''
+        points = np.asarray(self._get_query_points(points), dtype=float)
+        if self._cells is None:
+            self._build_index()
+
+        k = max(0, min(k, len(self._points)))
+        k_indices = np.full((len(points), k), -1, dtype=int)
+        k_distances = np.full((len(points), k), np.inf)
+        if k == 0:
+            return k_indices, k_distances
+
+        rings = np.ones(len(points), dtype=int)
+        pending = np.flatnonzero(np.isfinite(points).all(axis=1))
+        while len(pending) > 0:
+            ring = rings[pending].min()
+            group = pending[rings[pending] == ring]
+            for batch in _batch_slices(len(group), self._num_candidates(ring)):
+                queries = group[batch]
+                qids, candidates = self._gather(points[queries], ring)
+                dist = self._points[candidates] - points[queries][qids]
+                dist = np.sum(dist * dist, axis=1)
+
+                # pick the k nearest candidates of each query
+                seq = np.lexsort((dist, qids))
+                qids, candidates, dist = qids[seq], candidates[seq], dist[seq]
+                starts = np.zeros(len(queries), dtype=int)
+                np.cumsum(np.bincount(qids, minlength=len(queries))[:-1], out=starts[1:])
+                rank = np.arange(len(qids)) - starts[qids]
+                keep = rank < k
+                k_indices[queries[qids[keep]], rank[keep]] = \
+                    self._point_indices[candidates[keep]]
+                k_distances[queries[qids[keep]], rank[keep]] = np.sqrt(dist[keep])
+
+            # points within ring * cell_size are all scanned
+            kth = k_distances[group, -1]
+            coords = np.floor((points[group] - self._origin) / self._cell_size) + 1
+            covered = ((coords - ring <= 0) & (coords + ring >= self._dims - 1)).all(axis=1)
+            done = (kth <= ring * self._cell_size) | covered | self._scans_all(ring)
+            rings[group] = np.minimum(np.where(np.isfinite(kth), np.ceil(kth / self._cell_size),
+                                               ring * 2), self._dims.max()).astype(int)
+            pending = np.setdiff1d(pending, group[done], assume_unique=True)
+
+        return k_indices, k_distances
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        points = np.asarray(self._get_query_points(points), dtype=float)
+        if self._cells is None:
+            self._build_index(radius)
+
+        ring = max(1, int(min(math.ceil(radius / self._cell_size), self._dims.max())))
+        qids, k_indices, k_distances = [], [], []
+        for batch in _batch_slices(len(points), self._num_candidates(ring)):
+            queries, candidates = self._gather(points[batch], ring)
+            dist = self._points[candidates] - points[batch][queries]
+            dist = np.sum(dist * dist, axis=1)
+            predicate = dist < radius * radius
+            qids.append(queries[predicate] + batch.start)
+            k_indices.append(self._point_indices[candidates[predicate]])
+            k_distances.append(np.sqrt(dist[predicate]))
+
+        counts = np.bincount(np.concatenate(qids + [np.array([], dtype=int)]),
+                             minlength=len(points))
+        offsets = np.zeros(len(points) + 1, dtype=int)
+        np.cumsum(counts, out=offsets[1:])
+        k_indices = np.concatenate(k_indices + [np.array([], dtype=int)])
+        k_distances = np.concatenate(k_distances + [np.array([])])
+        return _sort_neighbours(offsets, k_indices, k_distances, self._sort_results, max_nn)
+
+def _spread_bits(values):
+    # insert two zero bits between every bit of 21-bit integers
+    values = values.astype(np.uint64) & np.uint64(0x1fffff)
+    for shift, mask in ((32, 0x1f00000000ffff), (16, 0x1f0000ff0000ff), (8, 0x100f00f00f00f00f),
+                        (4, 0x10c30c30c30c30c3), (2, 0x1249249249249249)):
+        values = (values | (values << np.uint64(shift))) & np.uint64(mask)
+    return values
+
+def _morton_codes(coords):
+    # interleave the bits of integer coordinates so that octree nodes are contiguous ranges
+    return (_spread_bits(coords[:, 0]) << np.uint64(2)) | \
+           (_spread_bits(coords[:, 1]) << np.uint64(1)) | _spread_bits(coords[:, 2])
+
+class OctreeSearch(Search):
+    '''
+    Search using a linear octree, which also supports box and frustum queries and provides
+    point counts and centroids of the nodes at each level of detail.
+
+    The octree is built in one pass by sorting the points along their Morton codes, so that the
+    points of every node are a contiguous range of the sorted points.
+
+    # Parameters
+    resolution : float
+        The edge length of the leaf voxels
+    '''
+    _MAX_DEPTH = 21
+
+    def __init__(self, cloud=None, indices=None, sort_results=False, resolution=0.01):
+        super().__init__(cloud, indices, sort_results)
+        if resolution <= 0:
+            raise ValueError('resolution should be positive')
+        self._resolution = resolution
+        self._levels = None
+        self._depth = 0
+        self._origin = None
+        self._root_size = resolution
+        self._points = None
+        self._point_indices = None
+
+    @property
+    def resolution(self):
+        '''
+        Get the edge length of the leaf voxels
+        '''
+        return self._resolution
+
+    @resolution.setter
+    def resolution(self, value):
+        '''
+        Set the edge length of the leaf voxels, the octree will be rebuilt at the next query
+        '''
+        if value <= 0:
+            raise ValueError('resolution should be positive')
+        self._resolution = value
+        self._reset_index()
+
+    @property
+    def depth(self):
+        '''
+        Get the depth of the octree, level 0 is the root and level depth contains the leaves
+        '''
+        self._check_tree()
+        return self._depth
+
+    def _reset_index(self):
+        self._levels = None
+
+    def _check_tree(self):
+        if self._levels is None:
+            if self._input is None:
+                raise ValueError('null input point cloud')
+            self._build_tree()
+
+    def _build_tree(self):
+        '''
+        Sort the points by their Morton codes and aggregate the nodes level by level
+        '''
+        indices = np.asarray(self._indices, dtype=int)
+        points = np.asarray(self._input.xyz[indices], dtype=float)
+        valid = np.isfinite(points).all(axis=1)
+        if not valid.all():
+            indices = indices[valid]
+            points = points[valid]
+
+        if len(points) > 0:
+            self._origin = points.min(axis=0)
+            extent = np.ptp(points, axis=0).max()
+        else:
+            self._origin = np.zeros(3)
+            extent = 0
+        depth = max(0, int(math.ceil(math.log2(max(extent / self._resolution, 1)))))
+        if depth > self._MAX_DEPTH:
+            raise ValueError('resolution %g is too small for the extent of the cloud'
+                             % self._resolution)
+        self._depth = depth
+        self._root_size = self._resolution * 2 ** depth
+
+        coords = np.floor((points - self._origin) / self._resolution).astype(np.int64)
+        coords = np.clip(coords, 0, 2 ** depth - 1)
+        codes = _morton_codes(coords)
+        order = np.argsort(codes, kind='mergesort')
+        codes = codes[order]
+        coords = coords[order]
+        self._points = points[order]
+        self._point_indices = indices[order]
+
+        # level entries are (keys, starts, coords, counts, sums), starts are offsets of the
+        # sorted points and have one more element than the nodes
+        levels = [None] * (depth + 1)
+        keys, starts = np.unique(codes, return_index=True)
+        starts = np.append(starts, len(codes))
+        sums = np.add.reduceat(self._points, starts[:-1], axis=0) if len(keys) > 0 \
+            else np.zeros((0, 3))
+        levels[depth] = (keys, starts, coords[starts[:-1]], np.diff(starts), sums)
+        for level in range(depth - 1, -1, -1):
+            child_keys, child_starts, child_coords, _, child_sums = levels[level + 1]
+            keys, first = np.unique(child_keys >> np.uint64(3), return_index=True)
+            sums = np.add.reduceat(child_sums, first, axis=0) if len(keys) > 0 \
+                else np.zeros((0, 3))
+            starts = np.append(child_starts[first], len(codes))
+            levels[level] = (keys, starts, child_coords[first] >> 1, np.diff(starts), sums)
+        self._levels = levels
+
+    def _check_level(self, level):
+        self._check_tree()
+        if not 0 <= level <= self._depth:
+            raise ValueError('level should be in range [0, %d]' % self._depth)
+        return self._levels[level]
+
+    def node_counts(self, level):
+        '''
+        Get the number of points in each node at the given level.
+
+        # Parameters
+        level : int
+            The level of detail, 0 is the root and depth contains the leaves
+
+        # Returns
+        counts : array of int
+        '''
+        return self._check_level(level)[3]
+
+    def node_centroids(self, level):
+        '''
+        Get the centroids of the points in each node at the given level.
+
+        # Returns
+        centroids : (N, 3) array of float
+        '''
+        _, _, _, counts, sums = self._check_level(level)
+        return sums / counts[:, np.newaxis]
+
+    def node_bounds(self, level):
+        '''
+        Get the bounding boxes of the nodes at the given level.
+
+        # Returns
+        min_pt : (N, 3) array of float
+        max_pt : (N, 3) array of float
+        '''
+        coords = self._check_level(level)[2]
+        size = self._root_size / 2 ** level
+        min_pt = self._origin + coords * size
+        return min_pt, min_pt + size
+
+    def node_indices(self, level, node):
+        '''
+        Get the indices of the points in a node at the given level.
+        '''
+        starts = self._check_level(level)[1]
+        return self._point_indices[starts[node]:starts[node + 1]]
+
+    def _traverse(self, classify, test_points):
+        '''
+        Traverse the octree from root to leaves and return positions of selected points.
+
+        # Parameters
+        classify : callable
+            Given the (N, 3) lower and upper bounds of the nodes, return an array with 0 for
+            nodes outside the region, 1 for intersecting nodes and 2 for nodes inside.
+        test_points : callable
+            Given (N, 3) points, return a boolean mask of the points inside the region
+        '''
+        self._check_tree()
+        selected = []
+        nodes = np.arange(len(self._levels[0][0]))
+        for level in range(self._depth + 1):
+            if len(nodes) == 0:
+                break
+            keys, starts, coords, _, _ = self._levels[level]
+            size = self._root_size / 2 ** level
+            lower = self._origin + coords[nodes] * size
+            states = classify(lower, lower + size)
+
+            inside = nodes[states == 2]
+            selected.append(_expand_ranges(starts[inside], starts[inside + 1] - starts[inside]))
+            partial = nodes[states == 1]
+            if level == self._depth:
+                candidates = _expand_ranges(starts[partial],
+                                            starts[partial + 1] - starts[partial])
+                selected.append(candidates[test_points(self._points[candidates])])
+            else:
+                child_keys = self._levels[level + 1][0]
+                parents = keys[partial] << np.uint64(3)
+                first = np.searchsorted(child_keys, parents)
+                last = np.searchsorted(child_keys, parents + np.uint64(8))
+                nodes = _expand_ranges(first, last - first)
+        return np.concatenate(selected) if selected else np.array([], dtype=int)
+
+    def box_search(self, min_pt, max_pt):
+        '''
+        Search for the points within an axis-aligned box.
+
+        # Parameters
+        min_pt : array of 3 float
+            The lower corner of the box
+        max_pt : array of 3 float
+            The upper corner of the box
+
+        # Returns
+        k_indices : array of int
+            The resultant indices of the points inside the box
+        '''
+        min_pt = np.asarray(min_pt, dtype=float)
+        max_pt = np.asarray(max_pt, dtype=float)
+
+        def classify(lower, upper):
+            outside = ((upper < min_pt) | (lower > max_pt)).any(axis=1)
+            inside = ((lower >= min_pt) & (upper <= max_pt)).all(axis=1)
+            return np.where(outside, 0, np.where(inside, 2, 1))
+
+        def test_points(points):
+            return ((points >= min_pt) & (points <= max_pt)).all(axis=1)
+
+        return self._point_indices[self._traverse(classify, test_points)]
+
+    def frustum_search(self, planes):
+        '''
+        Search for the points within a frustum (or any convex region) bounded by planes.
+
+        # Parameters
+        planes : (N, 4) array of float
+            Coefficients [a, b, c, d] of the bounding planes, point p is inside the frustum when
+            a*p.x + b*p.y + c*p.z + d >= 0 holds for all planes
+
+        # Returns
+        k_indices : array of int
+            The resultant indices of the points inside the frustum
+        '''
+        planes = np.asarray(planes, dtype=float).reshape(-1, 4)
+        normals, offsets = planes[:, :3], planes[:, 3]
+
+        def classify(lower, upper):
+            # the nearest and farthest corners of the boxes along the plane normals
+            positive = normals >= 0
+            far = np.where(positive, upper[:, np.newaxis], lower[:, np.newaxis])
+            near = np.where(positive, lower[:, np.newaxis], upper[:, np.newaxis])
+            outside = (np.sum(far * normals, axis=2) + offsets < 0).any(axis=1)
+            inside = (np.sum(near * normals, axis=2) + offsets >= 0).all(axis=1)
+            return np.where(outside, 0, np.where(inside, 2, 1))
+
+        def test_points(points):
+            return (points.dot(normals.T) + offsets >= 0).all(axis=1)
+
+        return self._point_indices[self._traverse(classify, test_points)]
+
+    def _sphere_search(self, point, radius):
+        # return sorted positions and distances of the points in the sphere
+        sqr_radius = radius * radius
+
+        def classify(lower, upper):
+            nearest = np.clip(point, lower, upper) - point
+            farthest = np.maximum(np.abs(lower - point), np.abs(upper - point))
+            outside = np.sum(nearest * nearest, axis=1) >= sqr_radius
+            inside = np.sum(farthest * farthest, axis=1) < sqr_radius
+            return np.where(outside, 0, np.where(inside, 2, 1))
+
+        def test_points(points):
+            diff = points - point
+            return np.sum(diff * diff, axis=1) < sqr_radius
+
+        positions = self._traverse(classify, test_points)
+        diff = self._points[positions] - point
+        return positions, np.sqrt(np.sum(diff * diff, axis=1))
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the k-nearest neighbors for the given query point.
+
+        The radius that bounds the k nearest neighbors is obtained from the smallest node
+        containing the query with at least k points, and then a radius search is done.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        point = np.asarray(point, dtype=float).ravel()[:3]
+        self._check_tree()
+        k = min(k, len(self._points))
+        if k < 1 or not np.isfinite(point).all():
+            return np.array([], dtype=int), np.array([])
+
+        # the farthest corner of the root bounds all the points
+        radius = np.linalg.norm(np.maximum(np.abs(point - self._origin),
+                                           np.abs(point - self._origin - self._root_size)))
+        coords = np.floor((point - self._origin) / self._resolution).astype(np.int64)
+        if ((coords >= 0) & (coords < 2 ** self._depth)).all():
+            code = _morton_codes(coords[np.newaxis])[0]
+            for level in range(self._depth, -1, -1):
+                keys, _, _, counts, _ = self._levels[level]
+                key = code >> np.uint64(3 * (self._depth - level))
+                node = np.searchsorted(keys, key)
+                if node < len(keys) and keys[node] == key and counts[node] >= k:
+                    radius = math.sqrt(3) * self._root_size / 2 ** level
+                    break
+
+        positions, distances = self._sphere_search(point, radius * (1 + 1e-9) + 1e-12)
+        order = np.argsort(distances, kind='mergesort')[:k]
+        return self._point_indices[positions[order]], distances[order]
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if isinstance(point, numbers.Integral):
+            point = self._input.xyz[point]
+        point = np.asarray(point, dtype=float).ravel()[:3]
+        self._check_tree()
+        if not np.isfinite(point).all():
+            return np.array([], dtype=int), np.array([])
+
+        positions, distances = self._sphere_search(point, radius)
+        if self._sort_results or 0 < max_nn < len(positions):
+            order = np.argsort(distances, kind='mergesort')
+            if max_nn > 0:
+                order = order[:max_nn]
+            positions, distances = positions[order], distances[order]
+        return self._point_indices[positions], distances
+
+    def voxel_centroids(self, level):
+        '''
+        Downsample the cloud to the centroids of the nodes at the given level of detail.
+
+        # Returns
+        cloud : PointCloud
+            The point cloud with xyz fields of the centroids
+        '''
+        centroids = self.node_centroids(level).astype(self._input.xyz.dtype, copy=False)
+        return PointCloud(centroids, ['x', 'y', 'z'])
+
+class HNSWSearch(Search):
+    '''
+    Approximate nearest neighbor search using a Hierarchical Navigable Small World graph.
+
+    The search is sub-linear and trades recall for speed, which is useful for very large clouds
+    and for matching high-dimensional descriptors. The graph is built at the first query and
+    rebuilt after the input cloud or the indices are changed.
+
+    # Parameters
+    fields : list of str
+        Fields of the input cloud forming the vectors to be searched, xyz coordinates are used
+        by default. Query points should have the same dimension as the vectors.
+    m : int
+        Maximum number of links of each node in the graph. Larger values give higher recall on
+        high-dimensional data, with more memory consumption.
+    ef_construction : int
+        Size of the candidate list when building the graph. Larger values give a graph with
+        better quality but slower building.
+    ef_search : int
+        Size of the candidate list when searching, which is at least k. Larger values give higher
+        recall but slower queries.
+    num_threads : int
+        Number of threads used for building and batch queries, 0 means all the cores.
+
+    # Notes
+    The HNSW implementation is provided by nmslib. Distances returned are approximate neighbors'
+    exact Euclidean distances, but some of the true neighbors may be missing.
+    '''
+    def __init__(self, cloud=None, indices=None, sort_results=False, fields=None,
+                 m=16, ef_construction=200, ef_search=50, num_threads=0):
+        try:
+            import nmslib
+        except ImportError:
+            raise ImportError('nmslib is required for HNSW search, ' +
+                              'it can be installed by pip install nmslib')
+        self._nmslib = nmslib
+        super().__init__(cloud, indices, sort_results)
+        self.fields = fields
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.num_threads = num_threads
+        self._index = None
+        self._index_indices = None
+
+    def _reset_index(self):
+        self._index = None
+
+    def _vectors(self):
+        if self.fields is None:
+            return self._input.xyz
+        data = self._input.data
+        return np.hstack([data[name].reshape(len(data), -1) for name in self.fields])
+
+    def _build_index(self):
+        '''
+        Build the HNSW graph from the points selected by indices
+        '''
+        indices = np.asarray(self._indices, dtype=int)
+        vectors = np.asarray(self._vectors()[indices], dtype='f4')
+        valid = np.isfinite(vectors).all(axis=1)
+        if not valid.all():
+            indices = indices[valid]
+            vectors = vectors[valid]
+
+        self._index = self._nmslib.init(method='hnsw', space='l2')
+        if len(vectors) > 0:
+            self._index.addDataPointBatch(vectors)
+        self._index.createIndex({'M': self.m, 'efConstruction': self.ef_construction,
+                                 'indexThreadQty': self.num_threads, 'post': 0},
+                                print_progress=False)
+        self._index_indices = indices
+
+    def _get_query_points(self, points):
+        points = np.asarray(points)
+        if points.ndim == 1 and points.dtype.kind in 'iu':
+            return self._vectors()[points]
+        return points.reshape(len(points) if points.ndim > 1 else 1, -1)
+
+    def _query(self, points, k):
+        # query the graph and return padded (M, k) arrays of indices and distances
+        points = np.asarray(points, dtype='f4')
+        k_indices = np.full((len(points), k), -1, dtype=int)
+        k_distances = np.full((len(points), k), np.inf)
+        valid = np.flatnonzero(np.isfinite(points).all(axis=1))
+        if k == 0 or len(valid) == 0:
+            return k_indices, k_distances
+
+        self._index.setQueryTimeParams({'efSearch': max(self.ef_search, k)})
+        results = self._index.knnQueryBatch(points[valid], k=k, num_threads=self.num_threads)
+        for row, (parts, distances) in zip(valid, results):
+            # distances of nmslib l2 space are squared
+            k_indices[row, :len(parts)] = self._index_indices[parts]
+            k_distances[row, :len(parts)] = np.sqrt(distances)
+        return k_indices, k_distances
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the approximate k-nearest neighbors for the given query point.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if k < 1:
+            return [], []
+        if isinstance(point, numbers.Integral):
+            point = [point]
+        else:
+            # a coordinate list of integers shouldn't be taken as indices by the batch search
+            point = np.asarray(point, dtype=float).reshape(1, -1)
+        k_indices, k_distances = self.nearestk_search_batch(point, k)
+        valid = k_indices[0] >= 0
+        return k_indices[0][valid], k_distances[0][valid]
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for the approximate nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if isinstance(point, numbers.Integral):
+            point = [point]
+        else:
+            point = np.asarray(point, dtype=float).reshape(1, -1)
+        _, k_indices, k_distances = self.radius_search_batch(point, radius, max_nn)
+        return k_indices, k_distances
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the approximate k-nearest neighbors for a batch of query points.
+
+        # Parameters
+        points : (M, D) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, missing neighbors
+            are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points, missing ones are filled with inf
+        '''
+        points = self._get_query_points(points)
+        if self._index is None:
+            self._build_index()
+        return self._query(points, max(0, min(k, len(self._index_indices))))
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for the approximate nearest neighbors of a batch of query points in a given
+        radius. The neighbors are found by kNN queries with k doubled until the farthest
+        neighbor is out of the radius.
+
+        # Parameters
+        points : (M, D) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        points = self._get_query_points(points)
+        if self._index is None:
+            self._build_index()
+
+        num_points = len(self._index_indices)
+        results = [(np.array([], dtype=int), np.array([]))] * len(points)
+        pending = np.arange(len(points))
+        k = min(max_nn if max_nn > 0 else 16, num_points)
+        while len(pending) > 0 and k > 0:
+            k_indices, k_distances = self._query(points[pending], k)
+            for row, indices, distances in zip(pending, k_indices, k_distances):
+                predicate = distances < radius
+                results[row] = (indices[predicate], distances[predicate])
+            # the ones with all the neighbors in radius may have more
+            done = (k_distances[:, -1] >= radius) | (k == num_points) | (k == max_nn)
+            pending = pending[~done]
+            k = min(k * 2, num_points)
+
+        offsets, k_indices, k_distances = _concat_neighbours(results)
+        return _sort_neighbours(offsets, k_indices, k_distances, self._sort_results, max_nn)
+
+# KD-tree is preferred when scipy is available
+DefaultSearch = BruteForceSearch if cKDTree is None else KDTreeSearch
+DefaultOrganizedSearch = OrganizedNeighborSearch
+
+class NeighborGraph(Search):
+    '''
+    Precomputed neighborhood graph of the points in a cloud, stored as CSR arrays of neighbor
+    indices and distances, so that the neighborhoods can be computed once and shared by
+    several algorithms.
+
+    The graph is a search method itself: it answers queries given by point indices from the
+    stored neighborhoods when they cover the query (kNN with k no more than the graph's k,
+    radius search with radius no larger than the graph's radius, etc.), other queries are
+    passed to the underlying search method.
+
+    # Parameters
+    k : int
+        Number of nearest neighbors of each point, used when radius is 0
+    radius : float
+        Radius of the neighborhood of each point
+    search_method : Search
+        The search method used to compute the graph, DefaultSearch by default
+
+    # Notes
+    The graph is computed at the first query or by calling compute(). It's recomputed only when
+    a different cloud or different indices are given, modifications of the coordinates in place
+    are not tracked.
+    '''
+    def __init__(self, cloud=None, indices=None, k=0, radius=0, search_method=None):
+        self._offsets = None
+        self._graph_key = None
+        self._graph_indices = None
+        super().__init__(cloud, indices, sort_results=True)
+        if k < 0 or radius < 0:
+            raise ValueError('k and radius should be non-negative')
+        self._k = k
+        self._radius = radius
+        self.search_method = search_method
+        self._rows = None
+        self._neighbor_indices = None
+        self._neighbor_distances = None
+
+    @property
+    def k(self):
+        '''
+        Get the number of nearest neighbors of each point, 0 if it's a radius graph
+        '''
+        return self._k
+
+    @property
+    def radius(self):
+        '''
+        Get the radius of the neighborhoods, 0 if it's a kNN graph
+        '''
+        return self._radius
+
+    @property
+    def offsets(self):
+        '''
+        Get the offsets of the graph, neighbors of the point indices[i] are stored in
+        neighbor_indices[offsets[i]:offsets[i+1]]
+        '''
+        self._check_graph()
+        return self._offsets
+
+    @property
+    def neighbor_indices(self):
+        '''
+        Get the concatenated indices of neighbors, sorted ascending in the distance for each point
+        '''
+        self._check_graph()
+        return self._neighbor_indices
+
+    @property
+    def neighbor_distances(self):
+        '''
+        Get the concatenated distances to the neighbors
+        '''
+        self._check_graph()
+        return self._neighbor_distances
+
+    def neighbours(self, index):
+        '''
+        Get the neighbors of a point in the graph.
+
+        # Parameters
+        index : int
+            Index of the point in the input cloud
+
+        # Returns
+        k_indices : array of int
+            The indices of the neighboring points
+        k_distances : array of float
+            The distances to the neighboring points
+        '''
+        self._check_graph()
+        row = self._rows[index]
+        if row < 0:
+            raise ValueError('point %d is not in the graph' % index)
+        begin, end = self._offsets[row], self._offsets[row + 1]
+        return self._neighbor_indices[begin:end], self._neighbor_distances[begin:end]
+
+    def _reset_index(self):
+        if self._offsets is None:
+            return
+        # keep the graph when the same cloud is assigned again
+        if self._input is None or _storage_key(self._input) != self._graph_key or \
+           not np.array_equal(np.asarray(self._indices), self._graph_indices):
+            self._offsets = None
+
+    def _check_graph(self):
+        if self._offsets is None:
+            self.compute()
+
+    def _get_search(self):
+        if self.search_method is None:
+            self.search_method = DefaultSearch()
+        self.search_method.input_cloud = self._input
+        self.search_method.indices = self._indices
+        self.search_method.sort_results = self._sort_results
+        return self.search_method
+
+    def compute(self):
+        '''
+        Compute the neighborhoods of all the points selected by indices
+        '''
+        if self._input is None:
+            raise ValueError('null input point cloud')
+        indices = np.asarray(self._indices, dtype=int)
+        search = self._get_search()
+        sort_results = search.sort_results
+        search.sort_results = True
+        try:
+            if self._radius > 0:
+                offsets, k_indices, k_distances = search.radius_search_batch(indices,
+                                                                             self._radius)
+            elif self._k > 0:
+                k_indices, k_distances = search.nearestk_search_batch(indices, self._k)
+                valid = k_indices >= 0
+                offsets = np.zeros(len(indices) + 1, dtype=int)
+                np.cumsum(np.sum(valid, axis=1), out=offsets[1:])
+                k_indices, k_distances = k_indices[valid], k_distances[valid]
+            else:
+                raise ValueError('neither radius nor K defined!')
+        finally:
+            search.sort_results = sort_results
+
+        self._rows = np.full(len(self._input), -1, dtype=int)
+        self._rows[indices] = np.arange(len(indices))
+        self._offsets = offsets
+        self._neighbor_indices = k_indices
+        self._neighbor_distances = k_distances
+        self._graph_key = _storage_key(self._input)
+        self._graph_indices = indices
+        return self
+
+    def _covered_rows(self, queries, k=0, radius=0):
+        # return the graph rows of queries, -1 for the ones that cannot be answered by the graph
+        rows = self._rows[queries]
+        found = rows >= 0
+        counts = np.where(found, self._offsets[rows + 1] - self._offsets[rows], 0)
+        num_points = len(self._graph_indices)
+        if k > 0:
+            if self._radius > 0: # the k nearest ones are all in radius
+                covered = counts >= min(k, num_points)
+            else:
+                covered = np.full(len(rows), k <= self._k)
+        else:
+            if self._radius > 0:
+                covered = np.full(len(rows), radius <= self._radius)
+            else: # the farthest neighbor is out of radius, or all the points are neighbors
+                last = self._neighbor_distances[np.maximum(self._offsets[rows + 1] - 1, 0)]
+                covered = (counts > 0) & ((last >= radius) | (counts >= num_points))
+        return np.where(found & covered, rows, -1)
+
+    def nearestk_search(self, point, k):
+        '''
+        Search for the k-nearest neighbors for the given query point.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if not isinstance(point, numbers.Integral):
+            return self._get_search().nearestk_search(point, k)
+        if k < 1:
+            return [], []
+        k_indices, k_distances = self.nearestk_search_batch([point], k)
+        valid = k_indices[0] >= 0
+        return k_indices[0][valid], k_distances[0][valid]
+
+    def radius_search(self, point, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of the query point in a given radius.
+
+        # Parameters
+        point : point or int
+            The given query point. If it is a integer, then query point is the one in the input
+            cloud with the parameter as index
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors to this value. If max_nn is set to
+            0 or to a number higher than the number of points in the input cloud, all neighbors
+            in radius will be returned.
+
+        # Returns
+        k_indices : list of int
+            The resultant indices of the neighboring points
+        k_sqr_distances : list of float
+            The resultant squared distances to the neighboring points
+        '''
+        if not isinstance(point, numbers.Integral):
+            return self._get_search().radius_search(point, radius, max_nn)
+        _, k_indices, k_distances = self.radius_search_batch([point], radius, max_nn)
+        return k_indices, k_distances
+
+    def nearestk_search_batch(self, points, k):
+        '''
+        Search for the k-nearest neighbors for a batch of query points.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        k : int
+            The number of neighbors to search for
+
+        # Returns
+        k_indices : (M, k) array of int
+            The resultant indices of the neighboring points of each query, missing neighbors
+            are filled with -1
+        k_distances : (M, k) array of float
+            The resultant distances to the neighboring points, missing ones are filled with inf
+        '''
+        queries = np.asarray(points)
+        if not (queries.ndim == 1 and queries.dtype.kind in 'iu'):
+            return self._get_search().nearestk_search_batch(points, k)
+        self._check_graph()
+
+        k = max(0, min(k, len(self._graph_indices)))
+        k_indices = np.full((len(queries), k), -1, dtype=int)
+        k_distances = np.full((len(queries), k), np.inf)
+        rows = self._covered_rows(queries, k=k) if k > 0 else np.zeros(len(queries), dtype=int)
+        covered = np.flatnonzero(rows >= 0)
+        if k > 0 and len(covered) > 0:
+            starts = self._offsets[rows[covered]]
+            counts = np.minimum(self._offsets[rows[covered] + 1] - starts, k)
+            mask = np.arange(k) < counts[:, np.newaxis]
+            positions = (starts[:, np.newaxis] + np.arange(k))[mask]
+            sub_indices = np.full((len(covered), k), -1, dtype=int)
+            sub_distances = np.full((len(covered), k), np.inf)
+            sub_indices[mask] = self._neighbor_indices[positions]
+            sub_distances[mask] = self._neighbor_distances[positions]
+            k_indices[covered] = sub_indices
+            k_distances[covered] = sub_distances
+
+        pending = np.flatnonzero(rows < 0) if k > 0 else np.array([], dtype=int)
+        if len(pending) > 0:
+            search = self._get_search()
+            k_indices[pending], k_distances[pending] = \
+                search.nearestk_search_batch(queries[pending], k)
+        return k_indices, k_distances
+
+    def radius_search_batch(self, points, radius, max_nn=0):
+        '''
+        Search for all the nearest neighbors of a batch of query points in a given radius.
+
+        # Parameters
+        points : (M, 3) array or sequence of int
+            The given query points. If it is a one-dimensional sequence of integers, then query
+            points are the ones in the cloud with the parameter as indices
+        radius : float
+            The radius of the sphere bounding all of p_q's neighbors
+        max_nn : int
+            if given, bounds the maximum returned neighbors of each query to this value.
+
+        # Returns
+        offsets : (M+1,) array of int
+            Neighbors of the i-th query are stored in k_indices[offsets[i]:offsets[i+1]]
+        k_indices : array of int
+            The resultant indices of the neighboring points of all the queries
+        k_distances : array of float
+            The resultant distances to the neighboring points of all the queries
+        '''
+        queries = np.asarray(points)
+        if not (queries.ndim == 1 and queries.dtype.kind in 'iu'):
+            return self._get_search().radius_search_batch(points, radius, max_nn)
+        self._check_graph()
+
+        rows = self._covered_rows(queries, radius=radius)
+        covered = np.flatnonzero(rows >= 0)
+        starts = self._offsets[rows[covered]]
+        counts = self._offsets[rows[covered] + 1] - starts
+        qids = np.repeat(covered, counts)
+        positions = _expand_ranges(starts, counts)
+        predicate = self._neighbor_distances[positions] < radius
+        qids = [qids[predicate]]
+        k_indices = [self._neighbor_indices[positions[predicate]]]
+        k_distances = [self._neighbor_distances[positions[predicate]]]
+
+        pending = np.flatnonzero(rows < 0)
+        if len(pending) > 0:
+            offsets, indices, distances = self._get_search().radius_search_batch(
+                queries[pending], radius)
+            qids.append(np.repeat(pending, np.diff(offsets)))
+            k_indices.append(indices)
+            k_distances.append(distances)
+
+        # merge the results answered by the graph and the search method
+        qids = np.concatenate(qids)
+        order = np.argsort(qids, kind='mergesort')
+        offsets = np.zeros(len(queries) + 1, dtype=int)
+        np.cumsum(np.bincount(qids, minlength=len(queries)), out=offsets[1:])
+        k_indices = np.concatenate(k_indices)[order]
+        k_distances = np.concatenate(k_distances)[order]
+        return _sort_neighbours(offsets, k_indices, k_distances, self._sort_results, max_nn)
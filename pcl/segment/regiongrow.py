@@ -132,10 +132,12 @@ class RegionGrowing(_CloudBase):
         This method finds KNN for each point and saves them to the array
         because the algorithm needs to find KNN a few times.
         '''
-        self._point_neighours = dict()
-        for i_point, point_index in enumerate(self._indices):
-            neighbours, _ = self.search_method.nearestk_search(i_point, self.number_of_neighbours)
-            self._point_neighours[point_index] = neighbours
+        indices = np.asarray(self._indices, dtype=int)
+        neighbours, _ = self.search_method.nearestk_search_batch(indices,
+                                                                 self.number_of_neighbours)
+        if (neighbours < 0).any():
+            neighbours = [row[row >= 0] for row in neighbours]
+        self._point_neighours = dict(zip(indices.tolist(), neighbours))
 
     def _apply_smooth_region_growing_algorithm(self):
         '''
@@ -32,7 +32,7 @@ setup(name='PyPCL',
       install_requires=['numpy', 'numpy-quaternion'],
       extras_require={
           'compress': ['python-lzf'],
-          'search': ['nmslib'],
+          'search': ['nmslib', 'scipy'],
           'test': ['pytest'],
           'visualize': ['vtk>5.4']
       },
@@ -19,6 +19,51 @@ def test_normal():
     nestimate.search_k = 5
     normalcloud = nestimate.compute()
     assert len(normalcloud) == len(cloud)
+    normals = np.array(normalcloud.data[['normal_x', 'normal_y', 'normal_z']].tolist())
+    assert np.allclose(np.linalg.norm(normals, axis=1), 1)
+
+    # points on plane z = 0
+    points = np.random.rand(50, 3)
+    points[:, 2] = 0
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    nestimate = pf.NormalEstimation(cloud)
+    nestimate.view_point = [0, 0, 1]
+    nestimate.search_radius = 0.5
+    normalcloud = nestimate.compute()
+    normals = np.array(normalcloud.data[['normal_x', 'normal_y', 'normal_z']].tolist())
+    assert np.allclose(normals, [0, 0, 1])
+    assert np.allclose(normalcloud.data['curvature'], 0)
+
+def test_normal_view():
+    '''
+    Test NormalEstimation on a view of the cloud
+    '''
+    points = np.random.rand(100, 3)
+    points[:50, 2] = 0
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    view = cloud.view(slice(0, 50))
+    nestimate = pf.NormalEstimation(view)
+    nestimate.view_point = [0, 0, 1]
+    nestimate.search_radius = 0.5
+    normalcloud = nestimate.compute()
+    assert len(normalcloud) == 50 and view.base is cloud
+    normals = np.array(normalcloud.data[['normal_x', 'normal_y', 'normal_z']].tolist())
+    assert np.allclose(normals, [0, 0, 1])
+
+def test_normal_non_dense():
+    '''
+    Test NormalEstimation with the default search on a cloud containing NaN points
+    '''
+    points = np.random.rand(60, 3)
+    points[[7, 30]] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    for param in ('search_k', 'search_radius'):
+        nestimate = pf.NormalEstimation(cloud)
+        setattr(nestimate, param, 8 if param == 'search_k' else 0.5)
+        normalcloud = nestimate.compute()
+        normals = np.array(normalcloud.data[['normal_x', 'normal_y', 'normal_z']].tolist())
+        assert np.isnan(normals[[7, 30]]).all()
+        assert np.allclose(np.linalg.norm(np.delete(normals, [7, 30], axis=0), axis=1), 1)
 
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
@@ -4,7 +4,9 @@ Tests of pcl.io.file_io
 
 import os
 import sys
+import json
 from io import StringIO, BytesIO
+import numpy as np
 import pytest
 sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
 import pcl
@@ -74,6 +76,383 @@ def test_pcd_writer():
     buf.close()
     assert (compare.data == cloud.data).all()
 
+def test_pcd_ascii_writer():
+    '''
+    Test writing ASCII PCD files by blocks
+    '''
+    points = np.zeros(10, dtype=[('x', 'f4'), ('y', 'f8'), ('label', 'i4'), ('normal', '3f4')])
+    points['x'] = np.random.randn(10) * 1000
+    points['y'][0] = np.nan
+    points['label'] = np.arange(-5, 5)
+    points['normal'] = np.random.rand(10, 3)
+    cloud = pcl.PointCloud(points)
+
+    writer = pio.PCDWriter()
+    writer.ASCII_BLOCK_SIZE = 3
+    buf = StringIO()
+    writer.write_ascii(buf, cloud)
+    lines = buf.getvalue().splitlines()[-10:]
+    for line, point in zip(lines, points):
+        values = [point['x'], point['y'], point['label']] + point['normal'].tolist()
+        assert line == '%.10f %.10f %d %.10f %.10f %.10f' % tuple(values)
+    buf.seek(0)
+    compare, _ = pio.PCDReader().read(buf)
+    assert (compare.data['label'] == cloud.data['label']).all()
+
+def test_pcd_ascii_reader():
+    '''
+    Test parsing ASCII PCD files
+    '''
+    cloud = pcl.PointCloud(np.zeros(4, dtype=[('x', 'f4'), ('normal', '3f4'), ('label', 'u8')]),
+                           width=2, height=2)
+    cloud['x'] = [1, 2, np.nan, 4]
+    cloud['normal'] = [[1, 2, 3]] * 4
+    cloud['label'] = [0, 1, 2 ** 53 + 1, 2 ** 64 - 1]
+    buf = StringIO()
+    pio.savepcd(buf, cloud, binary=False)
+    text = buf.getvalue()
+    compare = pio.loadpcd(StringIO(text))
+    assert compare.height == 2 and compare.fields == cloud.fields
+    assert np.array_equal(compare.to_ndarray(['x', 'normal']), cloud.to_ndarray(['x', 'normal']),
+                          equal_nan=True)
+    assert (compare.data['label'] == cloud.data['label']).all()
+
+    # malformed rows are skipped
+    lines = text.splitlines()
+    lines[-3] = '1 2 3'
+    lines[-1] = '4 1 x 3 0'
+    compare = pio.loadpcd(StringIO('\n'.join(lines) + '\n\n'))
+    assert len(compare) == 2 and compare.height == 1
+    assert compare.data['label'].tolist() == [0, 2 ** 53 + 1]
+
+def test_pcd_mmap(tmpdir):
+    '''
+    Test memory mapping binary PCD files
+    '''
+    cloud = pcl.PointCloud(np.random.rand(100, 4).astype('f4'),
+                           [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('intensity', 'f4')],
+                           width=10, height=10)
+    filename = str(tmpdir.join('cloud.pcd'))
+    pio.savepcd(filename, cloud)
+
+    mapped = pio.loadpcd(filename, mmap=True)
+    assert isinstance(mapped.data.base, np.memmap)
+    assert (mapped.data == cloud.data).all() and mapped.width == 10 and mapped.height == 10
+    assert np.shares_memory(mapped.xyz, mapped.data)
+    with pytest.raises(ValueError):
+        mapped['x'] = 0
+
+    # copy on write doesn't touch the file
+    mapped = pio.loadpcd(filename, mmap='c')
+    mapped['x'] = 0
+    assert (mapped.xyz[:, 0] == 0).all()
+    assert (pio.loadpcd(filename).data == cloud.data).all()
+
+    with pytest.raises(ValueError):
+        pio.loadpcd(TEST_ROOT + 'data/curve2d.pcd', mmap=True)
+
+def test_pcd_selection(tmpdir):
+    '''
+    Test reading part of the fields and the points of PCD files
+    '''
+    cloud = pcl.PointCloud(np.random.rand(60, 5).astype('f4'),
+                           [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('intensity', 'f4'),
+                            ('curvature', 'f4')], width=6, height=10)
+    filename = str(tmpdir.join('cloud.pcd'))
+    expected = cloud.to_ndarray(['z', 'x']).reshape(10, 6, 2)
+    for binary, compress in ((True, False), (True, True), (False, False)):
+        pio.savepcd(filename, cloud, binary, compress)
+        with open(filename, 'rb') as fid:
+            stream = BytesIO(fid.read())
+        for source in (filename, stream):
+            selected = pio.loadpcd(source, fields=['z', 'x'], rows=slice(2, 5))
+            assert selected.names == ['z', 'x']
+            assert selected.width == 6 and selected.height == 3
+            assert np.allclose(selected.to_ndarray(), expected[2:5].reshape(-1, 2))
+
+            selected = pio.loadpcd(source, fields='z', rows=[7, 1])
+            assert selected.height == 2
+            assert np.allclose(selected.to_ndarray('z')[:, 0], expected[[7, 1], :, 0].reshape(-1))
+
+            selected = pio.loadpcd(source, points=slice(3, 50, 7))
+            assert selected.height == 1 and selected.fields == cloud.fields
+            assert (selected.data == cloud.data[3:50:7]).all()
+
+            selected = pio.loadpcd(source, fields=['intensity'], points=[5, 0, 5])
+            assert (selected.data == cloud.data[['intensity']][[5, 0, 5]]).all()
+
+    pio.savepcd(filename, cloud)
+    mapped = pio.loadpcd(filename, mmap=True, fields=['x', 'intensity'], rows=slice(4, None))
+    assert isinstance(mapped.data.base, np.memmap) and mapped.height == 6
+    assert (mapped.data == cloud.data[['x', 'intensity']][24:]).all()
+
+    with pytest.raises(ValueError):
+        pio.loadpcd(filename, fields=['normal_x'])
+    with pytest.raises(ValueError):
+        pio.loadpcd(filename, rows=0, points=0)
+
+def test_pcd_chunks():
+    '''
+    Test reading PCD files by chunks
+    '''
+    for filename in ('curve2d.pcd', 'curve2d_binary.pcd', 'cturtle.pcd'):
+        cloud = pio.loadpcd(TEST_ROOT + 'data/' + filename)
+        chunks = list(pio.iter_pcd(TEST_ROOT + 'data/' + filename, chunk_points=16))
+        assert all(len(chunk) == 16 for chunk in chunks[:-1]) and 0 < len(chunks[-1]) <= 16
+        assert all(chunk.fields == cloud.fields and chunk.height == 1 for chunk in chunks)
+        assert (np.concatenate([chunk.data for chunk in chunks]) == cloud.data).all()
+        assert (chunks[-1].sensor_origin == cloud.sensor_origin).all()
+
+    with pytest.raises(ValueError):
+        next(pio.iter_pcd(TEST_ROOT + 'data/curve2d.pcd', chunk_points=0))
+
+def test_pcd_compressed_chunks():
+    '''
+    Test compressing PCD files by chunks in parallel
+    '''
+    data = np.zeros(1000, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('label', 'u2', 2)])
+    for name in ('x', 'y', 'z'):
+        data[name] = np.random.rand(1000)
+    data['label'] = np.arange(2000).reshape(1000, 2)
+    cloud = pcl.PointCloud(data, width=100, height=10)
+    for num_threads in (1, 4):
+        buf = BytesIO()
+        pio.savepcd(buf, cloud, compress=True, chunk_points=64, num_threads=num_threads)
+        assert pio.PCDReader().read_header(buf)['data_type'] == 'binary_compressed_chunked'
+        compare = pio.loadpcd(buf, num_threads=num_threads)
+        assert (compare.data == cloud.data).all() and compare.fields == cloud.fields
+        assert compare.width == 100 and compare.height == 10
+        chunks = list(pio.iter_pcd(buf, chunk_points=100))
+        assert [len(chunk) for chunk in chunks] == [64] * 15 + [40]
+        assert (np.concatenate([chunk.data for chunk in chunks]) == cloud.data).all()
+
+    # the default layout is the single block readable by PCL
+    buf = BytesIO()
+    pio.savepcd(buf, cloud, compress=True)
+    assert pio.PCDReader().read_header(buf)['data_type'] == 'binary_compressed'
+    assert (pio.loadpcd(buf).data == cloud.data).all()
+
+    buf = BytesIO()
+    pio.savepcd(buf, cloud[:0], compress=True, chunk_points=64)
+    assert len(pio.loadpcd(buf)) == 0
+
+def test_pcd_scan(tmpdir):
+    '''
+    Test reading the headers of many PCD files
+    '''
+    directory = tmpdir.mkdir('clouds')
+    for index in range(5):
+        cloud = pcl.PointCloud(np.random.rand(index + 1, 3), ['x', 'y', 'z'])
+        pio.savepcd(str(directory.mkdir('sub%d' % index).join('cloud.pcd')), cloud)
+    with open(TEST_ROOT + 'data/cturtle.pcd', 'rb') as fid:
+        # a header longer than the prefix
+        directory.join('long.pcd').write_binary(b'# ' + b'a' * 10000 + b'\n' + fid.read())
+    directory.join('broken.pcd').write_binary(b'VERSION .7\nFIELDS x y z\n')
+
+    table = pio.scanpcd(str(directory), num_threads=2)
+    assert [os.path.basename(name) for name in table['file'][:2]] == ['broken.pcd', 'long.pcd']
+    assert [os.path.basename(os.path.dirname(name)) for name in table['file'][2:]] == \
+           ['sub%d' % index for index in range(5)]
+    assert table['points'][2:].tolist() == [1, 2, 3, 4, 5]
+    assert table['fields'][2] == ('x', 'y', 'z') and table['data_type'][2] == 'binary'
+    assert table['viewpoint'].shape == (7, 7) and (table['viewpoint'][2:, 3] == 1).all()
+    header = pio.PCDReader().read_header(TEST_ROOT + 'data/cturtle.pcd')
+    assert table['points'][1] == header['points']
+    assert table['data_offset'][1] == header['data_offset'] + 10003
+    assert table['error'][0] != '' and table['points'][0] == -1
+    assert (table['error'][1:] == '').all()
+
+    # the cached headers are used if the files are not modified
+    cache = str(tmpdir.join('index.json'))
+    assert (pio.scanpcd(str(directory), cache=cache)['points'] == table['points']).all()
+    with open(cache) as fid:
+        index = json.load(fid)
+    index['entries'][table['file'][2]]['header']['points'] = 100
+    with open(cache, 'w') as fid:
+        json.dump(index, fid)
+    assert pio.scanpcd(str(directory), cache=cache)['points'][2] == 100
+    pio.savepcd(table['file'][2], pcl.PointCloud(np.random.rand(9, 3), ['x', 'y', 'z']))
+    assert pio.scanpcd(str(directory), cache=cache)['points'][2] == 9
+
+def test_cloud_loader(tmpdir):
+    '''
+    Test loading PCD files in background
+    '''
+    clouds = [pcl.PointCloud(np.random.rand(index + 1, 4).astype('f4'),
+                             [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('intensity', 'f4')])
+              for index in range(6)]
+    files = [str(tmpdir.join('%d.pcd' % index)) for index in range(6)]
+    for index, (cloud, filename) in enumerate(zip(clouds, files)):
+        pio.savepcd(filename, cloud, compress=index % 2 == 1)
+
+    for opts in ({'num_workers': 1}, {'num_workers': 3, 'prefetch': 2},
+                 {'num_workers': 2, 'processes': True}):
+        loader = pio.CloudLoader(files, **opts)
+        assert len(loader) == 6
+        loaded = list(loader)
+        assert all((compare.data == cloud.data).all() for compare, cloud in zip(loaded, clouds))
+
+    loaded = list(pio.CloudLoader(files, fields=['x', 'y', 'z']))
+    assert all(compare.names == ['x', 'y', 'z'] for compare in loaded)
+
+    for cloud in pio.CloudLoader(files + [str(tmpdir.join('missing.pcd'))]):
+        break
+    with pytest.raises(IOError):
+        list(pio.CloudLoader(files + [str(tmpdir.join('missing.pcd'))]))
+    with pytest.raises(ValueError):
+        pio.CloudLoader(files, prefetch=0)
+    with pytest.raises(ValueError):
+        pio.CloudLoader(files, processes=True, mmap=True)
+    loader = pio.CloudLoader(files, num_workers=0)
+    assert loader.num_workers >= 1 and loader.prefetch == 2 * loader.num_workers
+
+def test_chunked_cloud(tmpdir):
+    '''
+    Test the columnar chunked cloud file
+    '''
+    data = np.zeros(1000, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'),
+                                 ('normal', 'f4', 3), ('label', 'u2')])
+    for name in ('x', 'y', 'z'):
+        data[name] = np.random.rand(1000) * 10
+    data['x'][10] = np.nan
+    data['normal'] = np.random.rand(1000, 3)
+    data['label'] = np.arange(1000)
+    cloud = pcl.PointCloud(data)
+    cloud.sensor_origin = np.array([1., 2., 3.])
+
+    for compress in (True, False):
+        buf = BytesIO()
+        with pio.ChunkedCloudWriter(buf, chunk_points=128, compress=compress) as writer:
+            for start in range(0, 1000, 77): # batches smaller than the chunks
+                writer.write(cloud[start:start + 77])
+        reader = pio.ChunkedCloudReader(buf)
+        assert len(reader) == 1000 and reader.num_chunks == 8
+        assert reader.chunk_sizes.tolist() == [128] * 7 + [104]
+        assert reader.fields == [('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('normal', '3f4'),
+                                 ('label', 'u2')]
+        compare = reader.read()
+        assert compare.data.tobytes() == cloud.data.tobytes() # nan in x
+        assert (compare.sensor_origin[:3] == [1, 2, 3]).all()
+
+        chunk = reader.read_chunk(3, 'label')
+        assert chunk.names == ['label']
+        assert (chunk.to_ndarray()[:, 0] == data['label'][384:512]).all()
+        min_pt, max_pt = reader.chunk_bounds()
+        assert min_pt.shape == (8, 3)
+        assert np.allclose(min_pt[0], np.nanmin(cloud.xyz[:128], axis=0))
+
+        inside = (cloud.xyz <= 5).all(axis=1) & (cloud.xyz >= 1).all(axis=1)
+        compare = reader.read(['normal', 'label'], [1, 1, 1], [5, 5, 5])
+        assert compare.names == ['normal', 'label']
+        assert (compare.data == data[['normal', 'label']][inside]).all()
+        assert len(list(reader.iter_chunks(min_pt=[20, 20, 20]))) == 0
+
+    # append to an existing file
+    filename = str(tmpdir.join('cloud.pcc'))
+    pio.savepcc(filename, cloud[:500], chunk_points=128)
+    with pio.ChunkedCloudWriter(filename, chunk_points=128, append=True) as writer:
+        writer.write(cloud[500:])
+    assert pio.loadpcc(filename).data.tobytes() == cloud.data.tobytes()
+    with pytest.raises(ValueError):
+        with pio.ChunkedCloudWriter(filename, append=True) as writer:
+            writer.write(pcl.PointCloud([(1, 2, 3)], ['x', 'y', 'z']))
+    with pytest.raises(ValueError):
+        pio.loadpcc(filename, fields=['intensity'])
+
+def test_tiled_store(tmpdir):
+    '''
+    Test the spatially tiled cloud store
+    '''
+    points = np.random.rand(3000, 4) * [100, 100, 10, 1]
+    points[7, 0] = np.nan
+    cloud = pcl.PointCloud(points, [('x', 'f8'), ('y', 'f8'), ('z', 'f8'), ('intensity', 'f8')])
+    directory = str(tmpdir.join('map'))
+    with pio.TiledCloudWriter(directory, tile_size=(25, 25), memory_budget=20000,
+                              chunk_points=100) as writer:
+        for start in range(0, 2000, 300):
+            writer.write(cloud[start:min(start + 300, 2000)])
+    # add points to the existing store
+    with pio.TiledCloudWriter(directory) as writer:
+        writer.write(cloud[2000:])
+    with pytest.raises(ValueError):
+        pio.TiledCloudWriter(directory, tile_size=10)
+
+    valid = np.isfinite(points).all(axis=1)
+    store = pio.TiledCloudStore(directory, cache_size=40000)
+    assert len(store) == valid.sum() and len(store.tiles) == 16
+    min_pt, max_pt = store.tile_bounds()
+    assert (np.floor(min_pt[:, :2] / 25) == np.array(store.tiles)).all()
+    tiles = dict(store.iter_tiles())
+    assert sum(len(tile) for tile in tiles.values()) == valid.sum()
+    assert store.cached_bytes <= 40000
+
+    def rows(data):
+        return sorted(map(tuple, data.tolist()))
+
+    inside = valid & (points[:, :3] >= [10, 20, 0]).all(axis=1) & \
+             (points[:, :3] <= [40, 30, 5]).all(axis=1)
+    result = store.query_box([10, 20, 0], [40, 30, 5])
+    assert rows(result.data) == rows(cloud.data[inside])
+
+    inside = valid & (((points[:, :3] - [50, 50, 5]) ** 2).sum(axis=1) <= 15 ** 2)
+    result = store.query_radius([50, 50, 5], 15, fields=['intensity'])
+    assert result.names == ['intensity']
+    assert sorted(result.to_ndarray()[:, 0]) == sorted(points[inside, 3])
+    assert len(store.query_box([200, 200, 0], [300, 300, 1])) == 0
+
+    store.clear_cache()
+    assert store.cached_bytes == 0
+
+def test_ply_reader():
+    '''
+    Test PLYReader
+    '''
+    reader = pio.PLYReader()
+    header = reader.read_header(TEST_ROOT + 'data/cube.ply')
+    assert header['format'] == 'binary_little_endian'
+    assert [(element['name'], element['count']) for element in header['elements']] == \
+           [('vertex', 24), ('face', 12)]
+    assert header['elements'][1]['properties'] == [('vertex_indices', ('u1', 'i4'))]
+
+    cloud, mesh = reader.read(TEST_ROOT + 'data/cube.ply')
+    assert cloud.names == ['x', 'y', 'z'] and len(cloud) == 24
+    assert mesh.cloud is cloud and len(mesh.polygon) == 12
+    assert all(len(face.vertices) == 3 and (face.vertices < 24).all() for face in mesh.polygon)
+
+    cloud, mesh = reader.read(TEST_ROOT + 'data/teapot.ply')
+    assert len(cloud) == 41472 and mesh is None
+    assert np.allclose(cloud.xyz[0], [0, -1.5, 2.4])
+
+def test_ply_writer():
+    '''
+    Test PLYWriter
+    '''
+    from pcl.polygonmesh import PolygonMesh, Vertices
+    cloud = pcl.PointCloud(np.random.rand(10, 4), [('x', 'f4'), ('y', 'f4'), ('z', 'f4'),
+                                                   ('intensity', 'f8')])
+    faces = [[0, 1, 2], [2, 3, 4], [4, 5, 6, 7], [7, 8, 9]]
+    mesh = PolygonMesh(cloud, [Vertices(face) for face in faces])
+
+    for binary, byte_order in ((True, '<'), (True, '>'), (False, '<')):
+        buf = BytesIO() if binary else StringIO()
+        pio.saveply(buf, mesh, binary, byte_order)
+        buf = BytesIO(buf.getvalue() if binary else buf.getvalue().encode('ascii'))
+        compare, compare_mesh = pio.PLYReader().read(buf)
+        assert compare.fields == cloud.fields and compare.data.dtype.isnative
+        if binary:
+            assert (compare.data == cloud.data).all()
+        else:
+            assert np.allclose(compare.to_ndarray(), cloud.to_ndarray())
+        assert [face.vertices.tolist() for face in compare_mesh.polygon] == faces
+
+        buf = BytesIO() if binary else StringIO()
+        pio.saveply(buf, cloud, binary, byte_order)
+        assert pio.loadply(buf).names == cloud.names
+        assert pio.loadply(buf, mesh=True).polygon == []
+
+    with pytest.raises(ValueError):
+        pio.saveply(BytesIO(), pcl.PointCloud([(1,)], [('index', 'i8')]))
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
 # test_pcd_writer()
@@ -7,6 +7,7 @@ import sys
 import pickle
 import pytest
 import numpy as np
+from numpy.lib import recfunctions as rfn
 from io import BytesIO
 sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
 import pcl
@@ -85,8 +86,7 @@ def test_cloud_operations():
     assert cloud[2].data.tolist() == (7, 8., 9.)
     assert cloud[:2].data.tolist() == [(1, 2., 3.), (4, 5., 6.)]
     assert cloud[1, 0] == cloud[2] and cloud[0, 1] == cloud[1]
-    assert cloud[:2, :2].data.tolist() == [[(1, 2., 3.), (4, 5., 6.)],
-                                           [(7, 8., 9.), (10, 11., 12.)]]
+    assert cloud[:2, :2].data.tolist() == [(1, 2., 3.), (4, 5., 6.), (7, 8., 9.), (10, 11., 12.)]
     cloud[1, 0] = (5, 6., 7.)
     assert cloud.data.tolist() == [(1, 2., 3.), (4, 5., 6.), (5, 6., 7.), (10, 11., 12.)]
     cloud[:2, :2] = [(7, 8., 9.), (10, 11., 12.), (1, 2., 3.), (4, 5., 6.)]
@@ -176,6 +176,215 @@ def test_cloud_field_operations():
     cloud += cloud
     assert cloud['x'].data.tolist() == [10, 10]
 
+def test_cloud_coordinates():
+    '''
+    Test accessing coordinates of the point cloud
+    '''
+    data = np.array([(1, 2, 3, 0.5, 0, 0, 1, 7), (4, 5, 6, 0.2, 1, 0, 0, 8)],
+                    dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('curvature', 'f4'),
+                           ('normal_x', 'f4'), ('normal_y', 'f4'), ('normal_z', 'f4'),
+                           ('label', 'u4')])
+    cloud = pcl.PointCloud(data)
+    xyz = cloud.xyz
+    assert xyz.shape == (2, 3) and xyz.tolist() == [[1, 2, 3], [4, 5, 6]]
+    assert np.shares_memory(xyz, cloud.data) and not xyz.flags.writeable
+    assert cloud.xyz is xyz
+    assert cloud.normal.tolist() == [[0, 0, 1], [1, 0, 0]]
+    cloud['x'] = [7, 8]
+    assert cloud.xyz.tolist() == [[7, 2, 3], [8, 5, 6]]
+
+    # coordinates are copied and cached when they are not packed
+    cloud = pcl.PointCloud(data[['x', 'curvature', 'y', 'z']])
+    assert cloud.xyz.tolist() == [[1, 2, 3], [4, 5, 6]]
+    assert cloud.xyz is cloud.xyz
+    cloud.append([(1, 1, 1, 1)])
+    assert cloud.xyz.tolist() == [[1, 2, 3], [4, 5, 6], [1, 1, 1]]
+    del cloud[0]
+    assert cloud.xyz.tolist() == [[4, 5, 6], [1, 1, 1]]
+    cloud.rename_fields(['x', 'curvature', 'z', 'y'])
+    assert cloud.xyz.tolist() == [[4, 6, 5], [1, 1, 1]]
+
+def test_field_views():
+    '''
+    Test selecting and deleting fields without copying the records
+    '''
+    cloud = pcl.PointCloud(np.random.rand(10, 5), ['x', 'y', 'z', 'a', 'b'])
+    data = cloud.data
+    assert np.shares_memory(cloud['x', 'z'].data, data)
+    del cloud['y']
+    values = cloud.pop_fields(['a'])
+    assert np.shares_memory(cloud.data, data) and cloud.names == ['x', 'z', 'b']
+    assert values.dtype.itemsize == 8 and (values['a'] == data['a']).all()
+    assert (cloud.to_ndarray() == rfn.structured_to_unstructured(data[['x', 'z', 'b']])).all()
+    assert pickle.loads(pickle.dumps(cloud)) == cloud
+
+    stream = BytesIO()
+    pcl.io.PCDWriter().write(stream, cloud)
+    stream.seek(0)
+    assert pcl.io.PCDReader().read(stream)[0].data.tolist() == cloud.data.tolist()
+
+def test_columnar_cloud():
+    '''
+    Test point cloud with columnar storage
+    '''
+    records = test_build_cloud()
+    cloud = pcl.PointCloud(records, columnar=True)
+    assert cloud.columnar and cloud.is_organized
+    assert cloud == records and cloud.fields == records.fields
+    assert cloud[2].data.tolist() == (7, 8., 9.)
+    assert cloud[1, 0] == cloud[2] and cloud[:2].data.tolist() == [(1, 2., 3.), (4, 5., 6.)]
+    assert cloud[:2, :2].data.tolist() == records[:2, :2].data.tolist()
+    assert cloud['y', 'z'].columnar
+    assert cloud.to_ndarray(['y', 'z']).tolist() == [[2, 3], [5, 6], [8, 9], [11, 12]]
+
+    # field operations keep the other columns
+    column = cloud.to_ndarray('y')
+    cloud.append_fields([('w', 'i2')], 4)
+    cloud.insert_fields([('t', 'i1')], [1], [[1, 2, 3, 4]])
+    assert cloud.names == ['x', 't', 'y', 'z', 'w']
+    assert np.shares_memory(cloud.to_ndarray('y'), column)
+    assert cloud['t'].to_ndarray().ravel().tolist() == [1, 2, 3, 4]
+    del cloud['w', 't']
+    assert np.shares_memory(cloud.to_ndarray('y'), column)
+    assert cloud.data.tolist() == records.data.tolist()
+    with pytest.raises(ValueError):
+        cloud.data['x'] = 0
+
+    cloud[1, 0] = (5, 6., 7.)
+    cloud['x'] = [0, 0, 0, 0]
+    assert cloud.xyz.tolist() == [[0, 2, 3], [0, 5, 6], [0, 6, 7], [0, 11, 12]]
+    cloud.append([(1, 2, 3)])
+    cloud.insert([0], [(4, 5, 6)])
+    assert len(cloud) == 6 and not cloud.is_organized
+    del cloud[[0, 5]]
+    assert cloud.pop().tolist() == (0, 11., 12.)
+    assert pickle.loads(pickle.dumps(cloud)).columnar
+
+    cloud.columnar = False
+    assert not cloud.columnar and cloud.data.tolist() == [(0, 2., 3.), (0, 5., 6.), (0, 6., 7.)]
+    cloud = pcl.PointCloud(np.zeros(3, dtype=[('x', 'f4'), ('normal', '3f4')]), columnar=True)
+    assert cloud.to_ndarray().shape == (3, 4)
+
+def test_cloud_accumulation():
+    '''
+    Test accumulating points by appending and extending
+    '''
+    for columnar in (False, True):
+        cloud = pcl.PointCloud(fields=[('x', 'f4'), ('y', 'f4'), ('z', 'f4')], columnar=columnar)
+        packets = [np.rec.fromarrays(np.random.rand(3, 5).astype('f4'), names='x,y,z')
+                   for _ in range(20)]
+        for packet in packets:
+            cloud.append(packet)
+        expected = np.concatenate(packets)
+        assert len(cloud) == 100 and cloud.width == 100 and cloud.height == 1
+        assert cloud.data.tolist() == expected.tolist()
+
+        # the points appended later don't overwrite the data got before
+        data = cloud.data
+        cloud.insert(len(cloud), packets[0])
+        cloud.extend([packets[1], pcl.PointCloud(packets[2])])
+        assert len(cloud) == 115 and data.tolist() == expected.tolist()
+        assert cloud[100:].data.tolist() == np.concatenate(packets[:3]).tolist()
+
+        cloud.insert(0, packets[3])
+        del cloud[:5]
+        cloud.extend([])
+        assert cloud.data.tolist() == np.concatenate([expected] + packets[:3]).tolist()
+
+def test_cloud_density():
+    '''
+    Test checking whether the cloud contains invalid values
+    '''
+    for columnar in (False, True):
+        cloud = pcl.PointCloud(np.zeros(3, dtype=[('x', 'f4'), ('normal', '3f4'), ('label', 'u1')]),
+                               columnar=columnar)
+        assert cloud.is_dense
+        cloud['normal'] = [[1, np.nan, 2]] * 3
+        assert not cloud.is_dense
+        del cloud['normal']
+        assert cloud.is_dense
+        cloud.append([(np.inf, 1)])
+        assert not cloud.is_dense
+        cloud.pop()
+        assert cloud.is_dense
+
+def test_organized_access():
+    '''
+    Test accessing organized clouds by rows and columns
+    '''
+    points = np.zeros(6, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('normal', '3f4')])
+    points['x'] = np.arange(6)
+    for columnar in (False, True):
+        cloud = pcl.PointCloud(points, width=3, height=2, columnar=columnar)
+        assert cloud[1, 0].data['x'] == 3 and cloud[0, 2].data['x'] == 2
+        assert cloud[1, :].to_ndarray('x').ravel().tolist() == [3, 4, 5]
+        assert cloud[:, 1].to_ndarray('x').ravel().tolist() == [1, 4]
+        assert cloud[:, 1:].to_ndarray('x').ravel().tolist() == [1, 2, 4, 5]
+
+        # windows are organized clouds
+        window = cloud[:, 1:]
+        assert len(window) == 4 and window.width == 2 and window.height == 2
+        assert window.is_organized and window.xyz.shape == (4, 3)
+        assert window[1, 0].to_ndarray('x').ravel().tolist() == [4]
+
+        # rows are views of the cloud
+        assert np.shares_memory(cloud[1, :].to_ndarray('x'), cloud.to_ndarray('x')) or \
+               not columnar
+        assert np.shares_memory(cloud[1, :].data, cloud.data) or columnar
+
+        cloud[0, :] = [(7, 0, 0, (1, 1, 1))] * 3
+        cloud[:, 0] = [(9, 0, 0, (0, 0, 0)), (8, 0, 0, (0, 0, 0))]
+        assert cloud.to_ndarray('x').ravel().tolist() == [9, 7, 7, 8, 4, 5]
+        assert cloud[0, 1].data['normal'].tolist() == [1, 1, 1]
+        del cloud[1, 2]
+        assert cloud.to_ndarray('x').ravel().tolist() == [9, 7, 7, 8, 4]
+        assert not cloud.is_organized
+
+        cloud = pcl.PointCloud(points, width=3, height=2, columnar=columnar)
+        del cloud[:, 1:]
+        assert cloud.to_ndarray('x').ravel().tolist() == [0, 3]
+
+def test_cloud_view():
+    '''
+    Test selecting points with views
+    '''
+    points = np.zeros(10, dtype=[('x', 'f4'), ('y', 'f4'), ('z', 'f4'), ('normal', '3f4')])
+    points['x'] = np.arange(10)
+    for columnar in (False, True):
+        cloud = pcl.PointCloud(points, columnar=columnar)
+        view = cloud.view(slice(2, 9))
+        assert isinstance(view, pcl.PointCloud) and len(view) == 7
+        assert view.xyz[:, 0].tolist() == [2, 3, 4, 5, 6, 7, 8]
+        assert view.width == 7 and view.height == 1 and view.fields == cloud.fields
+        assert view.is_dense and not view.is_organized
+        assert np.shares_memory(view.xyz, cloud.xyz) or columnar
+
+        # selections on views are composed
+        assert view[::-2].indices == slice(8, 1, -2)
+        assert view[::-2].to_ndarray('x').ravel().tolist() == [8, 6, 4, 2]
+        assert view[[0, 3, -1]].data['x'].tolist() == [2, 5, 8]
+        assert view[1].data['x'] == 3 and view['x', 'y'].names == ['x', 'y']
+        masked = cloud.view(cloud.to_ndarray('x').ravel() > 5)
+        assert masked.indices.tolist() == [6, 7, 8, 9]
+        assert pcl.PointCloud(masked) == cloud[6:]
+        with pytest.raises(ValueError):
+            masked.data['x'] = 0
+
+        # copy on write
+        sliced = view[::2]
+        sliced['x'] = 100
+        assert sliced.base is None and sliced.to_ndarray('x').ravel().tolist() == [100] * 4
+        assert cloud.to_ndarray('x').ravel().tolist() == list(range(10))
+        masked.append(masked.data[:1])
+        assert len(masked) == 5 and len(cloud) == 10
+        assert pickle.loads(pickle.dumps(view)) == cloud[2:9]
+
+        # the coordinates follow the modifications of the base
+        masked = cloud.view([1, 3, 5])
+        assert masked.xyz[:, 0].tolist() == [1, 3, 5]
+        cloud['x'] = np.arange(10) * 2
+        assert masked.xyz[:, 0].tolist() == [2, 6, 10]
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
 # test_cloud_operations()
@@ -9,6 +9,7 @@ import pytest
 sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
 import pcl
 import pcl.sac as ps
+import pcl.search
 
 def test_model_plane():
     '''
@@ -41,6 +42,11 @@ def test_model_plane():
     project = plane.project_points(inliers, optcoeff)
     assert (np.dot(project.xyz, optcoeff[:3]) + optcoeff[3] < 1e-7).all()
 
+    # the colinearity check doesn't depend on the scale of the cloud
+    small = ps.SampleConsensusModelPlane(pcl.PointCloud(points * 1e-3, fields=['x', 'y', 'z']))
+    assert small.compute_model_coefficients([0, 2, 4])[0]
+    assert not small.compute_model_coefficients([0, 0, 2])[0]
+
 def test_ransac():
     '''
     Test RandomSampleConsensus
@@ -70,5 +76,28 @@ def test_ransac():
     assert len(ransac.inliers) > 0
     assert len(ransac.model) == 3
 
+def test_samples_radius_search():
+    '''
+    Test drawing samples within samples_max_dist using a NeighborGraph
+    '''
+    cloud = pcl.PointCloud(np.random.rand(300, 3), ['x', 'y', 'z'])
+    model = ps.SampleConsensusModelPlane(cloud)
+    model.samples_max_dist = 0.2
+    model.samples_radius_search = pcl.search.NeighborGraph(radius=0.2)
+    for _ in range(10):
+        samples = model.get_samples()
+        assert len(samples) == 3 and len(set(samples)) == 3
+        distances = cloud.xyz[samples[1:]] - cloud.xyz[samples[0]]
+        assert (np.linalg.norm(distances, axis=1) < 0.2).all()
+
+    # the search follows the input cloud and the indices of the model
+    model.samples_radius_search = None
+    model.samples_max_dist = 0.5
+    model.get_samples()
+    model.input_cloud = pcl.PointCloud(np.random.rand(20, 3), ['x', 'y', 'z'])
+    model.indices = range(6)
+    for _ in range(10):
+        assert set(model.get_samples()) <= set(range(6))
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
@@ -43,5 +43,301 @@ def test_brute_force():
     del cloud[indices]
     assert (norm(cloud.xyz - query, axis=1) > radius).all()
 
+def test_kdtree():
+    '''
+    Test KDTreeSearch
+    '''
+    seq = np.arange(120).reshape(-1, 3)
+    cloud = pcl.PointCloud(seq, ['x', 'y', 'z'])
+    search = ps.KDTreeSearch(cloud, sort_results=True)
+
+    # kNN
+    query = [20, 20, 20]
+    num = 5
+    indices, distance = search.nearestk_search(query, num)
+    assert np.allclose(norm(cloud.xyz[indices] - query, axis=1), distance)
+    assert (indices == [6, 7, 5, 8, 4]).all()
+    indices, distance = search.nearestk_search(16, num)
+    assert indices[0] == 16 and set(indices) == {14, 15, 16, 17, 18}
+    indices, distance = search.nearestk_search(query, 100)
+    assert len(indices) == len(cloud)
+
+    #radius Search
+    indices, distance = search.radius_search(query, 5)
+    assert (indices == [6, 7]).all()
+    indices, distance = search.radius_search(query, 15, max_nn=3)
+    assert (indices == [6, 7, 5]).all()
+
+    # points at exactly the radius are excluded as by the other methods
+    assert search.radius_search(cloud.xyz[1], 3 ** 1.5)[0].tolist() == [1]
+    offsets, indices, _ = search.radius_search_batch([1, 2], 3 ** 1.5)
+    assert offsets.tolist() == [0, 1, 2] and indices.tolist() == [1, 2]
+
+    # compare with brute force search on subset
+    cloud = pcl.PointCloud(np.random.rand(200, 3), ['x', 'y', 'z'])
+    cloud.data['x'][0] = np.nan
+    subset = list(range(0, 200, 2))
+    search = ps.KDTreeSearch(cloud, subset, sort_results=True)
+    for query in (0, [np.nan, 0, 0]):
+        assert len(search.nearestk_search(query, 3)[0]) == 0
+        assert len(search.radius_search(query, 0.5)[0]) == 0
+    brute = ps.BruteForceSearch(cloud, subset[1:], sort_results=True)
+    for query in np.random.rand(10, 3):
+        indices, distance = search.nearestk_search(query, 8)
+        indices2, distance2 = brute.nearestk_search(query, 8)
+        assert (indices == indices2).all() and np.allclose(distance, distance2)
+        indices, distance = search.radius_search(query, 0.2)
+        indices2, distance2 = brute.radius_search(query, 0.2)
+        assert (indices == indices2).all() and np.allclose(distance, distance2)
+
+def test_batch_search():
+    '''
+    Test batched kNN and radius search of all the search methods
+    '''
+    cloud = pcl.PointCloud(np.random.rand(300, 3), ['x', 'y', 'z'])
+    queries = np.random.rand(20, 3)
+    for search in (ps.BruteForceSearch(cloud, sort_results=True),
+                   ps.KDTreeSearch(cloud, sort_results=True)):
+        k_indices, k_distances = search.nearestk_search_batch(queries, 6)
+        assert k_indices.shape == k_distances.shape == (20, 6)
+        for row, query in enumerate(queries):
+            indices, distance = search.nearestk_search(query, 6)
+            assert (k_indices[row] == indices).all()
+            assert np.allclose(k_distances[row], distance)
+
+        k_indices, _ = search.nearestk_search_batch([0, 5, 7], 3)
+        assert (k_indices[:, 0] == [0, 5, 7]).all()
+
+        offsets, k_indices, k_distances = search.radius_search_batch(queries, 0.2)
+        assert len(offsets) == len(queries) + 1
+        for row, query in enumerate(queries):
+            indices, distance = search.radius_search(query, 0.2)
+            assert (k_indices[offsets[row]:offsets[row+1]] == indices).all()
+            assert np.allclose(k_distances[offsets[row]:offsets[row+1]], distance)
+
+        offsets, k_indices, k_distances = search.radius_search_batch(queries, 0.3, max_nn=4)
+        assert (np.diff(offsets) <= 4).all()
+
+        for row, query in enumerate(queries):
+            indices, _ = search.radius_search(query, 0.3, max_nn=4)
+            assert (k_indices[offsets[row]:offsets[row+1]] == indices).all()
+
+    # queries with non-finite coordinates have no neighbors
+    points = np.random.rand(10, 3)
+    points[3] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    for search in (ps.BruteForceSearch(cloud, sort_results=True),
+                   ps.KDTreeSearch(cloud, sort_results=True)):
+        k_indices, _ = search.nearestk_search_batch(np.arange(6), 3)
+        assert (k_indices[[0, 1, 2, 4, 5], 0] == [0, 1, 2, 4, 5]).all()
+        assert 3 not in k_indices
+        offsets, k_indices, _ = search.radius_search_batch(np.arange(6), 0.5)
+        assert offsets[4] == offsets[3] and 3 not in k_indices
+    k_indices, k_distances = ps.KDTreeSearch(cloud).nearestk_search_batch([3], 3)
+    assert (k_indices == -1).all() and np.isinf(k_distances).all()
+    offsets, _, _ = ps.KDTreeSearch(cloud).radius_search_batch(np.full((2, 3), np.nan), 0.5)
+    assert offsets.tolist() == [0, 0, 0]
+
+def test_organized():
+    '''
+    Test OrganizedNeighborSearch
+    '''
+    # cloud from a pinhole camera looking at a wavy surface
+    height, width, focal = 30, 40, 50.
+    rows, cols = np.mgrid[0:height, 0:width]
+    depth = 2 + 0.2 * np.sin(cols / 5.) * np.cos(rows / 7.)
+    points = np.stack(((cols - width / 2) * depth / focal, (rows - height / 2) * depth / focal,
+                       depth), axis=2).reshape(-1, 3)
+    points[5] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'], width=width, height=height)
+    search = ps.OrganizedNeighborSearch(cloud, sort_results=True)
+    assert search.projection_matrix is not None
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+
+    for query in [0, 123, 599, 1199, points[610] + 0.01, [0, 0, 1.5], [5, 5, 2]]:
+        indices, distance = search.nearestk_search(query, 8)
+        indices2, distance2 = brute.nearestk_search(query, 8)
+        assert (indices == indices2).all() and np.allclose(distance, distance2)
+        indices, distance = search.radius_search(query, 0.1)
+        indices2, distance2 = brute.radius_search(query, 0.1)
+        assert (indices == indices2).all() and np.allclose(distance, distance2)
+
+    queries = np.array([0, 123, 599, 1199, 1000, 6])
+    k_indices, k_distances = search.nearestk_search_batch(queries, 8)
+    offsets, r_indices, r_distances = search.radius_search_batch(points[[7, 610, 1100]], 0.1)
+    for row, query in enumerate(queries):
+        indices, distance = brute.nearestk_search(int(query), 8)
+        assert np.allclose(norm(points[k_indices[row]] - points[query], axis=1), distance)
+        assert np.allclose(k_distances[row], distance)
+    for row, query in enumerate(points[[7, 610, 1100]]):
+        indices, distance = brute.radius_search(query, 0.1)
+        assert (r_indices[offsets[row]:offsets[row+1]] == indices).all()
+
+    # clouds that don't fit a camera model fall back to brute force
+    cloud = pcl.PointCloud(np.random.rand(100, 3), ['x', 'y', 'z'], width=10, height=10)
+    search = ps.OrganizedNeighborSearch(cloud, sort_results=True)
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+    assert search.projection_matrix is None
+    indices, _ = search.nearestk_search(5, 8)
+    indices2, _ = brute.nearestk_search(5, 8)
+    assert (indices == indices2).all()
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])
+
+def test_voxel_hash():
+    '''
+    Test VoxelHashSearch against BruteForceSearch
+    '''
+    points = np.random.rand(500, 3)
+    points[3] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+    search = ps.VoxelHashSearch(cloud, sort_results=True)
+    queries = np.vstack([np.random.rand(20, 3), [[5, 5, 5]]])
+
+    # the cell size is taken from the first radius
+    offsets, k_indices, _ = search.radius_search_batch(queries, 0.1)
+    assert search.cell_size == 0.1
+    for radius in (0.1, 0.25):
+        offsets, k_indices, k_distances = search.radius_search_batch(queries, radius)
+        for row, query in enumerate(queries):
+            indices, distance = brute.radius_search(query, radius)
+            assert set(k_indices[offsets[row]:offsets[row+1]]) == set(indices)
+            assert np.allclose(k_distances[offsets[row]:offsets[row+1]], distance)
+    assert offsets[-1] == offsets[-2]
+    assert 3 not in search.radius_search(2, 1)[0]
+
+    for k in (1, 8, 50):
+        k_indices, k_distances = search.nearestk_search_batch(queries, k)
+        for row, query in enumerate(queries):
+            _, distance = brute.nearestk_search(query, k)
+            assert np.allclose(k_distances[row], distance)
+    indices, _ = search.nearestk_search(7, 5)
+    assert indices[0] == 7 and len(indices) == 5
+
+    # far queries and large radii scan the points instead of the enclosing cells
+    search = ps.VoxelHashSearch(cloud, sort_results=True)
+    for query in ([20., 20., 20.], [50., 50., 50.]):
+        assert np.allclose(search.nearestk_search(query, 3)[1],
+                           brute.nearestk_search(query, 3)[1])
+    assert len(search.radius_search([0.5, 0.5, 0.5], 100)[0]) == 499
+
+    # coincident points
+    search = ps.VoxelHashSearch(pcl.PointCloud(np.ones((100, 3)), ['x', 'y', 'z']))
+    assert search.nearestk_search([1., 1., 1.], 3)[1].tolist() == [0, 0, 0]
+    assert len(search.radius_search([1., 1., 1.], 1)[0]) == 100
+
+def test_octree():
+    '''
+    Test OctreeSearch queries and level of detail
+    '''
+    points = np.random.rand(800, 3)
+    points[10] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+    search = ps.OctreeSearch(cloud, sort_results=True, resolution=0.1)
+    assert search.depth == 4
+
+    for query in (0, 3, [0.5, 0.2, 0.9], [3, 3, 3]):
+        for k in (1, 10, 200):
+            _, distance = search.nearestk_search(query, k)
+            assert np.allclose(distance, brute.nearestk_search(query, k)[1])
+        indices, _ = search.radius_search(query, 0.2)
+        assert (indices == brute.radius_search(query, 0.2)[0]).all()
+
+    min_pt, max_pt = [0.2, 0.1, 0.3], [0.6, 0.5, 0.9]
+    expected = np.flatnonzero(((points >= min_pt) & (points <= max_pt)).all(axis=1))
+    assert set(search.box_search(min_pt, max_pt)) == set(expected)
+
+    planes = np.array([[1, 0, 0, -0.3], [-1, 1, 0, 0], [0, 0, 1, -0.2]])
+    inside = (points.dot(planes[:, :3].T) + planes[:, 3] >= 0).all(axis=1)
+    assert set(search.frustum_search(planes)) == set(np.flatnonzero(inside))
+
+    for level in range(search.depth + 1):
+        assert search.node_counts(level).sum() == 799
+        min_pt, max_pt = search.node_bounds(level)
+        centroids = search.node_centroids(level)
+        assert ((centroids >= min_pt) & (centroids <= max_pt)).all()
+    assert np.allclose(search.node_centroids(0), np.nanmean(points, axis=0))
+    assert len(search.voxel_centroids(2)) == len(search.node_counts(2))
+    with pytest.raises(ValueError):
+        search.node_counts(5)
+
+def test_hnsw():
+    '''
+    Test HNSWSearch against BruteForceSearch
+    '''
+    pytest.importorskip('nmslib')
+    points = np.random.rand(1000, 3)
+    points[4] = np.nan
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+    search = ps.HNSWSearch(cloud, sort_results=True, ef_search=100)
+    queries = np.random.rand(50, 3)
+
+    k_indices, k_distances = search.nearestk_search_batch(queries, 8)
+    assert k_indices.shape == k_distances.shape == (50, 8)
+    expected, _ = brute.nearestk_search_batch(queries, 8)
+    recall = np.mean([len(np.intersect1d(row, truth)) / 8
+                      for row, truth in zip(k_indices, expected)])
+    assert recall > 0.9
+    assert (np.diff(k_distances, axis=1) >= 0).all()
+    for row in range(0, 50, 10):
+        assert np.allclose(norm(points[k_indices[row]] - queries[row], axis=1), k_distances[row])
+
+    indices, distances = search.nearestk_search(6, 3)
+    assert indices[0] == 6 and distances[0] == 0
+    offsets, k_indices, _ = search.radius_search_batch(queries, 0.15)
+    truth, _, _ = brute.radius_search_batch(queries, 0.15)
+    assert len(offsets) == 51 and offsets[-1] >= 0.9 * truth[-1]
+    assert len(search.radius_search(queries[0], 0.3, max_nn=5)[0]) == 5
+
+    # integer coordinates are a point, not indices
+    grid = pcl.PointCloud(np.array([[0, 0, 0], [5, 5, 5], [1, 2, 0.1]]), ['x', 'y', 'z'])
+    search = ps.HNSWSearch(grid)
+    assert search.nearestk_search([1, 2, 0], 1)[0].tolist() == [2]
+    assert search.radius_search([0, 0, 0], 1)[0].tolist() == [0]
+
+    features = pcl.PointCloud(np.random.rand(200, 8), ['f%d' % i for i in range(8)])
+    search = ps.HNSWSearch(features, fields=['f%d' % i for i in range(8)])
+    indices, _ = search.nearestk_search_batch([3, 9], 1)
+    assert (indices[:, 0] == [3, 9]).all()
+
+def test_neighbor_graph():
+    '''
+    Test NeighborGraph
+    '''
+    points = np.random.rand(400, 3)
+    cloud = pcl.PointCloud(points, ['x', 'y', 'z'])
+    brute = ps.BruteForceSearch(cloud, sort_results=True)
+    queries = np.arange(0, 400, 7)
+
+    graph = ps.NeighborGraph(cloud, k=10)
+    assert len(graph.offsets) == 401 and len(graph.neighbor_indices) == 4000
+    indices, distances = graph.neighbours(5)
+    assert indices[0] == 5 and (np.diff(distances) >= 0).all()
+    for k in (4, 10, 20):
+        k_indices, k_distances = graph.nearestk_search_batch(queries, k)
+        expected, expected_distances = brute.nearestk_search_batch(queries, k)
+        assert np.allclose(k_distances, np.sort(expected_distances, axis=1))
+    offsets, k_indices, _ = graph.radius_search_batch(queries, 0.15)
+    expected, _, _ = brute.radius_search_batch(queries, 0.15)
+    assert (offsets == expected).all()
+
+    graph = ps.NeighborGraph(cloud, radius=0.2)
+    for radius in (0.1, 0.2, 0.3):
+        offsets, k_indices, _ = graph.radius_search_batch(queries, radius)
+        expected, expected_indices, _ = brute.radius_search_batch(queries, radius)
+        assert (offsets == expected).all() and (k_indices == expected_indices).all()
+    _, k_distances = graph.nearestk_search_batch(queries, 5)
+    assert np.allclose(k_distances, np.sort(brute.nearestk_search_batch(queries, 5)[1], axis=1))
+    indices, _ = graph.nearestk_search(points[3], 1)
+    assert indices[0] == 3
+
+    # the graph is kept when the same cloud is assigned again
+    offsets = graph.offsets
+    graph.input_cloud = cloud
+    assert graph.offsets is offsets
+    graph.input_cloud = pcl.PointCloud(points[:100], ['x', 'y', 'z'])
+    assert len(graph.offsets) == 101
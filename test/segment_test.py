@@ -10,6 +10,7 @@ from numpy.random import RandomState
 import pytest
 sys.path.append(os.path.dirname(__file__) + '/' + os.path.pardir)
 import pcl
+import pcl.search
 import pcl.segment as ps
 import pcl.features as pf
 
@@ -40,5 +41,29 @@ def test_regiongrow():
     assert 'rgb' in coloredcloud.names
     assert 'rgba' in coloredclouda.names
 
+def test_regiongrow_neighbor_graph():
+    '''
+    Test sharing a NeighborGraph between NormalEstimation and RegionGrowing
+    '''
+    cloud = pcl.PointCloud(np.random.rand(200, 3), ['x', 'y', 'z'])
+    nestimate = pf.NormalEstimation(cloud)
+    nestimate.search_k = 10
+    normals = nestimate.compute()
+    regiongrow = ps.RegionGrowing(cloud, normals=normals)
+    expected = regiongrow.extract()
+
+    graph = pcl.search.NeighborGraph(cloud, k=30)
+    nestimate = pf.NormalEstimation(cloud)
+    nestimate.search_method = graph
+    nestimate.search_k = 10
+    graph_normals = nestimate.compute()
+    assert np.allclose(graph_normals.to_ndarray(), normals.to_ndarray(), equal_nan=True)
+
+    offsets = graph.offsets
+    regiongrow = ps.RegionGrowing(cloud, normals=graph_normals)
+    regiongrow.search_method = graph
+    assert regiongrow.extract() == expected
+    assert graph.offsets is offsets
+
 if __name__ == '__main__':
     pytest.main([__file__, '-s'])